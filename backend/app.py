@@ -16,27 +16,36 @@ for _stream in (sys.stdout, sys.stderr):
     except (AttributeError, ValueError):
         pass
 from dotenv import load_dotenv
-import yfinance as yf
 import json
 import csv
+import hashlib
+import struct
 from datetime import datetime, date, timedelta, timezone
 from flask_sqlalchemy import SQLAlchemy
 import bcrypt
 import uuid
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import UUID, JSONB, insert as pg_insert
 from sqlalchemy.orm.attributes import flag_modified
 import time
+import socket
 import requests
 from bs4 import BeautifulSoup
 from textblob import TextBlob
 import jwt
 import re
 from functools import wraps
-from threading import Lock
+from contextlib import contextmanager
+from threading import Event, Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import click
+import zstandard
 import backtesting
 import agent
+from price_cache import PriceCache, decode_closes, encode_closes
+from market_data import RateLimitError, ReplayProvider, YFinanceProvider, record_fixture
 
 app = Flask(__name__)
 load_dotenv()
@@ -95,6 +104,28 @@ db = SQLAlchemy(app)
 # not a wider door than the REST surface.
 socketio = SocketIO(app, cors_allowed_origins=ALLOWED_ORIGINS, async_mode="threading")
 
+# Where market data comes from; see market_data.py. "replay" answers from
+# recorded fixtures and synthetic data with no network, with optional
+# latency and failure injection, for load tests and offline benchmarks.
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+
+def _make_market_data():
+    if MARKET_DATA_PROVIDER == "yfinance":
+        return YFinanceProvider()
+    if MARKET_DATA_PROVIDER == "replay":
+        return ReplayProvider(
+            fixtures=os.getenv("MARKET_DATA_FIXTURES") or None,
+            latency_ms=float(os.getenv("MARKET_DATA_LATENCY_MS", "0")),
+            failure_rate=float(os.getenv("MARKET_DATA_FAILURE_RATE", "0")),
+            rate_limit_rate=float(os.getenv("MARKET_DATA_RATE_LIMIT_RATE", "0")),
+            seed=int(os.getenv("MARKET_DATA_SEED", "0")),
+            strict=os.getenv("MARKET_DATA_STRICT", "").lower() in ("1", "true", "yes"),
+        )
+    raise RuntimeError(
+        f"MARKET_DATA_PROVIDER must be yfinance or replay, not {MARKET_DATA_PROVIDER!r}.")
+
+market_data = _make_market_data()
+
 class User(db.Model):
     __tablename__ = "user_data"
     
@@ -126,17 +157,68 @@ class MarketSnapshot(db.Model):
          data changes.
 
     Rows are never mutated; a refresh inserts a new row and the newest wins.
+
+    The body lives in snapshot_content, keyed by its hash, so a refresh that
+    returns what the last one did adds a small row here and no new body.
+    Rows written before that keep payload/data inline and content_hash NULL.
     """
     __tablename__ = "market_snapshot"
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     ticker = db.Column(db.String(32), nullable=True, index=True)  # NULL for universe-wide
     kind = db.Column(db.String(32), nullable=False, index=True)   # recs|risk|financials|price|sentiment
-    payload = db.Column(JSONB, nullable=False)
+    payload = db.Column(JSONB, nullable=True)
+    # Price series stored columnar rather than as a JSON list of rows; see
+    # encode_closes. The payload then only carries metadata.
+    data = db.Column(db.LargeBinary, nullable=True)
+    content_hash = db.Column(
+        db.String(64), db.ForeignKey("snapshot_content.hash"), nullable=True, index=True
+    )
+    content = db.relationship("SnapshotContent", lazy="joined")
     fetched_at = db.Column(
         db.DateTime(timezone=True), nullable=False,
         server_default=db.func.now(), index=True
     )
 
+class SnapshotContent(db.Model):
+    """
+    A snapshot body, stored once however many snapshots share it.
+
+    Keyed by the SHA-256 of the canonical payload JSON plus any columnar data
+    (see snapshot_content_hash). Identical bytes always hash to the same row,
+    so the content never changes; only its storage may (compress-payloads).
+    Bodies over COMPRESS_MIN_BYTES are stored with codec "zstd": payload is
+    NULL and data holds the compressed frame (see compress_body).
+    """
+    __tablename__ = "snapshot_content"
+    hash = db.Column(db.String(64), primary_key=True)
+    payload = db.Column(JSONB, nullable=True)
+    data = db.Column(db.LargeBinary, nullable=True)
+    codec = db.Column(db.String(16), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+
+class MarketSnapshotLatest(db.Model):
+    """
+    Pointer to the newest market_snapshot row for each (kind, ticker).
+
+    market_snapshot only ever grows — quotes alone add a row per ticker per
+    poll — so "newest fresh snapshot" as an ORDER BY over it gets slower with
+    every refresh. This is upserted in the same transaction as the snapshot it
+    points to, turning the lookup into a primary-key read however long the
+    history is. The history itself is untouched: rows are still never mutated,
+    and evidence still cites market_snapshot ids.
+    """
+    __tablename__ = "market_snapshot_latest"
+    kind = db.Column(db.String(32), primary_key=True)
+    # "" for universe-wide snapshots, whose market_snapshot.ticker is NULL:
+    # a primary key column cannot hold NULL.
+    ticker = db.Column(db.String(32), primary_key=True)
+    snapshot_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey("market_snapshot.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    fetched_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
 class BacktestRun(db.Model):
     """
     Immutable record of one backtest.
@@ -155,8 +237,12 @@ class BacktestRun(db.Model):
     start_date = db.Column(db.String(10), nullable=True)
     end_date = db.Column(db.String(10), nullable=True)
     metrics = db.Column(JSONB, nullable=True)       # return, Sharpe, drawdown, ...
-    equity_curve = db.Column(JSONB, nullable=True)  # [{date, equity, benchmark}]
-    trades = db.Column(JSONB, nullable=True)
+    # Large curves and trade lists are stored zstd-compressed in
+    # results_blob instead; read them through backtest_run_results. All three
+    # are deferred, so listing runs never transfers them.
+    equity_curve = db.deferred(db.Column(JSONB, nullable=True), group="results")  # [{date, equity, benchmark}]
+    trades = db.deferred(db.Column(JSONB, nullable=True), group="results")
+    results_blob = db.deferred(db.Column(db.LargeBinary, nullable=True), group="results")
     snapshot_refs = db.Column(JSONB, nullable=True) # market_snapshot ids used
     # A human's own note on the run — why it was worth testing, what to make of
     # the result. The metrics are the machine's record; this is the analyst's.
@@ -165,6 +251,36 @@ class BacktestRun(db.Model):
         db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
     )
 
+class BacktestSweep(db.Model):
+    """
+    One parameter sweep, stored as a single compact record.
+
+    A sweep evaluates hundreds of parameter sets on the same prices. Storing
+    each as a BacktestRun would persist hundreds of equity curves nobody reads;
+    this keeps the ranked metrics table and the snapshots the prices came from,
+    which is enough to reproduce any row. Rows worth a closer look can be
+    materialised as full BacktestRuns, whose ids are kept in run_ids.
+    """
+    __tablename__ = "backtest_sweep"
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    actor_email = db.Column(db.String(120), nullable=True, index=True)
+    strategy = db.Column(db.String(64), nullable=False)
+    grid = db.Column(JSONB, nullable=True)          # the grid as requested
+    settings = db.Column(JSONB, nullable=True)      # starting_cash, cost_bps, slippage_bps
+    universe = db.Column(JSONB, nullable=True)
+    start_date = db.Column(db.String(10), nullable=True)
+    end_date = db.Column(db.String(10), nullable=True)
+    rank_by = db.Column(db.String(32), nullable=False)
+    combos = db.Column(db.Integer, nullable=False, default=0)
+    results = db.Column(JSONB, nullable=True)       # [{rank, params, metrics}], best first
+    failed = db.Column(JSONB, nullable=True)        # [{params, error}]
+    benchmark = db.Column(JSONB, nullable=True)     # benchmark metrics, shared by every row
+    snapshot_refs = db.Column(JSONB, nullable=True) # market_snapshot ids used
+    run_ids = db.Column(JSONB, nullable=True)       # materialised backtest_run ids
+    created_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+
 class AgentProposal(db.Model):
     """
     A trade the agent proposed, and what a human decided about it.
@@ -246,6 +362,27 @@ class AuditLog(db.Model):
         db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
     )
 
+class JobRun(db.Model):
+    """
+    One run of a scheduled maintenance job (see JOBS).
+
+    Written as "running" when the job starts and finished in place, so a job
+    that died midway is visible as one that never completed. The scheduler
+    also reads it to decide which jobs are due.
+    """
+    __tablename__ = "job_run"
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default="running")  # running|completed|failed
+    summary = db.Column(JSONB, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    host = db.Column(db.String(255), nullable=True)
+    started_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+
 # ----------------------------------------------- auth & audit helpers -------------------------------------------------------------------------------
 
 @app.before_request
@@ -313,29 +450,270 @@ SNAPSHOT_TTL_SECONDS = {
 BACKTEST_HISTORY_START = "2015-01-01"
 BACKTEST_HISTORY_TTL = 24 * 3600
 
+SNAPSHOT_CACHE_ENTRIES = int(os.getenv("SNAPSHOT_CACHE_ENTRIES", "1024"))
+
+class SnapshotCache:
+    """
+    In-process read-through cache of the newest snapshot per (kind, ticker).
+
+    Hot paths ask for the same snapshot many times a minute: the quote
+    broadcast every poll, the portfolio views once per holding. Each entry
+    remembers when its snapshot was fetched, so a lookup still honours the
+    caller's max_age_seconds exactly as the query would; the cache only saves
+    the round trip. Bounded by entry count, least recently used first out.
+
+    A snapshot inserted by another process is not seen until the cached one
+    ages past the caller's window, so staleness is bounded by the same TTLs
+    the database lookup uses. Cached payloads are shared between requests and
+    must be treated as read-only.
+
+    Safe under the gthread worker's threads: every access holds one lock.
+    """
+
+    def __init__(self, max_entries=SNAPSHOT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (kind, ticker) -> (payload, id, fetched_at)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, ticker, cutoff):
+        """(payload, snapshot_id, fetched_at) if the cached snapshot is newer than cutoff."""
+        with self._lock:
+            entry = self._entries.get((kind, ticker))
+            if entry is not None and entry[2] >= cutoff:
+                self._entries.move_to_end((kind, ticker))
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None, None, None
+
+    def put(self, kind, ticker, payload, snapshot_id, fetched_at):
+        """Remember a snapshot unless a newer one for the key is already held."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            current = self._entries.get((kind, ticker))
+            if current is not None and current[2] > fetched_at:
+                return
+            self._entries[(kind, ticker)] = (payload, snapshot_id, fetched_at)
+            self._entries.move_to_end((kind, ticker))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind=None, ticker=None):
+        """Drop entries matching kind and/or ticker; with neither, drop all."""
+        with self._lock:
+            if kind is None and ticker is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries
+                        if (kind is None or k[0] == kind)
+                        and (ticker is None or k[1] == ticker)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
+snapshot_cache = SnapshotCache()
+
+# Optional local layer under the price_history snapshots; see price_cache.py.
+# PRICE_CACHE_OFFLINE makes backtests read prices from it alone, whatever
+# their age, and never touch the database or the provider for them.
+PRICE_CACHE_DIR = os.getenv("PRICE_CACHE_DIR", "")
+PRICE_CACHE_OFFLINE = os.getenv("PRICE_CACHE_OFFLINE", "").lower() in ("1", "true", "yes")
+if PRICE_CACHE_OFFLINE and not PRICE_CACHE_DIR:
+    raise RuntimeError("PRICE_CACHE_OFFLINE needs PRICE_CACHE_DIR to point at a price cache.")
+price_cache = PriceCache(PRICE_CACHE_DIR) if PRICE_CACHE_DIR else None
+
+# Seconds a caller waits on another thread's fetch before giving up on it.
+SINGLE_FLIGHT_TIMEOUT = 120
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent provider fetches for the same (kind, ticker).
+
+    Two users opening the same chart, or the quote broadcast and a dashboard
+    missing the cache together, would otherwise each call yfinance and each
+    store a snapshot. Through here the first caller for a key fetches and the
+    rest wait on it and share its result, snapshot id included, or its
+    exception. Only fetches in flight are shared: once one finishes the next
+    miss fetches afresh, so this never serves anything staler than the
+    snapshot store would.
+
+    A fetch that returns snapshot ids must commit those snapshots before
+    returning, since other requests will cite them; one called partway
+    through a caller's work commits them in its own session. Per process; safe under
+    the gthread worker's threads.
+    """
+
+    def __init__(self, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}  # (kind, ticker) -> _Flight
+        self._lock = Lock()
+        self.fetched = 0
+        self.coalesced = 0
+
+    def do(self, key, fetch):
+        """fetch() once for every concurrent caller with this key."""
+        return self.do_many([key], lambda keys: {key: fetch()})[key]
+
+    def do_many(self, keys, fetch):
+        """
+        {key: value} for `keys`, fetching only those not already in flight.
+
+        fetch(leading) is called once with the keys this caller leads and
+        returns {key: value}; a key it leaves out maps to None. Keys another
+        caller is fetching are waited on instead. Suits the batched lookups,
+        where one download covers many tickers.
+        """
+        leading, following = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = _Flight()
+                    leading.append(key)
+                else:
+                    following[key] = flight
+            self.fetched += len(leading)
+            self.coalesced += len(following)
+
+        out = {}
+        if leading:
+            try:
+                values = fetch(leading)
+            except BaseException as e:
+                self._land(leading, {}, e)
+                raise
+            self._land(leading, values, None)
+            out.update((key, values.get(key)) for key in leading)
+        for key, flight in following.items():
+            if not flight.done.wait(self.timeout):
+                raise TimeoutError(f"Timed out waiting for the in-flight fetch of {key}")
+            if flight.error is not None:
+                raise flight.error
+            out[key] = flight.value
+        return out
+
+    def _land(self, keys, values, error):
+        with self._lock:
+            flights = [self._flights.pop(key) for key in keys]
+        for key, flight in zip(keys, flights):
+            flight.value, flight.error = values.get(key), error
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "fetched": self.fetched,
+                    "coalesced": self.coalesced}
+
+single_flight = SingleFlight()
+
+# put_snapshot only flushes; its row becomes visible to the cache once the
+# surrounding transaction commits, and is forgotten if it rolls back.
+_PENDING_SNAPSHOTS = "pending_snapshots"
+
+@event.listens_for(db.session, "after_commit")
+def _publish_pending_snapshots(session):
+    for entry in session.info.pop(_PENDING_SNAPSHOTS, []):
+        snapshot_cache.put(*entry)
+        kind, ticker, payload, snapshot_id, fetched_at = entry
+        if price_cache is not None and kind == "price_history" and "closes" in payload:
+            _store_local_closes(ticker, payload["closes"], snapshot_id, fetched_at)
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _discard_pending_snapshots(session, previous_transaction):
+    session.info.pop(_PENDING_SNAPSHOTS, None)
+
 def get_snapshot(kind, ticker=None, max_age_seconds=None):
     """
     Return the newest snapshot for (kind, ticker) if it is still fresh.
 
     Returns (payload, snapshot_id) on a hit, or (None, None) on a miss.
+    Served from snapshot_cache when it holds a fresh enough copy.
     """
     if max_age_seconds is None:
         max_age_seconds = SNAPSHOT_TTL_SECONDS.get(kind, 3600)
 
     cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    payload, snapshot_id, _ = snapshot_cache.get(kind, ticker, cutoff)
+    if snapshot_id is not None:
+        return payload, snapshot_id
+
     row = (
         MarketSnapshot.query
+        .join(MarketSnapshotLatest, MarketSnapshotLatest.snapshot_id == MarketSnapshot.id)
         .filter(
-            MarketSnapshot.kind == kind,
-            MarketSnapshot.ticker == ticker,
-            MarketSnapshot.fetched_at >= cutoff,
+            MarketSnapshotLatest.kind == kind,
+            MarketSnapshotLatest.ticker == (ticker or ""),
+            MarketSnapshotLatest.fetched_at >= cutoff,
         )
-        .order_by(MarketSnapshot.fetched_at.desc())
         .first()
     )
     if row is None:
         return None, None
-    return row.payload, str(row.id)
+    payload = snapshot_payload(row)
+    snapshot_cache.put(kind, ticker, payload, str(row.id), row.fetched_at)
+    return payload, str(row.id)
+
+def get_snapshots(kind, tickers, max_age_seconds=None, with_fetched_at=False):
+    """
+    The newest fresh snapshot of `kind` for each of several tickers, in one query.
+
+    Returns {ticker: (payload, snapshot_id)} for the tickers that have one;
+    a ticker with no fresh snapshot is absent. With `with_fetched_at` the
+    values are (payload, snapshot_id, fetched_at). Reads through
+    market_snapshot_latest, so the database hands back one row per ticker
+    instead of scanning every version.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+    if max_age_seconds is None:
+        max_age_seconds = SNAPSHOT_TTL_SECONDS.get(kind, 3600)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    found = {}
+    for ticker in tickers:
+        payload, snapshot_id, fetched_at = snapshot_cache.get(kind, ticker, cutoff)
+        if snapshot_id is not None:
+            found[ticker] = (payload, snapshot_id, fetched_at)
+    remaining = [t for t in tickers if t not in found]
+
+    rows = (
+        MarketSnapshot.query
+        .join(MarketSnapshotLatest, MarketSnapshotLatest.snapshot_id == MarketSnapshot.id)
+        .filter(
+            MarketSnapshotLatest.kind == kind,
+            MarketSnapshotLatest.ticker.in_(remaining),
+            MarketSnapshotLatest.fetched_at >= cutoff,
+        )
+        .all()
+    ) if remaining else []
+    for row in rows:
+        payload = snapshot_payload(row)
+        snapshot_cache.put(kind, row.ticker, payload, str(row.id), row.fetched_at)
+        found[row.ticker] = (payload, str(row.id), row.fetched_at)
+    if with_fetched_at:
+        return found
+    return {t: entry[:2] for t, entry in found.items()}
 
 def json_safe(value):
     """
@@ -361,72 +739,315 @@ def json_safe(value):
         return value
     return str(value)  # last resort so a snapshot never fails to serialize
 
-def put_snapshot(kind, payload, ticker=None):
-    """Insert a new snapshot and return its id (committed by the caller)."""
-    row = MarketSnapshot(kind=kind, ticker=ticker, payload=json_safe(payload))
+# Columnar price encoding (price_cache.encode_closes): every price as
+# little-endian float64, then every date as little-endian int32 days since
+# 1970-01-01. The local price cache files use the same bytes.
+_CLOSES_ENCODING = "closes-f8-i4"
+
+def snapshot_payload(row):
+    """
+    A snapshot row's payload, with columnar closes decoded under "closes".
+
+    Reads the shared snapshot_content body when the row has one, else the
+    inline columns. Rows written before the columnar encoding keep their JSON
+    "series" and are returned as stored, so old snapshots stay readable evidence.
+    """
+    body = row.content if row.content_hash is not None else row
+    if getattr(body, "codec", None) == _ZSTD_CODEC:
+        return _decode_payload(*decompress_body(body.data))
+    return _decode_payload(body.payload, body.data)
+
+def _decode_payload(payload, data):
+    if data is None:
+        return payload
+    payload = dict(payload)
+    if payload.get("encoding") == _CLOSES_ENCODING:
+        payload["closes"] = decode_closes(data)
+    return payload
+
+def canonical_json(value):
+    """
+    A JSON-safe value as canonical UTF-8 JSON bytes: sorted keys, no
+    whitespace. Two fetches that returned the same values encode the same
+    whatever order the provider used.
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), allow_nan=False).encode()
+
+def snapshot_content_hash(body, data=None):
+    """SHA-256 of canonical payload JSON bytes plus optional columnar bytes."""
+    digest = hashlib.sha256(body)
+    if data is not None:
+        digest.update(b"\0")
+        digest.update(data)
+    return digest.hexdigest()
+
+# Large bodies — ten years of price_history, a backtest's equity curve and
+# trades — dominate table size and transfer from the database, so past
+# COMPRESS_MIN_BYTES they are stored as one zstd frame. Uncompressed, the
+# frame is a header (JSON length, columnar length or -1 for none, layout),
+# the canonical JSON, then the columnar bytes. Smaller bodies stay plain: a
+# quote gains nothing and JSONB stays queryable.
+#
+# Raw float64 prices barely compress, because the bytes that vary (low
+# mantissa) interleave with the ones that don't (sign, exponent). Columnar
+# closes are therefore stored byte-shuffled — every price's first byte, then
+# every second byte, and likewise for the dates — which takes a ten-year
+# series from about 1.15x to 1.7x.
+COMPRESS_MIN_BYTES = 8 * 1024
+_ZSTD_CODEC = "zstd"
+_ZSTD_LEVEL = 3
+_BODY_HEADER = struct.Struct("<IqB")
+_LAYOUT_RAW = 0
+_LAYOUT_SHUFFLED_CLOSES = 1
+
+def _shuffle_closes(data, inverse=False):
+    n = len(data) // 12
+    raw = np.frombuffer(data, dtype=np.uint8)
+    prices, days = raw[:8 * n], raw[8 * n:12 * n]
+    if inverse:
+        return prices.reshape(8, n).T.tobytes() + days.reshape(4, n).T.tobytes()
+    return prices.reshape(n, 8).T.tobytes() + days.reshape(n, 4).T.tobytes()
+
+def compress_body(body, data=None, closes=False):
+    """
+    Pack canonical JSON bytes and optional columnar bytes into a zstd frame.
+
+    `closes` marks `data` as encode_closes output, which is byte-shuffled.
+    """
+    layout = _LAYOUT_SHUFFLED_CLOSES if closes and data is not None else _LAYOUT_RAW
+    if layout == _LAYOUT_SHUFFLED_CLOSES:
+        data = _shuffle_closes(data)
+    header = _BODY_HEADER.pack(len(body), -1 if data is None else len(data), layout)
+    # Compressor objects are not safe to share between threads; they are
+    # cheap to make.
+    return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(header + body + (data or b""))
+
+def decompress_body(blob):
+    """Inverse of compress_body: (payload, data or None)."""
+    raw = zstandard.ZstdDecompressor().decompress(blob)
+    body_len, data_len, layout = _BODY_HEADER.unpack_from(raw)
+    start = _BODY_HEADER.size
+    payload = json.loads(raw[start:start + body_len])
+    if data_len < 0:
+        return payload, None
+    data = raw[start + body_len:start + body_len + data_len]
+    if layout == _LAYOUT_SHUFFLED_CLOSES:
+        data = _shuffle_closes(data, inverse=True)
+    return payload, data
+
+class CompressionStats:
+    """
+    Running totals of bytes compressed per kind, for /health.
+
+    Counts what was written, so a write later rolled back still counts; the
+    ratio is an operational signal, not an accounting record.
+    """
+
+    def __init__(self):
+        self._totals = {}  # kind -> [bodies, raw bytes, stored bytes]
+        self._lock = Lock()
+
+    def record(self, kind, raw_bytes, stored_bytes):
+        with self._lock:
+            totals = self._totals.setdefault(kind, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += raw_bytes
+            totals[2] += stored_bytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                kind: {
+                    "bodies": n,
+                    "raw_bytes": raw,
+                    "stored_bytes": stored,
+                    "ratio": (raw / stored) if stored else None,
+                }
+                for kind, (n, raw, stored) in sorted(self._totals.items())
+            }
+
+compression_stats = CompressionStats()
+
+def _content_values(kind, payload, body, data):
+    """snapshot_content column values for a body, compressed when large."""
+    raw_bytes = len(body) + len(data or b"")
+    if raw_bytes < COMPRESS_MIN_BYTES:
+        return {"payload": payload, "data": data, "codec": None}
+    blob = compress_body(body, data, closes=payload.get("encoding") == _CLOSES_ENCODING)
+    compression_stats.record(kind, raw_bytes, len(blob))
+    return {"payload": None, "data": blob, "codec": _ZSTD_CODEC}
+
+def _store_snapshot_content(kind, payload, body, data, content_hash):
+    """
+    Store a snapshot body unless it already is, and hold it until the
+    transaction ends.
+
+    An existing body is left alone (DO NOTHING writes no new row version) and
+    then locked FOR KEY SHARE, so a prune cannot delete it before the
+    market_snapshot row citing it is inserted; the prune skips locked bodies.
+    A body a prune deleted first is not there to lock, so it is stored again.
+    """
+    from sqlalchemy import text
+    insert = (
+        pg_insert(SnapshotContent)
+        .values(hash=content_hash, **_content_values(kind, payload, body, data))
+        .on_conflict_do_nothing(index_elements=["hash"])
+    )
+    while True:
+        db.session.execute(insert)
+        locked = db.session.execute(
+            text("SELECT hash FROM snapshot_content WHERE hash = :hash FOR KEY SHARE"),
+            {"hash": content_hash},
+        ).first()
+        if locked is not None:
+            return
+
+def put_snapshot(kind, payload, ticker=None, closes=None):
+    """
+    Insert a new snapshot and return its id (committed by the caller).
+
+    With `closes`, the price Series is stored columnar (encode_closes) beside
+    the JSON payload instead of inside it.
+
+    The body is content-addressed: if an identical payload was stored before
+    (a quote outside market hours, an unchanged consensus) the new row just
+    cites it, so each refresh still gets its own id and fetch time as evidence
+    without writing the body again. Large bodies are stored compressed.
+    """
+    data = None
+    if closes is not None:
+        payload = {**payload, "encoding": _CLOSES_ENCODING, "bars": int(len(closes))}
+        data = encode_closes(closes)
+    payload = json_safe(payload)
+    body = canonical_json(payload)
+    content_hash = snapshot_content_hash(body, data)
+    _store_snapshot_content(kind, payload, body, data, content_hash)
+    row = MarketSnapshot(kind=kind, ticker=ticker, content_hash=content_hash)
     db.session.add(row)
     db.session.flush()  # populate row.id without ending the transaction
+
+    # Move the pointer in the same transaction, so it can never name a row
+    # that was rolled back. now() is the transaction's timestamp, the same
+    # value the row's fetched_at default took.
+    upsert = pg_insert(MarketSnapshotLatest).values(
+        kind=kind, ticker=ticker or "", snapshot_id=row.id, fetched_at=db.func.now(),
+    )
+    db.session.execute(upsert.on_conflict_do_update(
+        index_elements=["kind", "ticker"],
+        set_={"snapshot_id": upsert.excluded.snapshot_id,
+              "fetched_at": upsert.excluded.fetched_at},
+        where=MarketSnapshotLatest.fetched_at <= upsert.excluded.fetched_at,
+    ))
+    db.session.info.setdefault(_PENDING_SNAPSHOTS, []).append(
+        (kind, ticker, _decode_payload(payload, data), str(row.id), datetime.now(timezone.utc))
+    )
     return str(row.id)
 
-def get_last_quote(ticker):
+def _download_recent_closes(tickers):
     """
-    Latest close for a ticker, preferring stored data over a network call.
+    The last few daily closes for several tickers, in one provider call.
 
-    Tried in order: a fresh quote snapshot, the tail of a fresh price snapshot,
-    then yfinance. Returns None if every source fails, so a rate-limited
-    provider degrades one number instead of breaking the whole portfolio view.
+    Returns {ticker: [close, ...]} oldest first, for tickers that came back with
+    data. Raises if the download itself fails.
     """
-    cached, _ = get_snapshot("quote", ticker=ticker)
-    if isinstance(cached, dict) and cached.get("price") is not None:
-        return cached["price"]
+    return {ticker: [float(c) for c in closes.tolist()]
+            for ticker, closes in market_data.closes(list(tickers), period="5d").items()}
 
-    # The chart endpoint may already have stored a year of closes.
-    price_snap, _ = get_snapshot("price", ticker=ticker)
-    if isinstance(price_snap, dict) and price_snap.get("series"):
-        return price_snap["series"][-1].get("price")
+def _fetch_quotes(keys):
+    """
+    SingleFlight fetch for ("quote", ticker) keys: {key: (last, prev)}.
 
+    Downloads them in one call and stores a quote snapshot for each. Waiting
+    callers get prices, never snapshot ids, so the snapshots are left to the
+    leader's own transaction rather than committed here. A failed download is
+    logged and leaves every key unresolved.
+    """
+    tickers = [ticker for _, ticker in keys]
     try:
-        data = yf.Ticker(ticker).history(period="1d")
-        if data.empty:
-            return None
-        price = float(data["Close"].iloc[-1])
-        put_snapshot("quote", {"price": price}, ticker=ticker)
-        return price
+        fetched = _download_recent_closes(tickers)
     except Exception as e:
-        print(f"Quote lookup failed for {ticker}: {e}")
-        return None
+        print(f"Quote lookup failed for {', '.join(tickers)}: {e}")
+        return {}
+    out = {}
+    for ticker, closes in fetched.items():
+        last = closes[-1]
+        prev = closes[-2] if len(closes) > 1 else None
+        out[("quote", ticker)] = (last, prev)
+        put_snapshot("quote", {"price": last, "prev_price": prev}, ticker=ticker)
+    return out
 
-def get_quote_pair(ticker):
+def get_last_quotes(tickers):
+    """
+    Latest close for each ticker, preferring stored data over a network call.
+
+    Tried in order: a fresh quote snapshot, the tail of a fresh price snapshot,
+    then the market-data provider. Each tier is one batched lookup for every
+    ticker still unresolved, so a 40-holding portfolio costs a fixed handful
+    of queries rather than two per holding. Returns {ticker: price or None}; None when
+    every source fails, so a rate-limited provider degrades one number instead
+    of breaking the whole portfolio view.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    out = dict.fromkeys(tickers)
+
+    for ticker, (cached, _) in get_snapshots("quote", tickers).items():
+        if isinstance(cached, dict) and cached.get("price") is not None:
+            out[ticker] = cached["price"]
+
+    # The chart endpoint may already have stored a year of closes.
+    pending = [t for t in tickers if out[t] is None]
+    for ticker, (price_snap, _) in get_snapshots("price", pending).items():
+        if isinstance(price_snap, dict) and price_snap.get("series"):
+            out[ticker] = price_snap["series"][-1].get("price")
+
+    pending = [t for t in tickers if out[t] is None]
+    if pending:
+        for (_, ticker), pair in single_flight.do_many(
+            [("quote", t) for t in pending], _fetch_quotes
+        ).items():
+            if pair is not None:
+                out[ticker] = pair[0]
+    return out
+
+def get_last_quote(ticker):
+    """Latest close for one ticker; see get_last_quotes."""
+    return get_last_quotes([ticker])[ticker]
+
+def get_quote_pairs(tickers):
     """
-    (last_close, previous_close) for a ticker, preferring stored data.
+    {ticker: (last_close, previous_close)}, preferring stored data.
 
     The previous close is what makes a day change computable. Either element
-    may be None when the data is unavailable.
+    may be None when the data is unavailable. Batched like get_last_quotes.
     """
-    # A price snapshot holds a year of closes; its tail gives both values.
-    price_snap, _ = get_snapshot("price", ticker=ticker)
-    if isinstance(price_snap, dict) and price_snap.get("series"):
-        series = price_snap["series"]
-        last = series[-1].get("price")
-        prev = series[-2].get("price") if len(series) > 1 else None
-        return last, prev
+    tickers = list(dict.fromkeys(tickers))
+    out = {t: (None, None) for t in tickers}
 
-    cached, _ = get_snapshot("quote", ticker=ticker)
-    if isinstance(cached, dict) and cached.get("price") is not None:
-        return cached["price"], cached.get("prev_price")
+    # A price snapshot holds a year of closes; its tail gives both values.
+    for ticker, (price_snap, _) in get_snapshots("price", tickers).items():
+        if isinstance(price_snap, dict) and price_snap.get("series"):
+            series = price_snap["series"]
+            last = series[-1].get("price")
+            prev = series[-2].get("price") if len(series) > 1 else None
+            out[ticker] = (last, prev)
+
+    pending = [t for t in tickers if out[t] == (None, None)]
+    for ticker, (cached, _) in get_snapshots("quote", pending).items():
+        if isinstance(cached, dict) and cached.get("price") is not None:
+            out[ticker] = (cached["price"], cached.get("prev_price"))
+
+    pending = [t for t in tickers if out[t] == (None, None)]
+    if pending:
+        for (_, ticker), pair in single_flight.do_many(
+            [("quote", t) for t in pending], _fetch_quotes
+        ).items():
+            if pair is not None:
+                out[ticker] = pair
+    return out
 
-    try:
-        data = yf.Ticker(ticker).history(period="5d")
-        if data.empty:
-            return None, None
-        closes = [float(c) for c in data["Close"].tolist()]
-        last = closes[-1]
-        prev = closes[-2] if len(closes) > 1 else None
-        put_snapshot("quote", {"price": last, "prev_price": prev}, ticker=ticker)
-        return last, prev
-    except Exception as e:
-        print(f"Quote pair lookup failed for {ticker}: {e}")
-        return None, None
+def get_quote_pair(ticker):
+    """(last_close, previous_close) for one ticker; see get_quote_pairs."""
+    return get_quote_pairs([ticker])[ticker]
 
 def write_audit(action, entity=None, payload=None, actor_email=None, snapshot_ref=None):
     """
@@ -564,10 +1185,8 @@ def fetch_specific_stock_data():
     if cached is not None:
         return jsonify(cached), 200
 
-    stock = yf.Ticker(ticker_symbol)
-
     # Fetch financials
-    financials = stock.financials
+    financials = market_data.financials(ticker_symbol)
     if financials is None or financials.empty:
         print("No financials found for", request_data["ticker"])
         return jsonify({"error": f"No financial data available for {request_data['ticker']}"}), 404
@@ -579,13 +1198,15 @@ def fetch_specific_stock_data():
     financials_dict = financials.replace({np.nan: None}).to_dict()
     financials_dict = {str(date): data for date, data in financials_dict.items()}  # Ensure keys are strings
 
-    stock_info = stock.info
+    stock_info = market_data.info(ticker_symbol)
+    dividends = market_data.dividends(ticker_symbol)
+    latest = market_data.closes([ticker_symbol], period="1d").get(ticker_symbol)
     additional_data = {
         "Market Cap": stock_info.get("marketCap"),
         "PE Ratio": stock_info.get("trailingPE"),  # P/E Ratio
-        "Dividends Paid": stock.dividends.sum() if not stock.dividends.empty else None,
+        "Dividends Paid": dividends.sum() if not dividends.empty else None,
         "Operating Cash Flow": stock_info.get("operatingCashflow"),
-        "latest_price": stock.history(period="1d")["Close"].iloc[-1]
+        "latest_price": float(latest.iloc[-1]) if latest is not None else None
     }
 
 
@@ -603,7 +1224,7 @@ def fetch_specific_stock_data():
 
 def score_recommendations(stock_consideration):
     """
-    Turn a yfinance recommendations frame into {"rating", "indicator"}.
+    Turn a provider's recommendations frame into {"rating", "indicator"}.
 
     Returns None when the data is unusable, so callers can skip the ticker.
     """
@@ -632,6 +1253,236 @@ def score_recommendations(stock_consideration):
     decision = max(scores, key=scores.get)
     return {"rating": decision, "indicator": scores[decision], "analyst_count": int(total)}
 
+# Analyst consensus is one provider call per ticker, so scoring the universe is
+# bounded by the provider's rate limit, not by us. The old loop slept 0.5s per
+# ticker on the request thread; RECS_RATE_PER_SECOND keeps that as the
+# starting pace, shared by RECS_WORKERS threads so slow responses overlap.
+RECS_WORKERS = int(os.getenv("RECS_WORKERS", "4"))
+RECS_RATE_PER_SECOND = float(os.getenv("RECS_RATE_PER_SECOND", "2"))
+# Attempts per ticker before a scan gives up on it and reports itself partial.
+RECS_MAX_ATTEMPTS = 4
+
+class TokenBucket:
+    """
+    Rate limiter shared by every worker of a scan, with adaptive backoff.
+
+    acquire() blocks until a token is available. A rate-limit response calls
+    throttled(): the rate halves and every worker pauses for a backoff that
+    doubles on each consecutive 429. A run of successes calls succeeded() and
+    creeps the rate back up toward its ceiling — additive increase,
+    multiplicative decrease, so the scan settles just under whatever pace the
+    provider currently tolerates.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.1, base_backoff=5.0, max_backoff=120.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._streak = 0
+        self._lock = Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            if time.monotonic() < self._paused_until:
+                return  # workers already in flight when the first 429 landed
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._backoff = min(self.max_backoff, self._backoff * 2 or self.base_backoff)
+            self._paused_until = time.monotonic() + self._backoff
+            self._tokens = 0.0
+            self._streak = 0
+
+    def succeeded(self):
+        with self._lock:
+            self._backoff = 0.0
+            self._streak += 1
+            # Probe upward once per ~2s worth of calls at the current rate.
+            if self._streak >= max(5, int(self.rate * 2)):
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+                self._streak = 0
+
+    def stats(self):
+        with self._lock:
+            return {"rate_per_second": round(self.rate, 3),
+                    "backoff_seconds": self._backoff}
+
+def _is_rate_limited(exc):
+    text = str(exc)
+    return (isinstance(exc, RateLimitError)
+            or "Rate limit" in text or "Too Many Requests" in text
+            or type(exc).__name__ == "YFRateLimitError")
+
+# Scored tickers are written as their own recs snapshots every this many
+# results, so a scan that is interrupted keeps what it finished.
+RECS_COMMIT_EVERY = 25
+
+class RecsScan:
+    """
+    Scores recommendation tickers in the background.
+
+    A refresh starts a scan and returns at once; the request thread is never
+    held for the minute-plus a full universe takes. Each ticker's score is
+    stored as its own recs snapshot as it lands, so a scan only ever fetches
+    the tickers it is given — the stale ones — and a partial scan never
+    replaces fuller earlier results. Workers share one TokenBucket. A ticker
+    that keeps hitting rate limits, or whose fetch fails, is left pending
+    rather than ending the scan; it is still stale, so the next refresh picks
+    it up first.
+
+    One scan runs at a time per process; start() while one is running just
+    reports its progress.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.status = "idle"  # idle | running | done | partial
+        self.pending = []
+        self.scored = 0
+        self.total = 0
+        self.limiter = None
+
+    def _begin(self, tickers):
+        with self._lock:
+            if self.status == "running":
+                return False
+            self.pending = list(tickers)
+            self.total = len(self.pending)
+            self.scored = 0
+            self.status = "running"
+            self.limiter = TokenBucket(RECS_RATE_PER_SECOND)
+            return True
+
+    def start(self, tickers):
+        """Start scoring `tickers` (most urgent first); returns progress()."""
+        if self._begin(tickers):
+            socketio.start_background_task(self._run, list(tickers))
+        return self.progress()
+
+    def run(self, tickers):
+        """Score `tickers` in the calling thread, for the scheduled job; returns progress()."""
+        if self._begin(tickers):
+            self._run(list(tickers))
+        return self.progress()
+
+    def progress(self):
+        with self._lock:
+            return {
+                "status": self.status,
+                "done": self.scored,
+                "scored": self.scored,
+                "pending": len(self.pending),
+                "total": self.total,
+                **(self.limiter.stats() if self.limiter else {}),
+            }
+
+    def _score(self, ticker):
+        """(ticker, payload) once scored, or None to leave it for later."""
+        for _ in range(RECS_MAX_ATTEMPTS):
+            self.limiter.acquire()
+            try:
+                result = score_recommendations(market_data.recommendations(ticker))
+            except Exception as exc:
+                if _is_rate_limited(exc):
+                    self.limiter.throttled()
+                    continue
+                # A single bad ticker must not fail the whole scan. Nothing is
+                # stored for it, so its last good score (if any) is still the
+                # one served, and it stays pending for the next scan.
+                print(f"Skipping {ticker}: {exc}")
+                self.limiter.succeeded()
+                return None
+            self.limiter.succeeded()
+            with self._lock:
+                self.pending.remove(ticker)
+                self.scored += 1
+            # No analyst coverage is stored too; ranking skips unrated rows.
+            return ticker, (result if result is not None else {"rating": None})
+        print(f"Rate limited on {ticker} {RECS_MAX_ATTEMPTS} times; leaving it for the next scan.")
+        return None
+
+    def _store(self, batch):
+        try:
+            with app.app_context():
+                for ticker, payload in batch:
+                    put_snapshot("recs", payload, ticker=ticker)
+                db.session.commit()
+        except Exception as e:
+            print(f"Storing {len(batch)} recs snapshots failed: {e}")
+            return 0
+        return len(batch)
+
+    def _run(self, tickers):
+        stored, batch = 0, []
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, RECS_WORKERS)) as pool:
+                for done in pool.map(self._score, tickers):
+                    if done is not None:
+                        batch.append(done)
+                    if len(batch) >= RECS_COMMIT_EVERY:
+                        stored += self._store(batch)
+                        batch = []
+        finally:
+            if batch:
+                stored += self._store(batch)
+            with self._lock:
+                partial = bool(self.pending)
+            try:
+                with app.app_context():
+                    write_audit(
+                        "recs_snapshot",
+                        entity=f"{stored} tickers",
+                        payload={"ticker_count": stored, "requested": len(tickers),
+                                 "partial": partial},
+                    )
+                    db.session.commit()
+            except Exception as e:
+                print(f"Auditing recs scan failed: {e}")
+            with self._lock:
+                self.status = "partial" if partial else "done"
+
+recs_scan = RecsScan()
+
+def stale_recs_tickers(universe, force=False, within=0):
+    """
+    (rows, stale) for the recs of `universe`.
+
+    `rows` is get_snapshots(with_fetched_at=True) over the last month: rows
+    that old are served while they wait to be re-scored. `stale` lists the
+    tickers past the recs TTL, or due to pass it within `within` seconds,
+    never-scored first and then oldest first, which is the order a scan should
+    take them in. `force` marks every ticker stale.
+    """
+    rows = get_snapshots("recs", universe, max_age_seconds=30 * 24 * 3600, with_fetched_at=True)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SNAPSHOT_TTL_SECONDS["recs"] - within)
+    never = datetime.min.replace(tzinfo=timezone.utc)
+    stale = [t for t in universe if force or t not in rows or rows[t][2] < cutoff]
+    stale.sort(key=lambda t: rows[t][2] if t in rows else never)
+    return rows, stale
+
 # use this route to fetch the top stock recommendations
 @app.route('/fetch-recs', methods=['POST'])
 @require_auth
@@ -643,79 +1494,49 @@ def fetchRecommendations():
     pinnedStocks = fetchPinnedStocks(email_in)
     num_of_pins = len(pinnedStocks)
     top_n = 30 + num_of_pins
-
-    # ---- 1. Try the cached universe-wide snapshot -------------------------------
-    # Scoring the whole universe takes >60s of throttled yfinance calls, so the
-    # result is snapshotted and reused. The snapshot is user-independent; each
-    # user's pins are merged in afterwards.
-    scored = None
-    snapshot_id = None
-    if not force_refresh:
-        scored, snapshot_id = get_snapshot("recs")
-
-    # ---- 2. On a miss, fetch and score -----------------------------------------
-    if scored is None:
-        scored = {}
-        rate_limited = False
-        universe = sorted(set(sp500_tickers) | set(pinnedStocks))
-
-        for stock in universe:
-            try:
-                # Throttle to stay under yfinance's rate limits.
-                time.sleep(0.5)
-                result = score_recommendations(yf.Ticker(stock).get_recommendations())
-            except Exception as exc:
-                # A single bad ticker must not fail the whole request. Rate
-                # limiting affects everything that follows, so stop early.
-                if "Rate limit" in str(exc) or "Too Many Requests" in str(exc):
-                    print(f"Rate limited while fetching {stock}; stopping early.")
-                    rate_limited = True
-                    break
-                print(f"Skipping {stock}: {exc}")
-                continue
-
-            if result is not None:
-                scored[stock] = result
-
-        if not scored:
-            # Nothing usable. Fall back to a stale snapshot rather than showing
-            # the user an empty dashboard.
-            stale, stale_id = get_snapshot("recs", max_age_seconds=30 * 24 * 3600)
-            if stale:
-                scored, snapshot_id = stale, stale_id
-            else:
-                status = 429 if rate_limited else 503
-                return jsonify({
-                    "error": "Could not retrieve stock recommendations at this moment",
-                    "reason": "rate_limited" if rate_limited else "no_data",
-                }), status
-        else:
-            snapshot_id = put_snapshot("recs", scored)
-            write_audit(
-                "recs_snapshot",
-                entity=f"{len(scored)} tickers",
-                payload={"ticker_count": len(scored), "partial": rate_limited},
-                snapshot_ref=snapshot_id,
-            )
-            db.session.commit()
+    universe = sorted(set(sp500_tickers) | set(pinnedStocks))
+
+    # ---- 1. Newest recs snapshot per ticker, in one query ----------------------
+    # The snapshots are user-independent; each user's pins are part of the
+    # universe.
+    rows, stale = stale_recs_tickers(universe, force=force_refresh)
+
+    # ---- 2. Re-score only what is stale, oldest (or never scored) first --------
+    scan = recs_scan.start(stale) if stale else None
+
+    scored = {t: (payload, sid) for t, (payload, sid, _) in rows.items()
+              if isinstance(payload, dict) and payload.get("rating") is not None}
+    if not scored:
+        if scan is not None and scan["status"] == "running":
+            return jsonify({"recommendations": [], "snapshot_ref": None,
+                            "cached": False, "scan": scan}), 202
+        rate_limited = recs_scan.progress()["status"] == "partial"
+        return jsonify({
+            "error": "Could not retrieve stock recommendations at this moment",
+            "reason": "rate_limited" if rate_limited else "no_data",
+            "scan": recs_scan.progress(),
+        }), 429 if rate_limited else 503
 
     # ---- 3. Rank and return the top N ------------------------------------------
     # NOTE: rank over a copy. The previous implementation popped from the source
     # dict and then tested that (now-drained) dict for emptiness, which returned
     # a 400 error even when recommendations had been found successfully.
-    ranked = sorted(scored.items(), key=lambda kv: kv[1]["indicator"], reverse=True)
+    ranked = sorted(scored.items(), key=lambda kv: kv[1][0]["indicator"], reverse=True)
 
     # Returned as a list, not a dict: jsonify sorts object keys alphabetically,
     # which would silently discard the ranking computed above.
     top = [
-        {"ticker": ticker, **data}
-        for ticker, data in ranked[:top_n]
+        {"ticker": ticker, **data, "snapshot_ref": sid}
+        for ticker, (data, sid) in ranked[:top_n]
     ]
+    newest = max(scored, key=lambda t: rows[t][2])
 
     return jsonify({
         "recommendations": top,
-        "snapshot_ref": snapshot_id,
-        "cached": not force_refresh and bool(snapshot_id),
+        # The newest of the per-ticker snapshots; each row cites its own.
+        "snapshot_ref": scored[newest][1],
+        "cached": scan is None,
+        "scan": scan or recs_scan.progress(),
     }), 200
 
 #use this function to retrieve the users' pinned stocks
@@ -741,7 +1562,6 @@ def fetchPinnedStocks(email: str) -> list: # return a list of tickers
 def getRiskAnalysis():
     request_data = request.get_json(silent=True) or {}
     print("Received request in risk anal:", request_data) # AMZN
-    risk_analysis_to_send = {}
     
     if not isinstance(request_data, dict) or 'stock' not in request_data:
         return jsonify({"error": "Invalid request format. Expected {'stock': 'TICKER'}"}), 400
@@ -756,52 +1576,61 @@ def getRiskAnalysis():
     if cached is not None:
         return jsonify(cached), 200
 
+    # Concurrent misses for the same ticker share one fetch and one snapshot.
     try:
-        ticker = yf.Ticker(stock)
-        #fetch the data from 2020-01-01 to present day
-        today = date.today()
-        data = yf.download(stock, start="2020-01-01", end=today) #get the data from 2020 start to present
+        risk_analysis_to_send = single_flight.do(("risk", stock), lambda: _fetch_risk_analysis(stock))
     except Exception as e:
+        db.session.rollback()
         stale, _ = get_snapshot("risk", ticker=stock, max_age_seconds=30 * 24 * 3600)
         if stale is not None:
             return jsonify(stale), 200
         status = 429 if ("Rate limit" in str(e) or "Too Many Requests" in str(e)) else 500
         return jsonify({"error": str(e)}), status
 
-    if data.empty:
+    if risk_analysis_to_send is None:
         return jsonify({"error": "Invalid stock ticker or no data available for the given period"}), 400
 
-    if 'Close' in data.columns:
-        closes = data['Close']
-        # yfinance may return MultiIndex columns for a single ticker, which would
-        # make the result a Series rather than a scalar. Squeeze to one column.
-        if hasattr(closes, "columns"):
-            closes = closes.iloc[:, 0]
+    # print(risk_analysis_to_send)
+    return jsonify(risk_analysis_to_send), 200
 
-        returns = closes.pct_change() #"By what percentage did the stock price change compared to the previous day?"
+def _fetch_risk_analysis(stock):
+    """
+    SingleFlight fetch for ("risk", stock), or None if there is no price data.
 
-        # calculate voltaility by averaging the daily percent change in closing price
-        volatility = float(returns.std() * (252**0.5))  # Annualized volatility
-        risk_analysis_to_send['volatility'] = volatility
+    Volatility from closes since 2020 plus the balance-sheet ratios, stored
+    as a snapshot and committed before any waiting caller is handed it.
+    """
+    risk_analysis_to_send = {}
+    #fetch the data from 2020-01-01 to present day
+    today = date.today()
+    closes = market_data.closes([stock], start="2020-01-01", end=today).get(stock)
 
-        # get important ratios
-        try:
-            info = ticker.info
-            risk_analysis_to_send['debtToEquity'] = info.get('debtToEquity', "")  # 61.175 - AMZN
-            risk_analysis_to_send['currentRatio'] = info.get('currentRatio', "")  # 1.089 - AMZN
-            risk_analysis_to_send['quickRatio'] = info.get('quickRatio', "")      # 0.827 - AMZN
-            risk_analysis_to_send['latest_price'] = float(closes.iloc[-1])
-        except Exception as e:
-            # Volatility is the important number; ship it even if the ratio
-            # lookup gets rate limited.
-            print(f"Ratio lookup failed for {stock}: {e}")
-            risk_analysis_to_send.setdefault('latest_price', float(closes.iloc[-1]))
+    if closes is None:
+        return None
 
-        put_snapshot("risk", risk_analysis_to_send, ticker=stock)
-        db.session.commit()
+    returns = closes.pct_change() #"By what percentage did the stock price change compared to the previous day?"
 
-    # print(risk_analysis_to_send)
-    return jsonify(risk_analysis_to_send), 200
+    # calculate voltaility by averaging the daily percent change in closing price
+    volatility = float(returns.std() * (252**0.5))  # Annualized volatility
+    risk_analysis_to_send['volatility'] = volatility
+
+    # get important ratios
+    try:
+        info = market_data.info(stock)
+        risk_analysis_to_send['debtToEquity'] = info.get('debtToEquity', "")  # 61.175 - AMZN
+        risk_analysis_to_send['currentRatio'] = info.get('currentRatio', "")  # 1.089 - AMZN
+        risk_analysis_to_send['quickRatio'] = info.get('quickRatio', "")      # 0.827 - AMZN
+        risk_analysis_to_send['latest_price'] = float(closes.iloc[-1])
+    except Exception as e:
+        # Volatility is the important number; ship it even if the ratio
+        # lookup gets rate limited.
+        print(f"Ratio lookup failed for {stock}: {e}")
+        risk_analysis_to_send.setdefault('latest_price', float(closes.iloc[-1]))
+
+    put_snapshot("risk", risk_analysis_to_send, ticker=stock)
+    db.session.commit()
+
+    return risk_analysis_to_send
 
 # -------------------------------------------------------- Holdings route ------------------------------------------------------------------------------------------------------------
 
@@ -934,11 +1763,12 @@ def get_holdings():
     # Every holding gets last_quote and total_return keys, even when the data is
     # unavailable: previously the loop skipped some rows entirely and the
     # frontend then called .toFixed() on an undefined total_return.
+    quotes = get_last_quotes([hold["ticker"] for hold in holdings_list])
     for hold in holdings_list:
         hold["last_quote"] = None
         hold["total_return"] = None
 
-        last_quote = get_last_quote(hold["ticker"])
+        last_quote = quotes[hold["ticker"]]
         if last_quote is None:
             continue
 
@@ -1031,13 +1861,12 @@ def gather_agent_evidence(email):
     """
     snapshot_refs = []
 
-    holdings = Holdings.query.filter_by(email=email).all()
+    holdings = [h for h in Holdings.query.filter_by(email=email).all() if h.num_shares]
+    quotes = get_quote_pairs([h.ticker for h in holdings])
     portfolio = []
     tickers = []
     for h in holdings:
-        if not h.num_shares:
-            continue
-        last, _ = get_quote_pair(h.ticker)
+        last, _ = quotes[h.ticker]
         portfolio.append({
             "ticker": h.ticker,
             "shares": int(h.num_shares),
@@ -1048,14 +1877,16 @@ def gather_agent_evidence(email):
 
     signals = {}
     sentiment = {}
+    price_snaps = get_snapshots("price", tickers, max_age_seconds=7 * 24 * 3600)
+    sent_snaps = get_snapshots("sentiment", tickers, max_age_seconds=7 * 24 * 3600)
     for ticker in tickers:
-        price_snap, price_id = get_snapshot("price", ticker=ticker, max_age_seconds=7 * 24 * 3600)
+        price_snap, price_id = price_snaps.get(ticker, (None, None))
         if isinstance(price_snap, dict):
             signals[ticker] = price_snap.get("signals", [])[-3:]  # most recent crossovers
             if price_id:
                 snapshot_refs.append(price_id)
 
-        sent_snap, sent_id = get_snapshot("sentiment", ticker=ticker, max_age_seconds=7 * 24 * 3600)
+        sent_snap, sent_id = sent_snaps.get(ticker, (None, None))
         if isinstance(sent_snap, dict):
             sentiment[ticker] = sent_snap.get("overall_sentiment")
             if sent_id:
@@ -1172,12 +2003,11 @@ def build_agent_tools(email):
         }
 
     def tool_get_holdings(_args):
-        rows = Holdings.query.filter_by(email=email).all()
+        rows = [h for h in Holdings.query.filter_by(email=email).all() if h.num_shares]
+        quotes = get_quote_pairs([h.ticker for h in rows])
         out = []
         for h in rows:
-            if not h.num_shares:
-                continue
-            last, prev = get_quote_pair(h.ticker)
+            last, prev = quotes[h.ticker]
             out.append({
                 "ticker": h.ticker,
                 "shares": int(h.num_shares),
@@ -1581,6 +2411,194 @@ def agent_decide():
 
 # ---------------------------------------------- Backtesting --------------------------------------------------------------------------------------
 
+def _has_closes(snap):
+    return isinstance(snap, dict) and ("closes" in snap or bool(snap.get("series")))
+
+def _snapshot_closes(snap):
+    """Closes held by a price or price_history snapshot payload, as a Series."""
+    if "closes" in snap:
+        return snap["closes"]
+    # JSON rows: the chart's "price" snapshots, and price_history written
+    # before the columnar encoding.
+    rows = snap["series"]
+    idx = pd.to_datetime([r["date"] for r in rows])
+    return pd.Series([r["price"] for r in rows], index=idx, dtype=float)
+
+def _clip_dates(closes, start=None, end=None):
+    if start:
+        closes = closes[closes.index >= pd.to_datetime(start)]
+    if end:
+        closes = closes[closes.index <= pd.to_datetime(end)]
+    return closes
+
+def _shallow_closes(ticker):
+    """
+    A year of closes from the chart's "price" snapshot, or (None, None).
+
+    Rate limited or delisted: a year of chart data still beats failing
+    outright, and the bar-count check will reject it if it is too short.
+    """
+    shallow, shallow_id = get_snapshot("price", ticker=ticker,
+                                       max_age_seconds=30 * 24 * 3600)
+    if not _has_closes(shallow):
+        return None, None
+    return _snapshot_closes(shallow), shallow_id
+
+def download_price_history(tickers, start=BACKTEST_HISTORY_START):
+    """
+    Fetch closes from `start` for several tickers in one provider call.
+
+    Returns {ticker: Series} for the tickers that came back with data; the
+    rest are simply absent. Raises if the download itself fails.
+    """
+    return market_data.closes(list(tickers), start=start, end=date.today())
+
+# Bars a stored series and a fresh download must agree on before the download
+# is appended to it. Adjusted closes are restated after a split or dividend,
+# and a restated history must be reloaded whole rather than spliced.
+PRICE_HISTORY_OVERLAP_BARS = 5
+# Stored histories older than this are reloaded in full rather than extended.
+PRICE_HISTORY_EXTEND_WINDOW = 30 * 24 * 3600
+
+def _extend_closes(stored, recent):
+    """
+    `stored` with `recent` appended, or None if they disagree on the overlap.
+
+    The last stored bar is never compared: it may have been fetched mid-session
+    and closed elsewhere. It is replaced by the fresh value along with
+    everything after it.
+    """
+    if recent is None or len(stored) <= PRICE_HISTORY_OVERLAP_BARS:
+        return None
+    overlap = stored.index[-(PRICE_HISTORY_OVERLAP_BARS + 1):-1]
+    if not overlap.isin(recent.index).all() or stored.index[-1] > recent.index[-1]:
+        return None
+    if not np.allclose(stored[overlap].to_numpy(), recent[overlap].to_numpy(),
+                       rtol=1e-6, atol=0.0):
+        return None
+    tail = recent[recent.index >= stored.index[-1]]
+    return pd.concat([stored.iloc[:-1], tail])
+
+def fetch_price_history(tickers):
+    """
+    Backtest-depth closes for tickers whose price_history needs refreshing.
+
+    A ticker with a recent stored history only downloads the bars since its
+    last stored date, plus a few before it to check against; a daily refresh
+    is then a handful of bars instead of a decade. Tickers with no usable
+    history, or whose overlap disagrees, are downloaded from
+    BACKTEST_HISTORY_START. Both are batched, so this is at most two provider
+    calls however many tickers are asked for.
+
+    Returns {ticker: complete Series}; each is stored as a new snapshot by the
+    caller, so evidence always cites a whole series, never a delta. A ticker
+    that could not be fetched is left out.
+    """
+    stored = {}
+    for ticker, (snap, _) in get_snapshots(
+        "price_history", tickers, max_age_seconds=PRICE_HISTORY_EXTEND_WINDOW
+    ).items():
+        if _has_closes(snap):
+            closes = _snapshot_closes(snap)
+            if len(closes) > PRICE_HISTORY_OVERLAP_BARS:
+                stored[ticker] = closes
+
+    out = {}
+    if stored:
+        since = min(c.index[-(PRICE_HISTORY_OVERLAP_BARS + 1)] for c in stored.values())
+        try:
+            recent = download_price_history(list(stored), start=since.date())
+        except Exception as e:
+            print(f"Incremental price download failed for {len(stored)} tickers: {e}")
+            recent = {}
+        for ticker, closes in stored.items():
+            extended = _extend_closes(closes, recent.get(ticker))
+            if extended is not None:
+                out[ticker] = extended
+
+    full = [t for t in tickers if t not in out]
+    if full:
+        try:
+            out.update(download_price_history(full))
+        except Exception as e:
+            # Whatever was extended is still good; the caller treats the rest
+            # as misses. With nothing to return, let the caller see the error.
+            if not out:
+                raise
+            print(f"Full price download failed for {len(full)} tickers: {e}")
+    return out
+
+def _store_local_closes(ticker, closes, snapshot_id, fetched_at):
+    # The local cache only saves work; failing to write it must not fail
+    # the request that produced the prices.
+    try:
+        price_cache.put(ticker, closes, snapshot_id, fetched_at)
+    except OSError as e:
+        print(f"Price cache write failed for {ticker}: {e}")
+
+def _drop_local_closes(ticker):
+    # A file stamped with a pruned snapshot would cite evidence that no longer
+    # exists; the next read refills it from whichever snapshot survived.
+    try:
+        price_cache.invalidate(ticker)
+    except OSError as e:
+        print(f"Price cache invalidate failed for {ticker}: {e}")
+
+def get_price_histories(tickers, max_age_seconds=BACKTEST_HISTORY_TTL):
+    """
+    Fresh stored closes for several tickers: {ticker: (Series, snapshot_id)}.
+
+    Tries the local price cache first, then the price_history snapshots in
+    one query, and writes what the database returned back to the local cache,
+    replacing any file stamped with an older snapshot. Either way the id is
+    that of the snapshot the prices came from, so evidence is the same
+    whichever layer served it. Tickers with nothing fresh are absent.
+
+    With PRICE_CACHE_OFFLINE only the local cache is read, and any age will do.
+    """
+    found = {}
+    if price_cache is not None:
+        cutoff = None if PRICE_CACHE_OFFLINE else (
+            datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds))
+        for ticker in tickers:
+            entry = price_cache.get(ticker, cutoff)
+            if entry is not None:
+                found[ticker] = entry[:2]
+    if PRICE_CACHE_OFFLINE:
+        return found
+
+    remaining = [t for t in tickers if t not in found]
+    for ticker, (snap, snap_id, fetched_at) in get_snapshots(
+        "price_history", remaining, max_age_seconds=max_age_seconds, with_fetched_at=True
+    ).items():
+        if not _has_closes(snap):
+            continue
+        closes = _snapshot_closes(snap)
+        found[ticker] = (closes, snap_id)
+        if price_cache is not None:
+            _store_local_closes(ticker, closes, snap_id, fetched_at)
+    return found
+
+def _fetch_price_histories(keys):
+    """
+    SingleFlight fetch for ("price_history", ticker) keys: {key: (closes, snapshot_id)}.
+
+    One fetch_price_history call for every ticker, each stored as a snapshot.
+    The runs waiting on the flight cite them, so they are committed before
+    it lands, but in a session of their own: a backtest or agent run that
+    loads prices partway through its work still commits, or rolls back, only
+    at its own boundary. Tickers the provider has nothing for are left out.
+    Raises if the download fails.
+    """
+    fetched = fetch_price_history([ticker for _, ticker in keys])
+    out = {}
+    with app.app_context():  # a fresh scoped session, not the caller's
+        for ticker, closes in fetched.items():
+            out[("price_history", ticker)] = (
+                closes, put_snapshot("price_history", {"ticker": ticker}, ticker=ticker, closes=closes))
+        db.session.commit()
+    return out
+
 def load_closes_for_backtest(ticker, start=None, end=None):
     """
     Closing prices for a backtest, preferring stored snapshots.
@@ -1588,77 +2606,73 @@ def load_closes_for_backtest(ticker, start=None, end=None):
     Returns (Series, snapshot_refs). Reusing a snapshot means the run cites the
     exact prices it saw, which is what makes it reproducible later.
     """
-    snapshot_refs = []
-
-    def _from_snapshot(snap, snap_id):
-        rows = snap["series"]
-        idx = pd.to_datetime([r["date"] for r in rows])
-        if snap_id:
-            snapshot_refs.append(snap_id)
-        return pd.Series([r["price"] for r in rows], index=idx, dtype=float)
-
     # "price_history" holds the deep series backtests need. The chart route's
     # "price" snapshot only covers a year — not enough for a strategy that
     # ranks on a 252-bar lookback — so it is a last resort, not a fallback we
     # reach for before trying to fetch properly.
-    snap, snap_id = get_snapshot("price_history", ticker=ticker,
-                                 max_age_seconds=BACKTEST_HISTORY_TTL)
-    if isinstance(snap, dict) and snap.get("series"):
-        closes = _from_snapshot(snap, snap_id)
-    else:
-        try:
-            hist = yf.download(ticker, start=BACKTEST_HISTORY_START, end=date.today(),
-                               progress=False, auto_adjust=True)
-            if hist.empty:
-                raise ValueError(f"No price history available for {ticker}")
-            col = hist["Close"]
-            if hasattr(col, "columns"):  # yfinance may return MultiIndex columns
-                col = col.iloc[:, 0]
-            closes = col.astype(float).dropna()
-            series = [{"date": str(i.date()), "price": float(v)} for i, v in closes.items()]
-            snapshot_refs.append(
-                put_snapshot("price_history", {"ticker": ticker, "series": series}, ticker=ticker)
-            )
-        except Exception:
-            # Rate limited or delisted: a year of chart data still beats failing
-            # outright, and the bar-count check will reject it if it is too short.
-            shallow, shallow_id = get_snapshot("price", ticker=ticker,
-                                               max_age_seconds=30 * 24 * 3600)
-            if not (isinstance(shallow, dict) and shallow.get("series")):
-                raise
-            closes = _from_snapshot(shallow, shallow_id)
-
-    if start:
-        closes = closes[closes.index >= pd.to_datetime(start)]
-    if end:
-        closes = closes[closes.index <= pd.to_datetime(end)]
+    stored = get_price_histories([ticker])
+    if ticker in stored:
+        closes, snap_id = stored[ticker]
+        return _clip_dates(closes, start, end), [snap_id]
+    if PRICE_CACHE_OFFLINE:
+        raise ValueError(f"No price history for {ticker} in the offline price cache")
 
-    return closes, snapshot_refs
+    try:
+        fetched = single_flight.do_many([("price_history", ticker)], _fetch_price_histories)
+        if fetched[("price_history", ticker)] is None:
+            raise ValueError(f"No price history available for {ticker}")
+        closes, snap_id = fetched[("price_history", ticker)]
+    except Exception:
+        closes, snap_id = _shallow_closes(ticker)
+        if closes is None:
+            raise
+    return _clip_dates(closes, start, end), [snap_id]
 
 def load_universe_closes(tickers, start=None, end=None):
     """
     Aligned closing prices for a universe, as a DataFrame of dates by ticker.
 
-    Each ticker reuses the same snapshot path as a single-asset run, so a
-    portfolio backtest cites exactly the same evidence. Tickers with no data
-    are reported rather than silently dropped — a universe that quietly shrank
+    Each ticker reuses the same snapshot kind as a single-asset run, so a
+    portfolio backtest cites exactly the same evidence. The fresh snapshots
+    for the whole universe are read in one query and the misses are refreshed
+    together by fetch_price_history's batched downloads, so a 50-name universe
+    is a few round trips rather than fifty of each. Tickers with no data are
+    reported rather than silently dropped — a universe that quietly shrank
     would change the result without explaining why.
     """
     series_map = {}
-    snapshot_refs = []
+    refs = {}
     missing = []
 
-    for ticker in tickers:
-        try:
-            closes, refs = load_closes_for_backtest(ticker, start, end)
-        except Exception:
-            missing.append(ticker)
-            continue
-        if closes is None or closes.empty:
-            missing.append(ticker)
-            continue
+    for ticker, (closes, snap_id) in get_price_histories(tickers).items():
         series_map[ticker] = closes
-        snapshot_refs.extend(refs)
+        refs[ticker] = snap_id
+
+    misses = [t for t in tickers if t not in series_map]
+    if PRICE_CACHE_OFFLINE:
+        missing.extend(misses)
+    elif misses:
+        try:
+            fetched = single_flight.do_many([("price_history", t) for t in misses],
+                                            _fetch_price_histories)
+        except Exception as e:
+            print(f"Batched price download failed for {len(misses)} tickers: {e}")
+            fetched = {}
+        for ticker in misses:
+            if fetched.get(("price_history", ticker)) is not None:
+                series_map[ticker], refs[ticker] = fetched[("price_history", ticker)]
+                continue
+            closes, shallow_id = _shallow_closes(ticker)
+            if closes is None:
+                missing.append(ticker)
+                continue
+            series_map[ticker] = closes
+            refs[ticker] = shallow_id
+
+    series_map = {t: _clip_dates(series_map[t], start, end) for t in tickers if t in series_map}
+    for ticker in [t for t, closes in series_map.items() if closes.empty]:
+        del series_map[ticker]
+        missing.append(ticker)
 
     if len(series_map) < 2:
         raise ValueError(
@@ -1672,6 +2686,7 @@ def load_universe_closes(tickers, start=None, end=None):
     if frame.shape[0] < 2:
         raise ValueError("Tickers do not share enough overlapping history")
 
+    snapshot_refs = [refs[t] for t in series_map]
     return frame, list(dict.fromkeys(snapshot_refs)), missing
 
 @app.route('/strategies', methods=['GET'])
@@ -1703,31 +2718,22 @@ class BacktestError(ValueError):
         self.status = status
         self.extra = extra
 
-def execute_backtest(actor_email, strategy, params=None, ticker=None, universe=None,
-                     start=None, end=None, starting_cash=10000.0):
-    """
-    Run a backtest, persist it as evidence, and return the full result.
-
-    Shared by the HTTP route and the agent's run_backtest tool so a backtest the
-    agent commissions is the same artifact, stored the same way, as one a human
-    runs — there is no second implementation that could drift.
-
-    Raises BacktestError for anything the caller should report rather than crash.
-    """
-    try:
-        strategy, params = backtesting.coerce_params(strategy or "ma_crossover", params)
-    except ValueError as e:
-        raise BacktestError(str(e), known=sorted(backtesting.STRATEGY_FUNCS)) from e
-
-    spec = backtesting.STRATEGY_SPECS[strategy]
-
+def _coerce_starting_cash(starting_cash):
     try:
         starting_cash = float(starting_cash)
     except (TypeError, ValueError) as e:
         raise BacktestError("starting_cash must be a number") from e
     if starting_cash <= 0:
         raise BacktestError("starting_cash must be positive")
+    return starting_cash
+
+def load_backtest_prices(spec, ticker=None, universe=None, start=None, end=None):
+    """
+    Load the prices a strategy runs on: one ticker's closes, or a universe's.
 
+    Returns (closes, snapshot_refs, missing, ticker). Shared by single runs and
+    sweeps so both read, and cite, the same snapshots.
+    """
     missing = []
     try:
         if spec["multi_asset"]:
@@ -1751,29 +2757,46 @@ def execute_backtest(actor_email, strategy, params=None, ticker=None, universe=N
     except Exception as e:
         status = 429 if ("Rate limit" in str(e) or "Too Many Requests" in str(e)) else 500
         raise BacktestError(str(e), status=status) from e
+    return closes, snapshot_refs, missing, ticker
 
-    bars = closes.shape[0]
-    needed = backtesting.required_bars(strategy, params)
-    if bars < needed:
-        raise BacktestError(
-            f"{spec['label']} needs about {needed} bars of history to warm up, "
-            f"but only {bars} are available. Shorten the lookback or widen the date range.",
-            bars=bars, required_bars=needed,
-        )
-
+def run_strategy_on(spec, closes, strategy, params, starting_cash, ticker=None):
+    """Dispatch a validated run to the single-asset or portfolio engine."""
     try:
         if spec["multi_asset"]:
-            result = backtesting.run_portfolio_backtest(
+            return backtesting.run_portfolio_backtest(
                 closes, strategy=strategy, params=params, starting_cash=starting_cash
             )
-        else:
-            result = backtesting.run_backtest(
-                closes, strategy=strategy, params=params,
-                starting_cash=starting_cash, ticker=ticker
-            )
+        return backtesting.run_backtest(
+            closes, strategy=strategy, params=params,
+            starting_cash=starting_cash, ticker=ticker
+        )
     except ValueError as e:
         raise BacktestError(str(e)) from e
 
+def _backtest_results_values(equity_curve, trades):
+    """BacktestRun column values for a curve and trades, compressed when large."""
+    results = json_safe({"equity_curve": equity_curve, "trades": trades})
+    body = canonical_json(results)
+    if len(body) < COMPRESS_MIN_BYTES:
+        return {**results, "results_blob": None}
+    blob = compress_body(body)
+    compression_stats.record("backtest_run", len(body), len(blob))
+    return {"equity_curve": None, "trades": None, "results_blob": blob}
+
+def backtest_run_results(run):
+    """(equity_curve, trades) of a stored run, decompressing if needed."""
+    if run.results_blob is not None:
+        results, _ = decompress_body(run.results_blob)
+        return results["equity_curve"], results["trades"]
+    return run.equity_curve, run.trades
+
+def record_backtest_run(actor_email, strategy, params, starting_cash, result, snapshot_refs):
+    """
+    Persist a finished backtest as a BacktestRun plus its audit entry.
+
+    Adds to the session without committing, so a caller storing several runs
+    (or a run alongside a sweep) commits them together.
+    """
     run = BacktestRun(
         actor_email=actor_email,
         strategy=strategy,
@@ -1784,9 +2807,8 @@ def execute_backtest(actor_email, strategy, params=None, ticker=None, universe=N
         start_date=result["start_date"],
         end_date=result["end_date"],
         metrics=json_safe({**result["metrics"], "benchmark": result["benchmark_metrics"]}),
-        equity_curve=json_safe(result["equity_curve"]),
-        trades=json_safe(result["trades"]),
         snapshot_refs=snapshot_refs,
+        **_backtest_results_values(result["equity_curve"], result["trades"]),
     )
     db.session.add(run)
     db.session.flush()
@@ -1804,11 +2826,254 @@ def execute_backtest(actor_email, strategy, params=None, ticker=None, universe=N
         actor_email=actor_email,
         snapshot_ref=snapshot_refs[0] if snapshot_refs else None,
     )
+    return run
+
+def execute_backtest(actor_email, strategy, params=None, ticker=None, universe=None,
+                     start=None, end=None, starting_cash=10000.0):
+    """
+    Run a backtest, persist it as evidence, and return the full result.
+
+    Shared by the HTTP route and the agent's run_backtest tool so a backtest the
+    agent commissions is the same artifact, stored the same way, as one a human
+    runs — there is no second implementation that could drift.
+
+    Raises BacktestError for anything the caller should report rather than crash.
+    """
+    try:
+        strategy, params = backtesting.coerce_params(strategy or "ma_crossover", params)
+    except ValueError as e:
+        raise BacktestError(str(e), known=sorted(backtesting.STRATEGY_FUNCS)) from e
+
+    spec = backtesting.STRATEGY_SPECS[strategy]
+    starting_cash = _coerce_starting_cash(starting_cash)
+    closes, snapshot_refs, missing, ticker = load_backtest_prices(
+        spec, ticker, universe, start, end
+    )
+
+    bars = closes.shape[0]
+    needed = backtesting.required_bars(strategy, params)
+    if bars < needed:
+        raise BacktestError(
+            f"{spec['label']} needs about {needed} bars of history to warm up, "
+            f"but only {bars} are available. Shorten the lookback or widen the date range.",
+            bars=bars, required_bars=needed,
+        )
+
+    result = run_strategy_on(spec, closes, strategy, params, starting_cash, ticker)
+    run = record_backtest_run(actor_email, strategy, params, starting_cash,
+                              result, snapshot_refs)
+    db.session.commit()
+
+    result["backtest_run_id"] = str(run.id)
+    result["ticker"] = ", ".join(result["universe"])
+    result["snapshot_refs"] = snapshot_refs
+    if missing:
+        result["missing_tickers"] = missing
+    return result
+
+# Process-pool size for sweeps; 0 means one worker per core.
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", "0"))
+# Full BacktestRuns a sweep may materialise. Each stores a whole equity curve,
+# which is exactly the cost the compact sweep record exists to avoid.
+MAX_SWEEP_MATERIALIZE = 5
+
+def execute_sweep(actor_email, strategy, grid, ticker=None, universe=None,
+                  start=None, end=None, starting_cash=10000.0, rank_by="sharpe",
+                  materialize_top=0):
+    """
+    Run a parameter sweep, persist it as one BacktestSweep, and return it.
+
+    Prices are loaded once, through the same snapshot path as a single run, and
+    every parameter set is evaluated against them. Parameter sets that need
+    more history than is available are reported as failed rather than run on a
+    warm-up window that would show a flat line.
+
+    With `materialize_top`, the best N rows are also re-run in full and stored
+    as ordinary BacktestRuns so they can be opened, annotated and cited.
+    """
+    try:
+        strategy = backtesting.resolve_strategy(strategy or "ma_crossover")
+    except ValueError as e:
+        raise BacktestError(str(e), known=sorted(backtesting.STRATEGY_FUNCS)) from e
+    try:
+        strategy, combos = backtesting.expand_grid(strategy, grid)
+    except ValueError as e:
+        raise BacktestError(str(e)) from e
+    if rank_by not in backtesting.SWEEP_RANK_METRICS:
+        raise BacktestError(f"rank_by must be one of {list(backtesting.SWEEP_RANK_METRICS)}")
+    try:
+        materialize_top = int(materialize_top or 0)
+    except (TypeError, ValueError) as e:
+        raise BacktestError("materialize_top must be an integer") from e
+    if not 0 <= materialize_top <= MAX_SWEEP_MATERIALIZE:
+        raise BacktestError(f"materialize_top must be between 0 and {MAX_SWEEP_MATERIALIZE}")
+
+    spec = backtesting.STRATEGY_SPECS[strategy]
+    starting_cash = _coerce_starting_cash(starting_cash)
+    closes, snapshot_refs, missing, ticker = load_backtest_prices(
+        spec, ticker, universe, start, end
+    )
+
+    bars = closes.shape[0]
+    runnable, too_short = [], []
+    for params in combos:
+        needed = backtesting.required_bars(strategy, params)
+        if bars < needed:
+            too_short.append({"params": params,
+                              "error": f"needs about {needed} bars, {bars} available"})
+        else:
+            runnable.append(params)
+    if not runnable:
+        raise BacktestError(
+            f"No parameter set in the grid fits the {bars} bars available. "
+            f"Shorten the lookbacks or widen the date range.", bars=bars,
+        )
+
+    try:
+        sweep = backtesting.run_sweep(
+            closes, strategy, runnable, rank_by=rank_by,
+            starting_cash=starting_cash, ticker=ticker,
+            workers=SWEEP_WORKERS or None,
+        )
+    except ValueError as e:
+        raise BacktestError(str(e)) from e
+    sweep["failed"] = too_short + sweep["failed"]
+    sweep["combos"] = len(combos)
+
+    row = BacktestSweep(
+        actor_email=actor_email,
+        strategy=strategy,
+        grid=json_safe(grid),
+        settings=json_safe({"starting_cash": starting_cash,
+                            "cost_bps": sweep["cost_bps"],
+                            "slippage_bps": sweep["slippage_bps"]}),
+        universe=sweep["universe"],
+        start_date=sweep["start_date"],
+        end_date=sweep["end_date"],
+        rank_by=rank_by,
+        combos=sweep["combos"],
+        results=json_safe(sweep["results"]),
+        failed=json_safe(sweep["failed"]),
+        benchmark=json_safe(sweep["benchmark_metrics"]),
+        snapshot_refs=snapshot_refs,
+    )
+    db.session.add(row)
+    db.session.flush()
+
+    materialized = []
+    for entry in sweep["results"][:materialize_top]:
+        result = run_strategy_on(spec, closes, strategy, entry["params"],
+                                 starting_cash, ticker)
+        run = record_backtest_run(actor_email, strategy, entry["params"],
+                                  starting_cash, result, snapshot_refs)
+        materialized.append({"rank": entry["rank"], "backtest_run_id": str(run.id),
+                             "params": entry["params"]})
+    row.run_ids = [m["backtest_run_id"] for m in materialized]
+
+    best = sweep["results"][0] if sweep["results"] else None
+    write_audit(
+        "backtest_sweep",
+        entity=", ".join(sweep["universe"]) or "-",
+        payload={
+            "sweep_id": str(row.id),
+            "strategy": strategy,
+            "rank_by": rank_by,
+            "combos": sweep["combos"],
+            "failed": len(sweep["failed"]),
+            "best_params": json_safe(best["params"]) if best else None,
+            "best_score": json_safe(best["metrics"].get(rank_by)) if best else None,
+            "materialized": row.run_ids,
+        },
+        actor_email=actor_email,
+        snapshot_ref=snapshot_refs[0] if snapshot_refs else None,
+    )
+    db.session.commit()
+
+    sweep["sweep_id"] = str(row.id)
+    sweep["snapshot_refs"] = snapshot_refs
+    sweep["materialized"] = materialized
+    if missing:
+        sweep["missing_tickers"] = missing
+    return sweep
+
+# Suffix on a walk-forward BacktestRun's strategy. Its params describe a grid
+# and a window schedule, not one parameter set, so the run must never be read
+# (or re-run) as a plain run of the strategy it names.
+WALK_FORWARD_SUFFIX = ":walk_forward"
+
+def execute_walk_forward(actor_email, strategy, grid, ticker=None, universe=None,
+                         start=None, end=None, starting_cash=10000.0, rank_by="sharpe",
+                         in_sample_bars=None, out_of_sample_bars=None):
+    """
+    Walk-forward optimise a strategy and persist the result as one BacktestRun.
+
+    Built from the same pieces as execute_backtest: prices are loaded once
+    through the snapshot path, and the stitched out-of-sample run is stored
+    like any other run, with its params recording the grid, the window sizes
+    and the parameters each window picked. It can be listed, annotated and
+    cited like an ordinary run, but is stored as "<strategy>:walk_forward" so
+    no reader takes it for a single parameter set of that strategy.
+    """
+    try:
+        strategy = backtesting.resolve_strategy(strategy or "ma_crossover")
+    except ValueError as e:
+        raise BacktestError(str(e), known=sorted(backtesting.STRATEGY_FUNCS)) from e
+    try:
+        strategy, combos = backtesting.expand_grid(strategy, grid)
+    except ValueError as e:
+        raise BacktestError(str(e)) from e
+    try:
+        in_sample_bars = int(in_sample_bars or backtesting.DEFAULT_IN_SAMPLE_BARS)
+        out_of_sample_bars = int(out_of_sample_bars or backtesting.DEFAULT_OUT_OF_SAMPLE_BARS)
+    except (TypeError, ValueError) as e:
+        raise BacktestError("in_sample_bars and out_of_sample_bars must be integers") from e
+    if rank_by not in backtesting.SWEEP_RANK_METRICS:
+        raise BacktestError(f"rank_by must be one of {list(backtesting.SWEEP_RANK_METRICS)}")
+
+    spec = backtesting.STRATEGY_SPECS[strategy]
+    starting_cash = _coerce_starting_cash(starting_cash)
+    closes, snapshot_refs, missing, ticker = load_backtest_prices(
+        spec, ticker, universe, start, end
+    )
+
+    # Each in-sample window is a short backtest of its own, so a parameter set
+    # that cannot warm up inside one is never eligible to be picked.
+    runnable = [p for p in combos
+                if backtesting.required_bars(strategy, p) <= in_sample_bars]
+    if not runnable:
+        raise BacktestError(
+            f"No parameter set in the grid warms up within {in_sample_bars} "
+            f"in-sample bars. Shorten the lookbacks or lengthen in_sample_bars.",
+            in_sample_bars=in_sample_bars,
+        )
+
+    try:
+        result = backtesting.run_walk_forward(
+            closes, strategy, runnable,
+            in_sample_bars=in_sample_bars, out_of_sample_bars=out_of_sample_bars,
+            rank_by=rank_by, starting_cash=starting_cash, ticker=ticker,
+            workers=SWEEP_WORKERS or None,
+        )
+    except ValueError as e:
+        raise BacktestError(str(e), bars=closes.shape[0]) from e
+
+    params = {
+        "mode": "walk_forward",
+        "grid": json_safe(grid),
+        "combos": len(runnable),
+        **result["params"],
+        "windows": result["windows"],
+    }
+    run = record_backtest_run(actor_email, strategy + WALK_FORWARD_SUFFIX, params,
+                              starting_cash, result, snapshot_refs)
     db.session.commit()
 
+    result["params"] = params
     result["backtest_run_id"] = str(run.id)
     result["ticker"] = ", ".join(result["universe"])
     result["snapshot_refs"] = snapshot_refs
+    if len(runnable) < len(combos):
+        result["skipped_combos"] = len(combos) - len(runnable)
     if missing:
         result["missing_tickers"] = missing
     return result
@@ -1840,6 +3105,72 @@ def run_backtest_route():
         return jsonify({"error": str(e), **e.extra}), e.status
     return jsonify(result), 200
 
+@app.route('/backtest/sweep', methods=['POST'])
+@require_auth
+def run_sweep_route():
+    """
+    Sweep a strategy over a grid of parameters and rank the results.
+
+    `grid` maps parameter names to a list of values or a {min, max, step}
+    range; unlisted parameters keep their defaults. Returns the ranked table
+    (the first `top` rows, default 25) and stores the whole sweep as one
+    record. `materialize_top` additionally stores the best N as full runs.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        top = max(1, int(body.get("top", 25)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "top must be an integer"}), 400
+    try:
+        sweep = execute_sweep(
+            g.user_email,
+            strategy=body.get("strategy"),
+            grid=body.get("grid"),
+            ticker=body.get("ticker"),
+            universe=body.get("universe"),
+            start=body.get("start"),
+            end=body.get("end"),
+            starting_cash=body.get("starting_cash", 10000),
+            rank_by=body.get("rank_by") or "sharpe",
+            materialize_top=body.get("materialize_top", 0),
+        )
+    except BacktestError as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
+    evaluated = len(sweep["results"])
+    sweep["evaluated"] = evaluated
+    sweep["results"] = sweep["results"][:top]
+    return jsonify(json_safe(sweep)), 200
+
+@app.route('/backtest/walk-forward', methods=['POST'])
+@require_auth
+def run_walk_forward_route():
+    """
+    Walk-forward optimise a strategy over a parameter grid.
+
+    Takes the same `grid` as /backtest/sweep plus `in_sample_bars` and
+    `out_of_sample_bars`. Each in-sample window picks the best parameters by
+    `rank_by`; the out-of-sample periods are stitched into one equity curve
+    and stored as a backtest run.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        result = execute_walk_forward(
+            g.user_email,
+            strategy=body.get("strategy"),
+            grid=body.get("grid"),
+            ticker=body.get("ticker"),
+            universe=body.get("universe"),
+            start=body.get("start"),
+            end=body.get("end"),
+            starting_cash=body.get("starting_cash", 10000),
+            rank_by=body.get("rank_by") or "sharpe",
+            in_sample_bars=body.get("in_sample_bars"),
+            out_of_sample_bars=body.get("out_of_sample_bars"),
+        )
+    except BacktestError as e:
+        return jsonify({"error": str(e), **e.extra}), e.status
+    return jsonify(json_safe(result)), 200
+
 @app.route('/backtest-runs', methods=['GET'])
 @require_auth
 def list_backtest_runs():
@@ -1897,6 +3228,43 @@ def set_backtest_note(run_id):
     db.session.commit()
     return jsonify({"id": str(run.id), "notes": run.notes}), 200
 
+@app.route('/backtest-runs/<run_id>/bootstrap', methods=['POST'])
+@require_auth
+def bootstrap_backtest_run(run_id):
+    """
+    Confidence intervals on a stored run's CAGR, Sharpe and max drawdown.
+
+    Block-bootstraps the run's daily returns (`paths`, `block`, `seed`; see
+    backtesting.bootstrap_metrics). Read-only and deterministic for a given
+    seed, so nothing is stored: the same request on the same run always
+    returns the same distributions.
+    """
+    try:
+        uuid.UUID(str(run_id))
+    except (ValueError, AttributeError):
+        return jsonify({"error": "Invalid run id"}), 400
+
+    body = request.get_json(silent=True) or {}
+    try:
+        paths = int(body.get("paths", backtesting.DEFAULT_BOOTSTRAP_PATHS))
+        block = int(body.get("block", backtesting.DEFAULT_BOOTSTRAP_BLOCK))
+        seed = int(body.get("seed", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "paths, block and seed must be integers"}), 400
+
+    run = BacktestRun.query.filter_by(id=run_id, actor_email=g.user_email).first()
+    if not run:
+        return jsonify({"error": "Backtest run not found"}), 404
+
+    equity_curve, _ = backtest_run_results(run)
+    equity = [point["equity"] for point in (equity_curve or [])]
+    try:
+        result = backtesting.bootstrap_metrics(equity, paths=paths, block=block, seed=seed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result["backtest_run_id"] = str(run.id)
+    return jsonify(json_safe(result)), 200
+
 # ---------------------------------------------- Portfolio analytics ------------------------------------------------------------------------------
 
 @app.route('/portfolio-summary', methods=['GET'])
@@ -1918,12 +3286,13 @@ def portfolio_summary():
     prev_value = 0.0            # portfolio value at yesterday's close
     day_change_known = False    # False if no holding had a previous close
 
+    quotes = get_quote_pairs([h.ticker for h in owned])
     for h in owned:
         shares = int(h.num_shares)
         avg_price = float(h.avg_price)
         cost_basis = avg_price * shares
 
-        last, prev = get_quote_pair(h.ticker)
+        last, prev = quotes[h.ticker]
         # Fall back to cost basis so an unavailable quote doesn't zero out the
         # portfolio; the position is flagged so the UI can mark it stale.
         market_price = float(last) if last is not None else avg_price
@@ -2033,9 +3402,9 @@ def _extract_news_item(item):
         return None
     return {"headline": headline.strip(), "link": link or ""}
 
-def get_news_via_yfinance(ticker):
-    """Preferred source: yfinance's news API, which is maintained upstream."""
-    items = yf.Ticker(ticker).news or []
+def get_news_via_provider(ticker):
+    """Preferred source: the market-data provider's news API."""
+    items = market_data.news(ticker)
     out = []
     for item in items:
         parsed = _extract_news_item(item)
@@ -2086,17 +3455,24 @@ def get_news_via_scrape(ticker):
 
 def get_stock_news(ticker):
     """
-    Latest headlines for a ticker, preferring the yfinance API over scraping.
+    Latest headlines for a ticker, preferring the provider's API over scraping.
+
+    The scrape goes to Yahoo whatever the provider, so only a provider with
+    allows_scrape_fallback falls back to it; a replay run stays offline.
     """
     try:
-        items = get_news_via_yfinance(ticker)
+        items = get_news_via_provider(ticker)
         if items:
             return items
-        print(f"yfinance returned no news for {ticker}; falling back to scrape.")
+        print(f"{market_data.name} returned no news for {ticker}; falling back to scrape.")
     except Exception as e:
         # Rate limits and upstream changes both land here.
-        print(f"yfinance news failed for {ticker}: {e}; falling back to scrape.")
+        if not market_data.allows_scrape_fallback:
+            raise
+        print(f"{market_data.name} news failed for {ticker}: {e}; falling back to scrape.")
 
+    if not market_data.allows_scrape_fallback:
+        return []
     return get_news_via_scrape(ticker)
 
 # TextBlob's lexicon is general-purpose and scores most market vocabulary as
@@ -2220,6 +3596,69 @@ def fetchSentiAnal():
     return jsonify(result), 200
 
 # fetches the data for making the price chart
+def _fetch_price_chart(stock):
+    """
+    SingleFlight fetch for a ("price", stock) chart, or None if there is no data.
+
+    A year of closes with their 20/50-day moving averages and crossovers,
+    stored as a snapshot and committed, so every caller sharing the flight
+    cites the same snapshot_ref.
+    """
+    closes = market_data.closes([stock], period="1y").get(stock)  # Fetch 1 year of historical data
+    if closes is None:
+        return None
+    hist = closes.to_frame(name="Close")
+
+    # Attach the 20/50-day moving averages, then find their crossovers.
+    hist = calculate_moving_averages(hist)
+    crossovers = generate_trading_signals(hist)
+
+    # Format data for frontend. MA values are None until enough history
+    # accumulates, which recharts renders as a gap rather than a zero.
+    series = [
+        {
+            "date": str(index.date()),
+            "price": round(float(row["Close"]), 4),
+            "ma20": None if pd.isna(row["MA_20"]) else round(float(row["MA_20"]), 4),
+            "ma50": None if pd.isna(row["MA_50"]) else round(float(row["MA_50"]), 4),
+        }
+        for index, row in hist.iterrows()
+    ]
+
+    signals = [
+        {
+            "date": str(index.date()),
+            "price": round(float(row["Close"]), 4),
+            # "Buy" == golden cross (MA20 crossing above MA50), "Sell" == death cross.
+            "signal": row["Signal"],
+        }
+        for index, row in crossovers.iterrows()
+    ]
+
+    data = {
+        "ticker": stock,
+        "series": series,
+        "signals": signals,
+        "signal_strategy": "ma20_50_crossover",
+    }
+
+    snapshot_id = put_snapshot("price", data, ticker=stock)
+    # Signals are what a later agent would act on, so record their
+    # generation against the exact price snapshot they came from.
+    if signals:
+        write_audit(
+            "signals_generated",
+            entity=stock,
+            payload={
+                "strategy": "ma20_50_crossover",
+                "signal_count": len(signals),
+                "latest": signals[-1],
+            },
+            snapshot_ref=snapshot_id,
+        )
+    db.session.commit()
+    return {**data, "snapshot_ref": snapshot_id}
+
 @app.route('/get-chart-data', methods=['GET'])
 @require_auth
 def fetchPriceChartData():
@@ -2235,63 +3674,9 @@ def fetchPriceChartData():
     if isinstance(cached, dict) and "series" in cached:
         return jsonify(cached), 200
 
+    # Concurrent misses for the same ticker share one fetch and one snapshot.
     try:
-        stock_data = yf.Ticker(stock)
-        hist = stock_data.history(period="1y")  # Fetch 1 year of historical data
-
-        if hist.empty:
-            return jsonify({"error": "Invalid stock symbol or no data available"}), 400
-
-        # Attach the 20/50-day moving averages, then find their crossovers.
-        hist = calculate_moving_averages(hist)
-        crossovers = generate_trading_signals(hist)
-
-        # Format data for frontend. MA values are None until enough history
-        # accumulates, which recharts renders as a gap rather than a zero.
-        series = [
-            {
-                "date": str(index.date()),
-                "price": round(float(row["Close"]), 4),
-                "ma20": None if pd.isna(row["MA_20"]) else round(float(row["MA_20"]), 4),
-                "ma50": None if pd.isna(row["MA_50"]) else round(float(row["MA_50"]), 4),
-            }
-            for index, row in hist.iterrows()
-        ]
-
-        signals = [
-            {
-                "date": str(index.date()),
-                "price": round(float(row["Close"]), 4),
-                # "Buy" == golden cross (MA20 crossing above MA50), "Sell" == death cross.
-                "signal": row["Signal"],
-            }
-            for index, row in crossovers.iterrows()
-        ]
-
-        data = {
-            "ticker": stock,
-            "series": series,
-            "signals": signals,
-            "signal_strategy": "ma20_50_crossover",
-        }
-
-        snapshot_id = put_snapshot("price", data, ticker=stock)
-        # Signals are what a later agent would act on, so record their
-        # generation against the exact price snapshot they came from.
-        if signals:
-            write_audit(
-                "signals_generated",
-                entity=stock,
-                payload={
-                    "strategy": "ma20_50_crossover",
-                    "signal_count": len(signals),
-                    "latest": signals[-1],
-                },
-                snapshot_ref=snapshot_id,
-            )
-        db.session.commit()
-        data["snapshot_ref"] = snapshot_id
-        return jsonify(data)
+        data = single_flight.do(("price", stock), lambda: _fetch_price_chart(stock))
     except Exception as e:
         db.session.rollback()
         # Fall back to stale data rather than breaking the chart entirely.
@@ -2301,6 +3686,10 @@ def fetchPriceChartData():
         status = 429 if ("Rate limit" in str(e) or "Too Many Requests" in str(e)) else 500
         return jsonify({"error": str(e)}), status
 
+    if data is None:
+        return jsonify({"error": "Invalid stock symbol or no data available"}), 400
+    return jsonify(data)
+
 
 # --------------------------------------------------------------------------- helper functions -------------------------------------------------------------------------
 def growthEstimate(stock):
@@ -2473,8 +3862,9 @@ def _broadcast_quotes():
                 # Room names that look like tickers are the subscriptions;
                 # every client also sits in a room named after its own sid.
                 tickers = [r for r in rooms.keys() if r and r.isupper()]
+                quotes = get_quote_pairs(tickers)
                 for ticker in tickers:
-                    last, prev = get_quote_pair(ticker)
+                    last, prev = quotes[ticker]
                     if last is None:
                         continue
                     change = (last - prev) if prev is not None else None
@@ -2534,70 +3924,482 @@ def apply_light_migrations():
     statements = [
         "ALTER TABLE backtest_run ADD COLUMN IF NOT EXISTS notes TEXT",
         "ALTER TABLE agent_proposal ADD COLUMN IF NOT EXISTS agent_run_id UUID",
+        "ALTER TABLE market_snapshot ADD COLUMN IF NOT EXISTS data BYTEA",
+        "ALTER TABLE market_snapshot ALTER COLUMN payload DROP NOT NULL",
+        "ALTER TABLE market_snapshot ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64) "
+        "REFERENCES snapshot_content (hash)",
+        "CREATE INDEX IF NOT EXISTS ix_market_snapshot_content_hash ON market_snapshot (content_hash)",
+        "ALTER TABLE snapshot_content ALTER COLUMN payload DROP NOT NULL",
+        "ALTER TABLE snapshot_content ADD COLUMN IF NOT EXISTS codec VARCHAR(16)",
+        "ALTER TABLE backtest_run ADD COLUMN IF NOT EXISTS results_blob BYTEA",
     ]
     with db.engine.begin() as conn:
         for stmt in statements:
             conn.execute(text(stmt))
-
-def collect_referenced_snapshot_ids():
-    """
-    Every market_snapshot id cited as evidence somewhere.
-
-    A snapshot has two lives: a freshness cache, and immutable evidence a
-    decision was based on. The second must never be pruned or the decision stops
-    being reproducible — so retention has to know exactly which snapshots are
-    still pointed at, across the audit ledger, backtests and proposals.
-    """
-    referenced = set()
-
-    for (sid,) in (db.session.query(AuditLog.snapshot_ref)
-                   .filter(AuditLog.snapshot_ref.isnot(None)).distinct()):
-        referenced.add(str(sid))
-
-    for model in (BacktestRun, AgentProposal):
-        for (arr,) in (db.session.query(model.snapshot_refs)
-                       .filter(model.snapshot_refs.isnot(None))):
-            for ref in (arr or []):
-                referenced.add(str(ref))
-
-    return referenced
-
-def prune_snapshots(days=90, dry_run=False):
+        # market_snapshot_latest arrived after market_snapshot: seed it once
+        # from existing history, or every read would miss until the next
+        # refresh of each key.
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM market_snapshot_latest)")).scalar():
+            conn.execute(text(SNAPSHOT_POINTER_BACKFILL_SQL.format(where="")))
+
+PRUNE_CHUNK_ROWS = 5000
+
+# Every market_snapshot id cited as evidence, as text.
+#
+# A snapshot has two lives: a freshness cache, and immutable evidence a
+# decision was based on. The second must never be pruned or the decision stops
+# being reproducible — so retention has to know exactly which snapshots are
+# still pointed at, across the audit ledger, backtests and proposals. Kept as
+# SQL so pruning is an anti-join in the database rather than a Python set.
+_EVIDENCE_REFS_SQL = """
+    SELECT snapshot_ref::text AS id FROM audit_log WHERE snapshot_ref IS NOT NULL
+    UNION SELECT jsonb_array_elements_text(snapshot_refs) FROM backtest_run
+        WHERE jsonb_typeof(snapshot_refs) = 'array'
+    UNION SELECT jsonb_array_elements_text(snapshot_refs) FROM backtest_sweep
+        WHERE jsonb_typeof(snapshot_refs) = 'array'
+    UNION SELECT jsonb_array_elements_text(snapshot_refs) FROM agent_proposal
+        WHERE jsonb_typeof(snapshot_refs) = 'array'
+"""
+
+def prune_snapshots(days=90, dry_run=False, chunk_rows=PRUNE_CHUNK_ROWS, progress=None):
     """
     Delete cache snapshots older than `days`, preserving any cited as evidence.
 
     Returns a summary. Evidence snapshots are kept regardless of age; only stale,
     uncited cache rows are removed, so the audit trail stays fully reproducible.
+
+    Runs as SQL anti-joins against the evidence references and never loads a
+    payload. Deletes go `chunk_rows` at a time, oldest first, each chunk its
+    own transaction, so locks stay short and an interrupted run keeps what it
+    finished. Evidence is re-read for every chunk, so a citation added
+    mid-run is still honoured. `progress`, if given, is called with a line of
+    text after each chunk.
     """
+    from sqlalchemy import text
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    referenced = collect_referenced_snapshot_ids()
 
-    old = MarketSnapshot.query.filter(MarketSnapshot.fetched_at < cutoff).all()
-    victims = [s for s in old if str(s.id) not in referenced]
+    older, kept = db.session.execute(text(f"""
+        WITH evidence AS ({_EVIDENCE_REFS_SQL})
+        SELECT count(*),
+               count(*) FILTER (WHERE EXISTS (SELECT 1 FROM evidence e WHERE e.id = s.id::text))
+        FROM market_snapshot s
+        WHERE s.fetched_at < :cutoff
+    """), {"cutoff": cutoff}).one()
 
     summary = {
         "cutoff": cutoff.isoformat(),
         "retention_days": days,
-        "older_than_cutoff": len(old),
-        "kept_as_evidence": len(old) - len(victims),
-        "prunable": len(victims),
+        "older_than_cutoff": older,
+        "kept_as_evidence": kept,
+        "prunable": older - kept,
         "dry_run": dry_run,
     }
-    if not dry_run and victims:
-        for s in victims:
-            db.session.delete(s)
+    db.session.commit()
+    if dry_run or older == kept:
+        return summary
+
+    delete_chunk = text(f"""
+        WITH evidence AS ({_EVIDENCE_REFS_SQL})
+        DELETE FROM market_snapshot
+        WHERE id IN (
+            SELECT s.id FROM market_snapshot s
+            WHERE s.fetched_at < :cutoff
+              AND NOT EXISTS (SELECT 1 FROM evidence e WHERE e.id = s.id::text)
+            ORDER BY s.fetched_at
+            LIMIT :limit
+        )
+        RETURNING kind, ticker, content_hash
+    """)
+    deleted = content_deleted = chunks = 0
+    try:
+        while True:
+            rows = db.session.execute(delete_chunk, {"cutoff": cutoff, "limit": chunk_rows}).all()
+            if not rows:
+                break
+            # Deleting a key's newest row cascades its pointer away; repoint
+            # it at whatever older row survived.
+            backfill_snapshot_pointers(keys={(r.kind, r.ticker or "") for r in rows})
+            content_deleted += delete_orphaned_snapshot_content(
+                {r.content_hash for r in rows if r.content_hash is not None}
+            )
+            db.session.commit()
+            if price_cache is not None:
+                for ticker in {r.ticker for r in rows if r.kind == "price_history" and r.ticker}:
+                    _drop_local_closes(ticker)
+            deleted += len(rows)
+            chunks += 1
+            if progress:
+                progress(f"  chunk {chunks}: deleted {deleted}/{summary['prunable']}")
+    finally:
+        snapshot_cache.invalidate()
+
+    summary["deleted"] = deleted
+    summary["content_deleted"] = content_deleted
+    summary["chunks"] = chunks
+    return summary
+
+def delete_orphaned_snapshot_content(hashes=None):
+    """
+    Delete snapshot_content bodies no market_snapshot row cites any more.
+
+    With `hashes`, only those bodies are considered. Bodies locked by a
+    put_snapshot still in flight are skipped: it is about to cite them (see
+    _store_snapshot_content). Returns the number deleted. Committed by the
+    caller.
+    """
+    from sqlalchemy import text
+    if hashes is not None and not hashes:
+        return 0
+    where = "c.hash = ANY(:hashes) AND" if hashes is not None else ""
+    return db.session.execute(text(f"""
+        DELETE FROM snapshot_content
+        WHERE hash IN (
+            SELECT c.hash FROM snapshot_content c
+            WHERE {where} NOT EXISTS (SELECT 1 FROM market_snapshot s WHERE s.content_hash = c.hash)
+            FOR UPDATE SKIP LOCKED
+        )
+    """), {"hashes": list(hashes or ())}).rowcount
+
+SNAPSHOT_POINTER_BACKFILL_SQL = """
+    INSERT INTO market_snapshot_latest (kind, ticker, snapshot_id, fetched_at)
+    SELECT DISTINCT ON (kind, COALESCE(ticker, ''))
+           kind, COALESCE(ticker, ''), id, fetched_at
+    FROM market_snapshot
+    {where}
+    ORDER BY kind, COALESCE(ticker, ''), fetched_at DESC
+    ON CONFLICT (kind, ticker) DO UPDATE
+        SET snapshot_id = EXCLUDED.snapshot_id, fetched_at = EXCLUDED.fetched_at
+        WHERE market_snapshot_latest.fetched_at < EXCLUDED.fetched_at
+"""
+
+def backfill_snapshot_pointers(keys=None):
+    """
+    Point market_snapshot_latest at the newest row of every (kind, ticker).
+
+    Idempotent: only missing pointers, or ones behind a newer row, change.
+    Used once when upgrading an existing database, and after pruning, where
+    `keys` limits it to the (kind, ticker) pairs just touched ("" for
+    universe-wide). Returns the number of pointers written. Committed by the
+    caller.
+    """
+    from sqlalchemy import text
+    if keys is None:
+        return db.session.execute(text(SNAPSHOT_POINTER_BACKFILL_SQL.format(where=""))).rowcount
+    if not keys:
+        return 0
+    kinds, tickers = zip(*keys)
+    sql = SNAPSHOT_POINTER_BACKFILL_SQL.format(where="""
+        WHERE (kind, COALESCE(ticker, '')) IN (
+            SELECT * FROM unnest(CAST(:kinds AS text[]), CAST(:tickers AS text[])))
+    """)
+    return db.session.execute(text(sql), {"kinds": list(kinds), "tickers": list(tickers)}).rowcount
+
+def compress_payload_history(chunk_rows=PRUNE_CHUNK_ROWS, progress=None):
+    """
+    Bring rows written before compression up to the current storage format.
+
+    Three passes, each keyset-paginated with a commit per chunk so it can be
+    interrupted and rerun: inline market_snapshot bodies move into
+    snapshot_content (deduplicated, compressed when large), plain
+    snapshot_content bodies over COMPRESS_MIN_BYTES are compressed, and large
+    BacktestRun curves and trades move into results_blob. Only the storage
+    changes; every id, hash and decoded value stays the same. Returns counts.
+    """
+    from sqlalchemy import text
+    summary = {"snapshots_moved": 0, "contents_compressed": 0, "runs_compressed": 0}
+
+    after = None
+    while True:
+        q = (MarketSnapshot.query.options(db.noload(MarketSnapshot.content))
+             .filter(MarketSnapshot.content_hash.is_(None)))
+        if after is not None:
+            q = q.filter(MarketSnapshot.id > after)
+        rows = q.order_by(MarketSnapshot.id).limit(chunk_rows).all()
+        if not rows:
+            break
+        for row in rows:
+            body = canonical_json(row.payload)
+            content_hash = snapshot_content_hash(body, row.data)
+            _store_snapshot_content(row.kind, row.payload, body, row.data, content_hash)
+            row.content_hash, row.payload, row.data = content_hash, None, None
+        after = rows[-1].id
         db.session.commit()
-        summary["deleted"] = len(victims)
+        summary["snapshots_moved"] += len(rows)
+        if progress:
+            progress(f"  snapshots moved: {summary['snapshots_moved']}")
+
+    after = ""
+    while True:
+        hashes = db.session.execute(text("""
+            SELECT hash FROM snapshot_content
+            WHERE codec IS NULL AND hash > :after
+              AND octet_length(payload::text) + COALESCE(octet_length(data), 0) >= :min_bytes
+            ORDER BY hash LIMIT :limit
+        """), {"after": after, "min_bytes": COMPRESS_MIN_BYTES, "limit": chunk_rows}).scalars().all()
+        if not hashes:
+            break
+        kinds = dict(db.session.query(MarketSnapshot.content_hash, MarketSnapshot.kind)
+                     .filter(MarketSnapshot.content_hash.in_(hashes)).distinct())
+        for content in SnapshotContent.query.filter(SnapshotContent.hash.in_(hashes)):
+            values = _content_values(kinds.get(content.hash, "snapshot"), content.payload,
+                                     canonical_json(content.payload), content.data)
+            content.payload, content.data, content.codec = values["payload"], values["data"], values["codec"]
+        after = hashes[-1]
+        db.session.commit()
+        summary["contents_compressed"] += len(hashes)
+        if progress:
+            progress(f"  contents compressed: {summary['contents_compressed']}")
+
+    after = None
+    while True:
+        q = (BacktestRun.query.options(db.undefer_group("results"))
+             .filter(BacktestRun.results_blob.is_(None), BacktestRun.equity_curve.isnot(None)))
+        if after is not None:
+            q = q.filter(BacktestRun.id > after)
+        runs = q.order_by(BacktestRun.id).limit(chunk_rows).all()
+        if not runs:
+            break
+        for run in runs:
+            values = _backtest_results_values(run.equity_curve, run.trades)
+            if values["results_blob"] is not None:
+                run.equity_curve, run.trades, run.results_blob = None, None, values["results_blob"]
+                summary["runs_compressed"] += 1
+        after = runs[-1].id
+        db.session.commit()
+        if progress:
+            progress(f"  backtest runs compressed: {summary['runs_compressed']}")
+
+    summary["compression"] = compression_stats.stats()
     return summary
 
+# ------------------------------------------------------- scheduled jobs -------------------------------------------------------------------------------
+
+# Without these the expensive work — scoring recs, downloading price
+# histories, pruning — only happens when a user request misses the cache, and
+# that user waits for it. Each job is a plain function returning a summary;
+# run_job() wraps it in a lock and a job_run row, and the scheduler command
+# runs whichever are due. Nothing runs inside the web process: the host's cron
+# (or a long-running `flask --app app scheduler`) drives them.
+
+SNAPSHOT_RETENTION_DAYS = int(os.getenv("SNAPSHOT_RETENTION_DAYS", "90"))
+# Tickers per provider call when warming price histories.
+WARM_BATCH_TICKERS = 50
+# A job that failed is retried no sooner than this, however overdue it is.
+JOB_RETRY_SECONDS = 15 * 60
+SCHEDULER_POLL_SECONDS = 60
+
+def _tracked_tickers(held=True):
+    """Every ticker any user has pinned, and with `held` every one they own."""
+    cond = Holdings.pinned.is_(True)
+    if held:
+        cond = db.or_(cond, Holdings.num_shares != 0)
+    return sorted({t for (t,) in db.session.query(Holdings.ticker).filter(cond).distinct()})
+
+def refresh_recs_job():
+    """
+    Re-score the stale recs of the S&P 500 and every user's pins.
+
+    Anything due to expire before the next run counts as stale too, so
+    /fetch-recs should always find the universe fresh.
+    """
+    universe = sorted(set(sp500_tickers) | set(_tracked_tickers(held=False)))
+    _, stale = stale_recs_tickers(universe, within=JOBS["refresh-recs"][1])
+    db.session.commit()
+    summary = {"universe": len(universe), "stale": len(stale)}
+    if stale:
+        summary["scan"] = recs_scan.run(stale)
+    return summary
+
+def warm_price_history_job(batch=WARM_BATCH_TICKERS):
+    """
+    Download price_history for every held or pinned ticker not fresh enough.
+
+    As with recs, a history that would expire before the next run is
+    refreshed now, so a backtest on a user's own names never waits on a
+    download. Batched through fetch_price_history, which only fetches the
+    recent bars of a history it can extend.
+    """
+    tickers = _tracked_tickers()
+    fresh = get_price_histories(
+        tickers, max_age_seconds=BACKTEST_HISTORY_TTL - JOBS["warm-price-history"][1])
+    stale = [t for t in tickers if t not in fresh]
+    refreshed, failed = 0, []
+    for i in range(0, len(stale), batch):
+        chunk = stale[i:i + batch]
+        try:
+            fetched = single_flight.do_many([("price_history", t) for t in chunk],
+                                            _fetch_price_histories)
+        except Exception as e:
+            print(f"Price history download failed for {len(chunk)} tickers: {e}")
+            fetched = {}
+        for ticker in chunk:
+            if fetched.get(("price_history", ticker)) is not None:
+                refreshed += 1
+            else:
+                failed.append(ticker)
+    return {"tickers": len(tickers), "fresh": len(fresh), "refreshed": refreshed, "failed": failed}
+
+def prune_snapshots_job():
+    """prune_snapshots() at SNAPSHOT_RETENTION_DAYS."""
+    return prune_snapshots(days=SNAPSHOT_RETENTION_DAYS, progress=print)
+
+# name -> (function, seconds between runs). Recs and price histories are
+# refreshed at half their TTL, so each run catches what would otherwise
+# expire before the next.
+JOBS = {
+    "refresh-recs": (refresh_recs_job, SNAPSHOT_TTL_SECONDS["recs"] // 2),
+    "warm-price-history": (warm_price_history_job, BACKTEST_HISTORY_TTL // 2),
+    "prune-snapshots": (prune_snapshots_job, 24 * 3600),
+}
+
+@contextmanager
+def job_lock(name):
+    """
+    Hold the Postgres advisory lock for job `name`; yields whether it was got.
+
+    The lock lives on its own connection for as long as the job runs, so it
+    is shared by every process on the database, and is released by Postgres
+    if the process dies mid-job. Never waits: a job someone else is running
+    is simply not run twice.
+    """
+    from sqlalchemy import text
+    key = {"key": f"job:{name}"}
+    conn = db.engine.connect()
+    try:
+        held = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), key).scalar()
+        conn.commit()
+        try:
+            yield held
+        finally:
+            if held:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), key)
+                conn.commit()
+    finally:
+        conn.close()
+
+def job_is_due(name):
+    """True if `name` has not completed within its interval, nor failed just now."""
+    interval = JOBS[name][1]
+    now = datetime.now(timezone.utc)
+    last_completed, last_started = db.session.query(
+        db.func.max(JobRun.started_at).filter(JobRun.status == "completed"),
+        db.func.max(JobRun.started_at),
+    ).filter(JobRun.job == name).one()
+    return ((last_completed is None or now - last_completed >= timedelta(seconds=interval))
+            and (last_started is None or now - last_started >= timedelta(seconds=JOB_RETRY_SECONDS)))
+
+def run_job(name, only_if_due=False):
+    """
+    Run job `name` under its lock, recorded as a JobRun.
+
+    Returns the finished JobRun, or None if another process holds the lock or,
+    with `only_if_due`, if the job is not due. Due-ness is checked under the
+    lock, so two schedulers racing for the same job run it once. A job that
+    raises is recorded as failed with its error; it does not propagate.
+    """
+    with job_lock(name) as held:
+        if not held or (only_if_due and not job_is_due(name)):
+            db.session.rollback()
+            return None
+        run = JobRun(job=name, host=socket.gethostname())
+        db.session.add(run)
+        db.session.commit()
+
+        started = time.perf_counter()
+        try:
+            summary = JOBS[name][0]()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {name} failed: {e}")
+            run.status, run.error = "failed", f"{type(e).__name__}: {e}"
+        else:
+            run.status, run.summary = "completed", json_safe(summary)
+        run.finished_at = datetime.now(timezone.utc)
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        db.session.commit()
+        return run
+
+def run_scheduler(once=False, poll_seconds=SCHEDULER_POLL_SECONDS):
+    """Run every due job, then wait `poll_seconds` and repeat; with `once`, stop after one pass."""
+    while True:
+        for name in JOBS:
+            run = run_job(name, only_if_due=True)
+            if run is not None:
+                print(f"{name}: {run.status} in {run.duration_ms} ms")
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+@app.cli.command("run-job")
+@click.argument("name", type=click.Choice(list(JOBS)))
+def run_job_command(name):
+    """Run one scheduled job now, whether or not it is due."""
+    run = run_job(name)
+    if run is None:
+        raise click.ClickException(f"{name} is already running elsewhere")
+    for k, v in (run.summary or {}).items():
+        print(f"  {k}: {v}")
+    print(f"  duration_ms: {run.duration_ms}")
+    if run.status != "completed":
+        raise click.ClickException(run.error)
+
+@app.cli.command("scheduler")
+@click.option("--once", is_flag=True,
+              help="Run whatever is due once and exit, for an external cron.")
+@click.option("--poll-seconds", default=SCHEDULER_POLL_SECONDS, show_default=True,
+              help="Seconds between checks for due jobs.")
+def scheduler_command(once, poll_seconds):
+    """Run scheduled jobs as they fall due."""
+    run_scheduler(once=once, poll_seconds=poll_seconds)
+
+@app.cli.command("job-runs")
+@click.option("--limit", default=20, show_default=True, help="Most recent runs to list.")
+def job_runs_command(limit):
+    """List recent job runs, newest first."""
+    for run in JobRun.query.order_by(JobRun.started_at.desc()).limit(limit):
+        took = f"{run.duration_ms} ms" if run.duration_ms is not None else "-"
+        print(f"  {run.started_at:%Y-%m-%d %H:%M:%S} {run.job:<20} {run.status:<10} {took:>10}"
+              f"  {run.error or ''}")
+
+@app.cli.command("record-market-data")
+@click.argument("tickers", nargs=-1, required=True)
+@click.option("--out", "directory", required=True, type=click.Path(file_okay=False),
+              help="Fixture directory, for MARKET_DATA_FIXTURES.")
+@click.option("--start", default=BACKTEST_HISTORY_START, show_default=True,
+              help="First date of closes to record.")
+def record_market_data_command(tickers, directory, start):
+    """Record tickers from yfinance as fixtures for the replay provider."""
+    source = YFinanceProvider()
+    for ticker in tickers:
+        path = record_fixture(source, ticker.upper(), directory, start=start)
+        print(f"  {ticker.upper()}: {path}")
+
+@app.cli.command("compress-payloads")
+@click.option("--chunk-rows", default=PRUNE_CHUNK_ROWS, show_default=True,
+              help="Rows rewritten per transaction.")
+def compress_payloads_command(chunk_rows):
+    """Move history written before compression into the compressed format (idempotent)."""
+    summary = compress_payload_history(chunk_rows=chunk_rows, progress=print)
+    for k, v in summary.items():
+        print(f"  {k}: {v}")
+
+@app.cli.command("backfill-snapshot-pointers")
+def backfill_snapshot_pointers_command():
+    """Build market_snapshot_latest from existing snapshots (idempotent)."""
+    written = backfill_snapshot_pointers()
+    db.session.commit()
+    print(f"  pointers written: {written}")
+
 @app.cli.command("prune-snapshots")
 @click.option("--days", default=90, show_default=True,
               help="Delete cache snapshots older than this many days.")
 @click.option("--dry-run", is_flag=True,
               help="Report what would be deleted without deleting anything.")
-def prune_snapshots_command(days, dry_run):
+@click.option("--chunk-rows", default=PRUNE_CHUNK_ROWS, show_default=True,
+              help="Rows deleted per transaction.")
+def prune_snapshots_command(days, dry_run, chunk_rows):
     """Prune stale market_snapshot rows, keeping any cited as evidence."""
-    summary = prune_snapshots(days=days, dry_run=dry_run)
+    summary = prune_snapshots(days=days, dry_run=dry_run, chunk_rows=chunk_rows, progress=print)
     for k, v in summary.items():
         print(f"  {k}: {v}")
 
@@ -2617,7 +4419,14 @@ def init_db_command():
 @app.route("/health", methods=["GET"])
 def health():
     """Unauthenticated liveness probe for the host's health checks."""
-    return jsonify({"status": "ok"}), 200
+    return jsonify({
+        "status": "ok",
+        "snapshot_cache": snapshot_cache.stats(),
+        "price_cache": price_cache.stats() if price_cache is not None else None,
+        "compression": compression_stats.stats(),
+        "single_flight": single_flight.stats(),
+        "market_data": market_data.stats(),
+    }), 200
 
 if __name__ == "__main__":
     # Create tables if they don't exist yet (safe/idempotent) so a fresh
@@ -17,12 +17,27 @@ Two engines live here:
                     periodically, optionally market-neutral (short the
                     bottom of the cross-section).
 
+run_sweep evaluates a whole grid of parameter sets on one price history and
+returns a ranked table of metrics, fanned out over a process pool.
+bootstrap_metrics turns a run's single CAGR, Sharpe and drawdown into
+distributions over block-resampled histories.
+run_walk_forward re-picks the best set on a rolling in-sample window and
+trades it only on the bars that follow, so the stitched curve is out of sample.
+
 STRATEGY_SPECS is the single source of truth for what parameters a strategy
 takes. The API serves it to the UI so forms are generated rather than
 hard-coded, it validates user input, and it is the schema the AI agent fills
 in when it proposes a strategy to test.
 """
 
+import hashlib
+import itertools
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
 import numpy as np
 import pandas as pd
 
@@ -34,15 +49,156 @@ DEFAULT_COST_BPS = 10.0   # 0.10% commission+spread
 DEFAULT_SLIPPAGE_BPS = 5.0  # 0.05% adverse fill
 
 
+# --------------------------------------------------------------------------
+# Indicator cache
+# --------------------------------------------------------------------------
+
+# Cached indicator series are kept until this many bytes are held, then the
+# least recently used are dropped. A 10-year daily series is ~45 KB, so this
+# holds well over a thousand of them.
+INDICATOR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _fingerprint(data):
+    """
+    Content hash of a price Series or DataFrame: values, dates and columns.
+
+    Two loads of the same snapshot produce different objects with the same
+    prices, so the cache keys on what the data is rather than which object it
+    happens to be.
+    """
+    # SHA-1 as a fast content checksum, not for security: it is hardware
+    # accelerated, so hashing ten years of bars costs far less than a rolling
+    # window over them.
+    h = hashlib.sha1(usedforsecurity=False)
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    index = data.index
+    h.update(str(index.dtype).encode())
+    if isinstance(index, pd.DatetimeIndex):
+        h.update(index.asi8.tobytes())
+    else:
+        h.update(pd.util.hash_pandas_object(index, index=False).to_numpy().tobytes())
+    if isinstance(data, pd.DataFrame):
+        h.update(repr(list(data.columns)).encode())
+    return h.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Bounded LRU of indicator results, keyed by price fingerprint and arguments.
+
+    Sweeps and repeated backtests on one ticker ask for the same moving
+    averages over and over; this returns the series computed the first time.
+    Results are shared between callers, so they must be treated as read-only —
+    every strategy here derives new series from them rather than writing in.
+
+    Safe to share between threads: the web server runs backtests on several
+    request threads at once.
+    """
+
+    def __init__(self, max_bytes=INDICATOR_CACHE_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, name, data, args, compute):
+        key = (name, _fingerprint(data), args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Computed outside the lock so one slow indicator does not stall every
+        # other thread; two threads racing on the same key both compute it.
+        value = compute()
+        nbytes = int(value.memory_usage(index=False, deep=False)
+                     if isinstance(value, pd.Series)
+                     else value.memory_usage(index=False).sum())
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (value, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, (_, dropped) = self._entries.popitem(last=False)
+                    self._bytes -= dropped
+                    self.evictions += 1
+        return value
+
+    def prime(self, name, data, results):
+        """
+        Store precomputed results for several argument tuples of one indicator.
+
+        `results` maps args -> value, as get_or_compute would have produced
+        them. The data is fingerprinted once for the whole batch.
+        """
+        fingerprint = _fingerprint(data)
+        with self._lock:
+            for args, value in results.items():
+                key = (name, fingerprint, args)
+                nbytes = int(value.memory_usage(index=False, deep=False))
+                if key in self._entries or nbytes > self.max_bytes:
+                    continue
+                self._entries[key] = (value, nbytes)
+                self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
+
+indicator_cache = IndicatorCache()
+
+
 # --------------------------------------------------------------------------
 # Indicator helpers
 # --------------------------------------------------------------------------
+# Each reads through indicator_cache, so the same indicator on the same prices
+# is computed once however many strategies or parameter sets ask for it.
 
 def moving_average(series, window, ma_type="sma"):
     """Simple or exponential moving average."""
-    if ma_type == "ema":
-        return series.ewm(span=int(window), adjust=False).mean()
-    return series.rolling(window=int(window)).mean()
+    window = int(window)
+
+    def compute():
+        if ma_type == "ema":
+            return series.ewm(span=window, adjust=False).mean()
+        return series.rolling(window=window).mean()
+
+    return indicator_cache.get_or_compute("moving_average", series, (window, ma_type), compute)
+
+
+def rolling_std(series, window):
+    """Rolling sample standard deviation."""
+    window = int(window)
+    return indicator_cache.get_or_compute(
+        "rolling_std", series, (window,),
+        lambda: series.rolling(window=window).std(),
+    )
 
 
 def rsi(closes, period=14):
@@ -53,28 +209,92 @@ def rsi(closes, period=14):
     and loss have not stabilised yet, and acting on them would be noise.
     """
     period = int(period)
-    delta = closes.diff()
-    gain = delta.clip(lower=0.0)
-    loss = (-delta).clip(lower=0.0)
 
-    avg_gain = gain.ewm(alpha=1.0 / period, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1.0 / period, adjust=False).mean()
+    def compute():
+        delta = closes.diff()
+        gain = delta.clip(lower=0.0)
+        loss = (-delta).clip(lower=0.0)
 
-    rs = avg_gain / avg_loss.replace(0.0, np.nan)
-    out = 100.0 - (100.0 / (1.0 + rs))
+        avg_gain = gain.ewm(alpha=1.0 / period, adjust=False).mean()
+        avg_loss = loss.ewm(alpha=1.0 / period, adjust=False).mean()
 
-    # All-gain windows have no downside: RSI is 100 by definition. A flat
-    # window (no move either way) is neutral rather than undefined.
-    out[(avg_loss == 0) & (avg_gain > 0)] = 100.0
-    out[(avg_loss == 0) & (avg_gain == 0)] = 50.0
-    out.iloc[:period] = np.nan
-    return out
+        rs = avg_gain / avg_loss.replace(0.0, np.nan)
+        out = 100.0 - (100.0 / (1.0 + rs))
+
+        # All-gain windows have no downside: RSI is 100 by definition. A flat
+        # window (no move either way) is neutral rather than undefined.
+        out[(avg_loss == 0) & (avg_gain > 0)] = 100.0
+        out[(avg_loss == 0) & (avg_gain == 0)] = 50.0
+        out.iloc[:period] = np.nan
+        return out
+
+    return indicator_cache.get_or_compute("rsi", closes, (period,), compute)
 
 
 def realized_volatility(closes, window):
     """Annualised standard deviation of daily returns over a rolling window."""
-    daily = closes.pct_change()
-    return daily.rolling(window=int(window)).std() * np.sqrt(TRADING_DAYS)
+    window = int(window)
+
+    def compute():
+        daily = closes.pct_change()
+        return daily.rolling(window=window).std() * np.sqrt(TRADING_DAYS)
+
+    return indicator_cache.get_or_compute("realized_volatility", closes, (window,), compute)
+
+
+def trailing_return(closes, lookback, skip=0):
+    """
+    Return from `lookback` bars ago to `skip` bars ago, per bar.
+
+    Works on a single Series or a DataFrame of many tickers.
+    """
+    lookback, skip = int(lookback), int(skip)
+    return indicator_cache.get_or_compute(
+        "trailing_return", closes, (lookback, skip),
+        lambda: closes.shift(skip) / closes.shift(lookback) - 1.0,
+    )
+
+
+def rolling_window_matrix(series, windows):
+    """
+    Rolling simple means for many windows in one pass.
+
+    Returns a (len(windows), bars) array whose row i matches
+    series.rolling(windows[i]).mean() to about 1e-11, read off one cumulative
+    sum instead of a rolling() call per window. Windows where every price is
+    identical are exact. Not bit-identical elsewhere, so strategies, which
+    compare closes against their averages, read moving_average instead.
+    """
+    windows = np.asarray(windows, dtype=np.int64)
+    values = series.to_numpy(dtype=float)
+    n = len(values)
+    finite = np.isfinite(values)
+    # Summing distances from the first price keeps the running total small.
+    base = values[finite][0] if finite.any() else 0.0
+    x = np.where(finite, values - base, 0.0)
+
+    zero = np.zeros(1)
+    csum = np.concatenate([zero, np.cumsum(x)])
+    count = np.concatenate([zero, np.cumsum(finite)])
+
+    end = np.arange(1, n + 1)
+    start = end[None, :] - windows[:, None]
+    full = start >= 0
+    start = np.where(full, start, 0)
+    # Like rolling(window) with its default min_periods: a window with any
+    # gap or running off the start of the series has no value.
+    full &= (count[end][None, :] - count[start]) == windows[:, None]
+
+    sums = csum[end][None, :] - csum[start]
+    means = np.where(full, sums / windows[:, None] + base, np.nan)
+
+    # Length of the run of identical prices ending at each bar.
+    changed = np.ones(n, dtype=bool)
+    changed[1:] = values[1:] != values[:-1]
+    run_start = np.maximum.accumulate(np.where(changed, np.arange(n), 0))
+    run = np.arange(n) - run_start + 1
+    flat = full & (run[None, :] >= windows[:, None])
+    return np.where(flat, values[None, :], means)
 
 
 def _finalize(desired, warmup=0):
@@ -97,26 +317,37 @@ def _finalize(desired, warmup=0):
 
 def _stateful_band(closes, enter_mask, exit_mask, valid_mask):
     """
-    Walk an enter/exit rule that has hysteresis.
+    Resolve an enter/exit rule that has hysteresis.
 
     Mean-reversion rules enter on one threshold and leave on a different one,
     so the position depends on whether we are already in a trade — it cannot
     be expressed as a single elementwise comparison.
+
+    It is still loop-free. Every bar that forces the state (an entry, an exit,
+    or invalid data) is an event marker; between markers the state carries
+    forward, so the position is the last marker's value forward-filled. A bar
+    that signals both entry and exit flips whatever state it finds — entering
+    when flat, leaving when held — which is a parity count since the last
+    marker.
     """
-    pos = np.zeros(len(closes), dtype=float)
-    holding = False
-    for i in range(len(closes)):
-        if not valid_mask.iloc[i]:
-            holding = False
-            pos[i] = 0.0
-            continue
-        if holding:
-            if exit_mask.iloc[i]:
-                holding = False
-        elif enter_mask.iloc[i]:
-            holding = True
-        pos[i] = 1.0 if holding else 0.0
-    return pd.Series(pos, index=closes.index)
+    valid = np.asarray(valid_mask, dtype=bool)
+    enter = np.asarray(enter_mask, dtype=bool) & valid
+    exit_ = np.asarray(exit_mask, dtype=bool) & valid
+
+    flips = enter & exit_
+    set_on = enter & ~exit_
+    marker = set_on | ~valid | (exit_ & ~enter)
+
+    # Index of the most recent marker at or before each bar; -1 before the first.
+    idx = np.arange(len(valid))
+    last = np.maximum.accumulate(np.where(marker, idx, -1))
+    seen = last >= 0
+    at = np.where(seen, last, 0)
+
+    flip_count = np.cumsum(flips)
+    since = flip_count - np.where(seen, flip_count[at], 0)
+    holding = np.where(seen, set_on[at], False) ^ (since % 2 == 1)
+    return pd.Series(holding.astype(float), index=closes.index)
 
 
 # --------------------------------------------------------------------------
@@ -180,8 +411,8 @@ def strategy_bollinger_reversion(closes, period=20, k=2.0):
     """
     period, k = int(period), float(k)
 
-    mid = closes.rolling(window=period).mean()
-    sd = closes.rolling(window=period).std()
+    mid = moving_average(closes, period)
+    sd = rolling_std(closes, period)
     lower = mid - k * sd
 
     positions = _stateful_band(
@@ -212,14 +443,14 @@ def strategy_tsmom_vol_target(closes, lookback=252, vol_window=60,
     lookback, vol_window = int(lookback), int(vol_window)
     target_vol, max_leverage = float(target_vol), float(max_leverage)
 
-    trailing_return = closes.pct_change(lookback)
-    direction = (trailing_return > 0).astype(float)
+    trend = trailing_return(closes, lookback)
+    direction = (trend > 0).astype(float)
 
     vol = realized_volatility(closes, vol_window).replace(0.0, np.nan)
     size = (target_vol / vol).clip(upper=max_leverage)
 
     desired = direction * size
-    desired[trailing_return.isna() | vol.isna()] = 0.0
+    desired[trend.isna() | vol.isna()] = 0.0
     return _finalize(desired, warmup=max(lookback, vol_window))
 
 
@@ -253,36 +484,52 @@ def strategy_cross_sectional_momentum(closes_df, lookback=252, skip=21,
         raise ValueError("top_quantile must be between 0 and 0.5")
 
     # Return from t-lookback to t-skip, per asset.
-    momentum = closes_df.shift(skip) / closes_df.shift(lookback) - 1.0
-
-    weights = pd.DataFrame(0.0, index=closes_df.index, columns=closes_df.columns)
-    n_pick = max(1, int(round(closes_df.shape[1] * top_quantile)))
-    current = None
-
-    for i in range(len(closes_df)):
-        if i % rebalance_days != 0:
-            if current is not None:
-                weights.iloc[i] = current
+    momentum = trailing_return(closes_df, lookback, skip)
+
+    bars, n_assets = closes_df.shape
+    n_pick = max(1, int(round(n_assets * top_quantile)))
+
+    # Rank only the rebalance rows. Rows with the same set of scored names are
+    # ranked together; names without a momentum reading are left out of the
+    # sort and never picked, while a real +/-inf reading ranks like any other.
+    rebalance_rows = np.arange(0, bars, rebalance_days)
+    scores = momentum.to_numpy(dtype=float)[rebalance_rows]
+    has_score = ~np.isnan(scores)
+    n_ranked = has_score.sum(axis=1)
+
+    rank = np.full(scores.shape, n_assets)
+    patterns, group = np.unique(has_score, axis=0, return_inverse=True)
+    for g, pattern in enumerate(patterns):
+        rows, cols = np.flatnonzero(group.ravel() == g), np.flatnonzero(pattern)[::-1]
+        if not len(cols):
             continue
-
-        ranked = momentum.iloc[i].dropna().sort_values(ascending=False)
-        if len(ranked) < 2:
-            if current is not None:
-                weights.iloc[i] = current
-            continue
-
-        k = min(n_pick, len(ranked) // 2 if long_short else len(ranked))
-        k = max(1, k)
-        row = pd.Series(0.0, index=closes_df.columns)
-
-        if long_short and len(ranked) >= 2 * k:
-            row[ranked.index[:k]] = 0.5 / k
-            row[ranked.index[-k:]] = -0.5 / k
-        else:
-            row[ranked.index[:k]] = 1.0 / k
-
-        weights.iloc[i] = row
-        current = row
+        # Series.sort_values(ascending=False) is a quicksort over the reversed
+        # values read back reversed; doing the same keeps its order for ties.
+        order = np.argsort(scores[np.ix_(rows, cols)], axis=1, kind="quicksort")
+        rank[rows[:, None], cols[order][:, ::-1]] = np.arange(len(cols))
+
+    k = np.minimum(n_pick, n_ranked // 2 if long_short else n_ranked)
+    k = np.maximum(1, k)[:, None]
+    longs = has_score & (rank < k)
+
+    if long_short:
+        shorts = has_score & (rank >= n_ranked[:, None] - k)
+        targets = np.where(longs, 0.5 / k, np.where(shorts, -0.5 / k, 0.0))
+    else:
+        targets = np.where(longs, 1.0 / k, 0.0)
+
+    # A rebalance with fewer than two ranked names is skipped: the previous
+    # book (or cash, before the first one) is held until the next.
+    taken = n_ranked >= 2
+    book = np.zeros((bars, n_assets))
+    book[rebalance_rows[taken]] = targets[taken]
+
+    set_on = np.zeros(bars, dtype=bool)
+    set_on[rebalance_rows[taken]] = True
+    last = np.maximum.accumulate(np.where(set_on, np.arange(bars), -1))
+    held = np.where((last >= 0)[:, None], book[np.maximum(last, 0)], 0.0)
+
+    weights = pd.DataFrame(held, index=closes_df.index, columns=closes_df.columns)
 
     # Same one-bar guard as the single-asset path: rankings computed from
     # today's close can only be traded tomorrow.
@@ -533,6 +780,34 @@ def cagr(equity, num_days):
     return float((total_growth ** (1 / years) - 1) * 100)
 
 
+# Batched forms of the metrics above, for many paths at once: each takes a
+# (paths, bars) array and returns one value per path, NaN where the scalar
+# version would return None.
+
+def max_drawdown_paths(equity):
+    """max_drawdown for each row of an equity matrix."""
+    running_peak = np.maximum.accumulate(equity, axis=1)
+    return ((equity - running_peak) / running_peak).min(axis=1) * 100
+
+
+def sharpe_ratio_paths(returns, risk_free_rate=0.0):
+    """sharpe_ratio for each row of a returns matrix."""
+    excess = returns - (risk_free_rate / TRADING_DAYS)
+    sd = excess.std(axis=1, ddof=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = excess.mean(axis=1) / sd * np.sqrt(TRADING_DAYS)
+    return np.where(sd > 0, out, np.nan)
+
+
+def cagr_paths(equity, num_days):
+    """cagr for each row of an equity matrix."""
+    growth = equity[:, -1] / equity[:, 0]
+    years = num_days / TRADING_DAYS
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (np.power(growth, 1 / years) - 1) * 100
+    return np.where(growth > 0, out, np.nan)
+
+
 def compute_metrics(equity, returns, trades):
     """Roll an equity curve and its returns into the headline numbers."""
     equity = np.asarray(equity, dtype=float)
@@ -554,64 +829,186 @@ def compute_metrics(equity, returns, trades):
     }
 
 
+# --------------------------------------------------------------------------
+# Bootstrap
+# --------------------------------------------------------------------------
+
+DEFAULT_BOOTSTRAP_PATHS = 10000
+MAX_BOOTSTRAP_PATHS = 50000
+DEFAULT_BOOTSTRAP_BLOCK = 20   # about a trading month
+# Paths are resampled this many bytes of returns at a time, so ten thousand
+# paths of ten years never need more than a few tens of MB at once.
+BOOTSTRAP_CHUNK_BYTES = 32 * 1024 * 1024
+BOOTSTRAP_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _distribution(values, observed):
+    """Summary of one metric across bootstrap paths."""
+    finite = values[np.isfinite(values)]
+    out = {"observed": observed, "defined_paths": int(finite.size)}
+    if finite.size == 0:
+        return out
+    out["mean"] = float(finite.mean())
+    out["std"] = float(finite.std())
+    for q, v in zip(BOOTSTRAP_PERCENTILES, np.percentile(finite, BOOTSTRAP_PERCENTILES)):
+        out[f"p{q}"] = float(v)
+    return out
+
+
+def bootstrap_metrics(equity, paths=DEFAULT_BOOTSTRAP_PATHS,
+                      block=DEFAULT_BOOTSTRAP_BLOCK, seed=0):
+    """
+    Circular block bootstrap of a backtest's daily returns.
+
+    compute_metrics gives one CAGR, Sharpe and drawdown for the one history
+    that happened. This resamples the strategy's daily returns in blocks of
+    `block` consecutive days — long enough to keep volatility clustering and
+    the autocorrelation a trend rule lives on — into `paths` alternative
+    histories of the same length, and reports how those metrics are
+    distributed across them.
+
+    `equity` is the strategy's equity curve (a stored run's or a fresh one).
+    All paths are generated and scored as (paths x bars) matrices, a chunk of
+    paths at a time; there is no per-path Python loop. `seed` makes the result
+    reproducible.
+    """
+    equity = np.asarray(equity, dtype=float)
+    paths, block = int(paths), int(block)
+    if not 1 <= paths <= MAX_BOOTSTRAP_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_BOOTSTRAP_PATHS}")
+    if len(equity) < 3 or not np.all(equity > 0):
+        raise ValueError("Bootstrap needs an equity curve of at least three positive values")
+    returns = equity[1:] / equity[:-1] - 1
+    n = len(returns)
+    if not 1 <= block <= n:
+        raise ValueError(f"block must be between 1 and {n} bars")
+
+    rng = np.random.default_rng(seed)
+    blocks = -(-n // block)
+    offsets = np.arange(block)
+    chunk = max(1, BOOTSTRAP_CHUNK_BYTES // (8 * (n + 1)))
+
+    cagrs, sharpes, drawdowns, finals = [], [], [], []
+    for done in range(0, paths, chunk):
+        size = min(chunk, paths - done)
+        starts = rng.integers(0, n, size=(size, blocks))
+        idx = ((starts[:, :, None] + offsets) % n).reshape(size, -1)[:, :n]
+        # A leading flat day, as the simulator's own returns series has.
+        sampled = np.concatenate([np.zeros((size, 1)), returns[idx]], axis=1)
+        path_equity = np.cumprod(1 + sampled, axis=1)
+
+        cagrs.append(cagr_paths(path_equity, n + 1))
+        sharpes.append(sharpe_ratio_paths(sampled))
+        drawdowns.append(max_drawdown_paths(path_equity))
+        finals.append(path_equity[:, -1])
+
+    observed_returns = pd.Series(np.concatenate([[0.0], returns]))
+    return {
+        "paths": paths,
+        "block": block,
+        "seed": seed,
+        "bars": n + 1,
+        "percentiles": list(BOOTSTRAP_PERCENTILES),
+        "metrics": {
+            "cagr_pct": _distribution(np.concatenate(cagrs), cagr(equity, len(equity))),
+            "sharpe": _distribution(np.concatenate(sharpes), sharpe_ratio(observed_returns)),
+            "max_drawdown_pct": _distribution(np.concatenate(drawdowns), max_drawdown(equity)),
+        },
+        # Share of paths that end below where they started.
+        "prob_loss": float(np.mean(np.concatenate(finals) < 1)),
+    }
+
+
 # --------------------------------------------------------------------------
 # Single-asset simulator
 # --------------------------------------------------------------------------
 
+def _round_trips(held):
+    """
+    Locate every round trip in a (bars x assets) matrix of "position is open".
+
+    A trade opens on the bar a position goes from zero to non-zero and closes
+    on the bar it returns to zero; size changes in between are not trades.
+    Bar 0 is never traded — the simulators start flat and only act from bar 1
+    — so it is treated as flat whatever the strategy asked for.
+
+    Returns (asset, entry_bar, exit_bar, open_at_end) arrays, one element per
+    trade, ordered by asset and then by entry. A trade still open on the last
+    bar gets that bar as its exit so it can be marked to market.
+    """
+    held = np.array(held, dtype=bool)
+    bars = held.shape[0]
+    held[:1] = False
+
+    prev = np.zeros_like(held)
+    prev[1:] = held[:-1]
+
+    # Transposed so np.nonzero orders by asset, then by bar within each asset.
+    entry_asset, entry_bar = np.nonzero((held & ~prev).T)
+    exit_asset, exit_bar = np.nonzero((~held & prev).T)
+
+    # Entries and exits alternate within an asset, so the k-th entry pairs with
+    # the k-th exit; only the last entry of an asset can be left unmatched.
+    n_assets = held.shape[1]
+    entries_per = np.bincount(entry_asset, minlength=n_assets)
+    exits_per = np.bincount(exit_asset, minlength=n_assets)
+    first_entry = np.concatenate(([0], np.cumsum(entries_per)[:-1]))
+    rank = np.arange(len(entry_asset)) - first_entry[entry_asset]
+    closed = rank < exits_per[entry_asset]
+
+    exit_for_entry = np.full(len(entry_asset), bars - 1, dtype=np.intp)
+    exit_for_entry[closed] = exit_bar
+    return entry_asset, entry_bar, exit_for_entry, ~closed
+
+
 def simulate(closes, positions, starting_cash=10000.0,
              cost_bps=DEFAULT_COST_BPS, slippage_bps=DEFAULT_SLIPPAGE_BPS):
     """
-    Walk the bars, applying the desired position and charging costs on changes.
+    Apply the desired position bar by bar and charge costs on changes.
 
     Returns (equity_array, daily_returns, trades). Positions are fractions of
     equity (1 = fully invested, 0 = flat), so a strategy that sizes by risk can
     ask for 0.6 or 1.4 and the arithmetic already holds.
+
+    Computed on whole arrays rather than a per-bar loop: each bar's equity is
+    the previous bar's times a growth factor, so the curve is a cumulative
+    product, and the trade ledger falls out of where the position changes.
     """
     closes = closes.astype(float)
-    daily_returns = closes.pct_change().fillna(0.0)
+    prices = closes.to_numpy()
+    daily_returns = closes.pct_change().fillna(0.0).to_numpy()
+    cost_rate = (cost_bps + slippage_bps) / 10000.0
 
-    equity = [float(starting_cash)]
+    # Bar 0 is never traded: the account starts flat, in cash.
+    position = np.asarray(positions, dtype=float).copy()
+    if len(position):
+        position[0] = 0.0
+
+    # Return earned today is yesterday's position applied to today's move;
+    # cost is charged on the traded notional whenever the position changes.
+    turnover = np.abs(np.diff(position))
+    growth = (1 + position[1:] * daily_returns[1:]) * (1 - turnover * cost_rate)
+    equity_arr = float(starting_cash) * np.concatenate(([1.0], np.cumprod(growth)))
+
+    # A trade is open while the position is non-zero. Size changes within an
+    # open position (vol targeting does this constantly) are costed above but
+    # do not open or close a trade. One still open at the end is marked to the
+    # last price.
     trades = []
-    open_trade = None
-    prev_position = 0.0
-    cost_rate = (cost_bps + slippage_bps) / 10000.0
+    _, entry_bar, exit_bar, open_at_end = _round_trips(position[:, None] != 0)
+    for entry, exit_, still_open in zip(entry_bar, exit_bar, open_at_end):
+        entry_price, exit_price = float(prices[entry]), float(prices[exit_])
+        trade = {
+            "entry_date": str(closes.index[entry].date()),
+            "entry_price": entry_price,
+            "exit_date": str(closes.index[exit_].date()),
+            "exit_price": exit_price,
+            "pnl_pct": (exit_price / entry_price - 1) * 100,
+        }
+        if still_open:
+            trade["open_at_end"] = True
+        trades.append(trade)
 
-    for i in range(1, len(closes)):
-        position = float(positions.iloc[i])
-
-        # Return earned today is yesterday's position applied to today's move.
-        gross = equity[-1] * (1 + position * daily_returns.iloc[i])
-
-        # Charge on the traded notional when the position changes.
-        turnover = abs(position - prev_position)
-        cost = gross * turnover * cost_rate
-        equity.append(gross - cost)
-
-        price = float(closes.iloc[i])
-        date = str(closes.index[i].date())
-
-        # A trade is open while the position is non-zero. Size changes within
-        # an open position (vol targeting does this constantly) are costed
-        # above but do not open or close a trade.
-        if prev_position == 0 and position != 0:
-            open_trade = {"entry_date": date, "entry_price": price}
-        elif prev_position != 0 and position == 0 and open_trade:
-            pnl_pct = (price / open_trade["entry_price"] - 1) * 100
-            trades.append({**open_trade, "exit_date": date, "exit_price": price,
-                           "pnl_pct": pnl_pct})
-            open_trade = None
-
-        prev_position = position
-
-    # A position still open at the end is marked to the last price.
-    if open_trade:
-        last_price = float(closes.iloc[-1])
-        trades.append({**open_trade, "exit_date": str(closes.index[-1].date()),
-                       "exit_price": last_price,
-                       "pnl_pct": (last_price / open_trade["entry_price"] - 1) * 100,
-                       "open_at_end": True})
-
-    equity_arr = np.asarray(equity, dtype=float)
     strategy_returns = pd.Series(equity_arr).pct_change().fillna(0.0)
     return equity_arr, strategy_returns, trades
 
@@ -623,60 +1020,62 @@ def simulate(closes, positions, starting_cash=10000.0,
 def simulate_portfolio(closes_df, weights_df, starting_cash=10000.0,
                        cost_bps=DEFAULT_COST_BPS, slippage_bps=DEFAULT_SLIPPAGE_BPS):
     """
-    Walk the bars holding a basket, charging costs on rebalance turnover.
+    Hold a basket bar by bar, charging costs on rebalance turnover.
 
     Weights are fractions of equity per asset and may be negative (short).
     Turnover is summed across every name that changed, so a full rebalance of
     the basket is charged for each leg rather than once.
+
+    Runs as matrix operations over (bars x tickers) arrays, so a universe of
+    hundreds of names costs a few array passes rather than a Python loop per
+    name per bar. Weights are aligned to the price columns; a name with no
+    weight column is flat. A NaN weight earns nothing and costs nothing, and
+    a position already open stays open through it.
     """
     closes_df = closes_df.astype(float)
-    returns = closes_df.pct_change().fillna(0.0)
+    tickers = list(closes_df.columns)
+    prices = closes_df.to_numpy()
+    returns = closes_df.pct_change().fillna(0.0).to_numpy()
     cost_rate = (cost_bps + slippage_bps) / 10000.0
 
-    equity = [float(starting_cash)]
-    prev_w = pd.Series(0.0, index=closes_df.columns)
-    open_trades = {}
+    # Bar 0 is never traded: the account starts flat, in cash.
+    weights = (weights_df.reindex(columns=tickers, fill_value=0.0)
+               .to_numpy(dtype=float, copy=True))
+    if len(weights):
+        weights[0] = 0.0
+
+    # nansum skips the NaN terms, as the per-bar Series sums did.
+    portfolio_return = np.nansum(weights[1:] * returns[1:], axis=1)
+    turnover = np.nansum(np.abs(np.diff(weights, axis=0)), axis=1)
+    growth = (1 + portfolio_return) * (1 - turnover * cost_rate)
+    equity_arr = float(starting_cash) * np.concatenate(([1.0], np.cumprod(growth)))
+
+    # Track each name's round trip so win rate stays meaningful for a basket.
+    # Closed trades are listed in the order they closed, then the ones still
+    # open at the end (marked to the last price) in the order they opened.
+    asset, entry_bar, exit_bar, open_at_end = _round_trips(weights != 0)
+    order = np.lexsort((asset, np.where(open_at_end, entry_bar, exit_bar), open_at_end))
+
+    dates = closes_df.index
     trades = []
+    for j in order:
+        a, entry, exit_ = asset[j], entry_bar[j], exit_bar[j]
+        entry_price, exit_price = float(prices[entry, a]), float(prices[exit_, a])
+        side = "long" if weights[entry, a] > 0 else "short"
+        raw = (exit_price / entry_price - 1) * 100
+        trade = {
+            "ticker": tickers[a],
+            "entry_date": str(dates[entry].date()),
+            "entry_price": entry_price,
+            "side": side,
+            "exit_date": str(dates[exit_].date()),
+            "exit_price": exit_price,
+            "pnl_pct": raw if side == "long" else -raw,
+        }
+        if open_at_end[j]:
+            trade["open_at_end"] = True
+        trades.append(trade)
 
-    for i in range(1, len(closes_df)):
-        w = weights_df.iloc[i]
-
-        portfolio_return = float((w * returns.iloc[i]).sum())
-        gross = equity[-1] * (1 + portfolio_return)
-
-        turnover = float((w - prev_w).abs().sum())
-        equity.append(gross - gross * turnover * cost_rate)
-
-        date = str(closes_df.index[i].date())
-
-        # Track each name's round trip so win rate stays meaningful for a basket.
-        for ticker in closes_df.columns:
-            before, after = float(prev_w.get(ticker, 0.0)), float(w.get(ticker, 0.0))
-            if before == 0 and after == 0:
-                continue
-            price = float(closes_df[ticker].iloc[i])
-            if before == 0 and after != 0:
-                open_trades[ticker] = {
-                    "ticker": ticker, "entry_date": date, "entry_price": price,
-                    "side": "long" if after > 0 else "short",
-                }
-            elif before != 0 and after == 0 and ticker in open_trades:
-                trade = open_trades.pop(ticker)
-                raw = (price / trade["entry_price"] - 1) * 100
-                trades.append({**trade, "exit_date": date, "exit_price": price,
-                               "pnl_pct": raw if trade["side"] == "long" else -raw})
-
-        prev_w = w
-
-    last_date = str(closes_df.index[-1].date())
-    for ticker, trade in open_trades.items():
-        price = float(closes_df[ticker].iloc[-1])
-        raw = (price / trade["entry_price"] - 1) * 100
-        trades.append({**trade, "exit_date": last_date, "exit_price": price,
-                       "pnl_pct": raw if trade["side"] == "long" else -raw,
-                       "open_at_end": True})
-
-    equity_arr = np.asarray(equity, dtype=float)
     strategy_returns = pd.Series(equity_arr).pct_change().fillna(0.0)
     return equity_arr, strategy_returns, trades
 
@@ -685,6 +1084,45 @@ def simulate_portfolio(closes_df, weights_df, starting_cash=10000.0,
 # Runners
 # --------------------------------------------------------------------------
 
+def _strategy_leg(closes, strategy, params, starting_cash, cost_bps, slippage_bps):
+    """Simulate one strategy on its engine. Returns (equity, returns, trades)."""
+    signal = STRATEGY_FUNCS[strategy](closes, **params)
+    engine = simulate_portfolio if STRATEGY_SPECS[strategy]["multi_asset"] else simulate
+    return engine(closes, signal, starting_cash, cost_bps, slippage_bps)
+
+
+def _benchmark_leg(closes, starting_cash, cost_bps, slippage_bps):
+    """
+    The hold a strategy is measured against, on the same cash and window.
+
+    One ticker: always invested — beating the market is the bar, not merely
+    making money. A universe: equal-weight the whole thing and hold it, so a
+    cross-sectional strategy has to beat owning everything.
+    """
+    if isinstance(closes, pd.DataFrame):
+        n = closes.shape[1]
+        bench_weights = pd.DataFrame(1.0 / n, index=closes.index, columns=closes.columns)
+        return simulate_portfolio(closes, bench_weights, starting_cash, cost_bps, slippage_bps)
+    return simulate(closes, strategy_buy_and_hold(closes), starting_cash, cost_bps, slippage_bps)
+
+
+def _compare_to_benchmark(metrics, bench_metrics):
+    """Add the excess-return verdict to a strategy's metrics, in place."""
+    metrics["excess_return_pct"] = (
+        metrics["total_return_pct"] - bench_metrics["total_return_pct"]
+    )
+    metrics["beat_benchmark"] = metrics["excess_return_pct"] > 0
+    return metrics
+
+
+def _check_history(closes, multi_asset):
+    """Reject price data an engine cannot run on."""
+    if closes.shape[0] < 2:
+        raise ValueError("Not enough price history to backtest")
+    if multi_asset and closes.shape[1] < 2:
+        raise ValueError("A cross-sectional strategy needs at least two tickers")
+
+
 def _build_result(strategy, params, index, equity, returns, trades,
                   bench_equity, bench_returns, starting_cash,
                   cost_bps, slippage_bps, universe):
@@ -699,11 +1137,7 @@ def _build_result(strategy, params, index, equity, returns, trades,
 
     metrics = compute_metrics(equity, returns, trades)
     bench_metrics = compute_metrics(bench_equity, bench_returns, [])
-
-    metrics["excess_return_pct"] = (
-        metrics["total_return_pct"] - bench_metrics["total_return_pct"]
-    )
-    metrics["beat_benchmark"] = metrics["excess_return_pct"] > 0
+    _compare_to_benchmark(metrics, bench_metrics)
 
     return {
         "strategy": strategy,
@@ -734,20 +1168,13 @@ def run_backtest(closes, strategy="ma_crossover", params=None,
     strategy, params = coerce_params(strategy, params)
     if STRATEGY_SPECS[strategy]["multi_asset"]:
         raise ValueError(f"{STRATEGY_SPECS[strategy]['label']} needs a universe of tickers")
+    _check_history(closes, multi_asset=False)
 
-    if len(closes) < 2:
-        raise ValueError("Not enough price history to backtest")
-
-    positions = STRATEGY_FUNCS[strategy](closes, **params)
-    equity, returns, trades = simulate(
-        closes, positions, starting_cash, cost_bps, slippage_bps
+    equity, returns, trades = _strategy_leg(
+        closes, strategy, params, starting_cash, cost_bps, slippage_bps
     )
-
-    # Benchmark: same cash, same window, always invested. Beating the market is
-    # the bar, not merely making money.
-    bench_positions = strategy_buy_and_hold(closes)
-    bench_equity, bench_returns, _ = simulate(
-        closes, bench_positions, starting_cash, cost_bps, slippage_bps
+    bench_equity, bench_returns, _ = _benchmark_leg(
+        closes, starting_cash, cost_bps, slippage_bps
     )
 
     return _build_result(
@@ -769,23 +1196,13 @@ def run_portfolio_backtest(closes_df, strategy="cross_sectional_momentum",
     strategy, params = coerce_params(strategy, params)
     if not STRATEGY_SPECS[strategy]["multi_asset"]:
         raise ValueError(f"{STRATEGY_SPECS[strategy]['label']} runs on a single ticker")
+    _check_history(closes_df, multi_asset=True)
 
-    if closes_df.shape[0] < 2:
-        raise ValueError("Not enough price history to backtest")
-    if closes_df.shape[1] < 2:
-        raise ValueError("A cross-sectional strategy needs at least two tickers")
-
-    weights = STRATEGY_FUNCS[strategy](closes_df, **params)
-    equity, returns, trades = simulate_portfolio(
-        closes_df, weights, starting_cash, cost_bps, slippage_bps
+    equity, returns, trades = _strategy_leg(
+        closes_df, strategy, params, starting_cash, cost_bps, slippage_bps
     )
-
-    # Benchmark: equal-weight the whole universe and hold it. The strategy has
-    # to beat owning everything, not just make money.
-    n = closes_df.shape[1]
-    bench_weights = pd.DataFrame(1.0 / n, index=closes_df.index, columns=closes_df.columns)
-    bench_equity, bench_returns, _ = simulate_portfolio(
-        closes_df, bench_weights, starting_cash, cost_bps, slippage_bps
+    bench_equity, bench_returns, _ = _benchmark_leg(
+        closes_df, starting_cash, cost_bps, slippage_bps
     )
 
     return _build_result(
@@ -793,3 +1210,432 @@ def run_portfolio_backtest(closes_df, strategy="cross_sectional_momentum",
         bench_equity, bench_returns, starting_cash, cost_bps, slippage_bps,
         list(closes_df.columns),
     )
+
+
+# --------------------------------------------------------------------------
+# Parameter sweeps
+# --------------------------------------------------------------------------
+
+# A grid is a product, so a few generous ranges multiply into tens of
+# thousands of runs. Past this ceiling a sweep is refused rather than left to
+# occupy every core on the host.
+MAX_SWEEP_COMBOS = 2000
+
+# Below this many combinations a process pool costs more to start than it
+# saves: spawning workers takes a second or two, while one single-asset
+# parameter set simulates in a few milliseconds. Smaller sweeps run inline.
+SWEEP_POOL_MIN_COMBOS = 256
+
+# Metrics a sweep can be ranked by. Higher is better for all of them —
+# drawdown is stored as a negative percentage, so the shallowest ranks first.
+SWEEP_RANK_METRICS = (
+    "sharpe", "sortino", "cagr_pct", "total_return_pct",
+    "excess_return_pct", "max_drawdown_pct", "win_rate_pct",
+)
+
+
+def _grid_axis(meta, values):
+    """
+    One axis of a grid as a list of raw values.
+
+    Accepts an explicit list, a single value, or a numeric range given as
+    {"min", "max", "step"}. Missing range bounds fall back to the spec's own.
+    """
+    if isinstance(values, dict):
+        if meta["type"] not in ("int", "float"):
+            raise ValueError(f"{meta['label']} takes a list of values, not a range")
+        try:
+            lo = float(values.get("min", meta.get("min", meta["default"])))
+            hi = float(values.get("max", meta.get("max", meta["default"])))
+            step = float(values.get("step") or meta.get("step") or 1)
+        except (TypeError, ValueError):
+            raise ValueError(f"{meta['label']} range must be numeric")
+        if step <= 0:
+            raise ValueError(f"{meta['label']} step must be positive")
+        if hi < lo:
+            raise ValueError(f"{meta['label']} range is empty (max below min)")
+        count = int(np.floor((hi - lo) / step + 1e-9)) + 1
+        if count > MAX_SWEEP_COMBOS:
+            raise ValueError(f"{meta['label']} range has {count} values; "
+                             f"a sweep allows at most {MAX_SWEEP_COMBOS}")
+        # Rounded so 0.1-steps land on 0.3 rather than 0.30000000000000004.
+        return [round(lo + i * step, 10) for i in range(count)]
+    if isinstance(values, (list, tuple)):
+        if not values:
+            raise ValueError(f"{meta['label']} has no values to sweep")
+        return list(values)
+    return [values]
+
+
+def expand_grid(strategy, grid):
+    """
+    Expand a parameter grid into the distinct parameter sets it describes.
+
+    `grid` maps parameter names from the strategy's spec to the values to try;
+    parameters left out stay at their defaults. Every combination goes through
+    coerce_params, so a sweep is clamped and typed exactly like a single run,
+    and combinations that clamp onto the same values are only evaluated once.
+
+    Returns (strategy, [params, ...]).
+    """
+    strategy = resolve_strategy(strategy)
+    spec = STRATEGY_SPECS[strategy]
+    grid = grid or {}
+    if not isinstance(grid, dict):
+        raise ValueError("grid must map parameter names to values")
+
+    unknown = sorted(set(grid) - set(spec["params"]))
+    if unknown:
+        raise ValueError(
+            f"{spec['label']} has no parameter(s) {', '.join(unknown)}. "
+            f"Known: {sorted(spec['params'])}"
+        )
+
+    names = [name for name in spec["params"] if name in grid]
+    axes = [_grid_axis(spec["params"][name], grid[name]) for name in names]
+
+    total = int(np.prod([len(axis) for axis in axes])) if axes else 1
+    if total > MAX_SWEEP_COMBOS:
+        raise ValueError(
+            f"Grid has {total} combinations; a sweep allows at most {MAX_SWEEP_COMBOS}"
+        )
+
+    combos, seen = [], set()
+    for values in itertools.product(*axes):
+        _, params = coerce_params(strategy, dict(zip(names, values)))
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            combos.append(params)
+    return strategy, combos
+
+
+def _rank_key(rank_by):
+    """Sort key putting the best score first and missing scores last."""
+    return lambda r: (r["metrics"].get(rank_by) is None,
+                      -(r["metrics"].get(rank_by) or 0.0))
+
+
+def _score_params(context, params):
+    """Metrics for one parameter set, or the reason it could not run."""
+    try:
+        equity, returns, trades = _strategy_leg(
+            context["closes"], context["strategy"], params,
+            context["starting_cash"], context["cost_bps"], context["slippage_bps"],
+        )
+    except ValueError as e:
+        # e.g. a fast window that is not shorter than the slow one.
+        return {"params": params, "error": str(e)}
+    metrics = compute_metrics(equity, returns, trades)
+    return {"params": params,
+            "metrics": _compare_to_benchmark(metrics, context["benchmark_metrics"])}
+
+
+def _sweep_indicators(closes, strategy, combos):
+    """
+    Every moving average and rolling std the sweep's parameter sets will read,
+    keyed as indicator_cache keys them.
+
+    They come from the same helpers a single backtest calls, so a sweep row
+    and a run_backtest of the same parameters see identical values.
+    """
+    if isinstance(closes, pd.DataFrame):
+        return {}
+    if strategy == "ma_crossover":
+        averages = {(p[k], p["ma_type"]) for p in combos for k in ("fast", "slow")}
+        return {"moving_average": {
+            args: moving_average(closes, *args) for args in sorted(averages)
+        }}
+    if strategy == "bollinger_reversion":
+        periods = sorted({p["period"] for p in combos})
+        return {
+            "moving_average": {(w, "sma"): moving_average(closes, w) for w in periods},
+            "rolling_std": {(w,): rolling_std(closes, w) for w in periods},
+        }
+    return {}
+
+
+def _prime_sweep_indicators(context):
+    """Load the sweep's precomputed indicators into this process's cache."""
+    for name, results in context["indicators"].items():
+        indicator_cache.prime(name, context["closes"], results)
+
+
+# Set once per pool worker by the initializer, so the price data crosses the
+# process boundary once per worker rather than once per parameter set.
+_sweep_context = None
+
+
+def _init_sweep_worker(context):
+    global _sweep_context
+    _sweep_context = context
+    _prime_sweep_indicators(context)
+
+
+def _sweep_worker(params):
+    return _score_params(_sweep_context, params)
+
+
+def run_sweep(closes, strategy, combos, rank_by="sharpe",
+              starting_cash=10000.0, cost_bps=DEFAULT_COST_BPS,
+              slippage_bps=DEFAULT_SLIPPAGE_BPS, ticker=None, workers=None):
+    """
+    Evaluate many parameter sets of one strategy on the same prices.
+
+    `closes` is a Series for a single-asset strategy or a DataFrame for a
+    cross-sectional one; `combos` comes from expand_grid. Each set is simulated
+    once, with metrics only — no equity curve or trade list is kept — and the
+    benchmark is computed once for all of them.
+
+    Sets are fanned out over a process pool of `workers` (default: every core).
+    Workers are spawned rather than forked: the caller is usually a threaded
+    web server, and forking one mid-request can deadlock the child on a lock
+    another thread held.
+
+    Returns the ranked table, best first by `rank_by`. Sets that could not run
+    are listed separately under "failed" rather than silently dropped.
+    """
+    strategy = resolve_strategy(strategy)
+    spec = STRATEGY_SPECS[strategy]
+    if rank_by not in SWEEP_RANK_METRICS:
+        raise ValueError(f"rank_by must be one of {list(SWEEP_RANK_METRICS)}")
+    if spec["multi_asset"] != isinstance(closes, pd.DataFrame):
+        raise ValueError(
+            f"{spec['label']} needs a universe of tickers" if spec["multi_asset"]
+            else f"{spec['label']} runs on a single ticker"
+        )
+    _check_history(closes, spec["multi_asset"])
+
+    bench_equity, bench_returns, _ = _benchmark_leg(
+        closes, starting_cash, cost_bps, slippage_bps
+    )
+    context = {
+        "closes": closes,
+        "strategy": strategy,
+        "starting_cash": starting_cash,
+        "cost_bps": cost_bps,
+        "slippage_bps": slippage_bps,
+        "benchmark_metrics": compute_metrics(bench_equity, bench_returns, []),
+        "indicators": _sweep_indicators(closes, strategy, combos),
+    }
+
+    workers = min(int(workers or os.cpu_count() or 1), len(combos))
+    if workers > 1 and len(combos) >= SWEEP_POOL_MIN_COMBOS:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_sweep_worker,
+            initargs=(context,),
+        ) as pool:
+            chunk = max(1, len(combos) // (workers * 4))
+            rows = list(pool.map(_sweep_worker, combos, chunksize=chunk))
+    else:
+        rows = [_score_params(context, params) for params in combos]
+
+    scored = [r for r in rows if "metrics" in r]
+    failed = [r for r in rows if "error" in r]
+    # Stable sort, so equal scores keep grid order; missing scores go last.
+    scored.sort(key=_rank_key(rank_by))
+    for i, row in enumerate(scored, 1):
+        row["rank"] = i
+
+    index = closes.index
+    if spec["multi_asset"]:
+        universe = list(closes.columns)
+    else:
+        universe = [ticker] if ticker else []
+    return {
+        "strategy": strategy,
+        "strategy_label": spec["label"],
+        "rank_by": rank_by,
+        "universe": universe,
+        "start_date": str(index[0].date()),
+        "end_date": str(index[-1].date()),
+        "bars": len(index),
+        "starting_cash": starting_cash,
+        "cost_bps": cost_bps,
+        "slippage_bps": slippage_bps,
+        "combos": len(combos),
+        "benchmark_metrics": context["benchmark_metrics"],
+        "results": scored,
+        "failed": failed,
+    }
+
+
+# --------------------------------------------------------------------------
+# Walk-forward optimisation
+# --------------------------------------------------------------------------
+
+DEFAULT_IN_SAMPLE_BARS = 504      # two years to pick parameters on
+DEFAULT_OUT_OF_SAMPLE_BARS = 126  # then six months trading them
+MAX_WALK_FORWARD_WINDOWS = 100
+
+
+def walk_forward_windows(bars, in_sample_bars, out_of_sample_bars):
+    """
+    Split `bars` into rolling (in_start, in_end, out_end) windows.
+
+    Each window optimises on [in_start, in_end) and trades [in_end, out_end).
+    The in-sample window rolls forward by one out-of-sample period at a time,
+    so the out-of-sample periods tile the history after the first in-sample
+    window without overlapping. The last one may be short.
+    """
+    in_sample_bars, out_of_sample_bars = int(in_sample_bars), int(out_of_sample_bars)
+    if in_sample_bars < 2 or out_of_sample_bars < 1:
+        raise ValueError("in_sample_bars must be at least 2 and out_of_sample_bars at least 1")
+    if bars <= in_sample_bars:
+        raise ValueError(
+            f"Walk-forward needs more than the {in_sample_bars} in-sample bars; "
+            f"only {bars} are available"
+        )
+    windows = [
+        (in_end - in_sample_bars, in_end, min(in_end + out_of_sample_bars, bars))
+        for in_end in range(in_sample_bars, bars, out_of_sample_bars)
+    ]
+    if len(windows) > MAX_WALK_FORWARD_WINDOWS:
+        raise ValueError(
+            f"{len(windows)} walk-forward windows is more than the limit of "
+            f"{MAX_WALK_FORWARD_WINDOWS}; lengthen the out-of-sample period"
+        )
+    return windows
+
+
+def _walk_forward_window(context, window):
+    """
+    Optimise on one window's in-sample bars, then trade its out-of-sample bars.
+
+    The chosen parameters are run over in-sample plus out-of-sample so their
+    indicators are warm when trading starts; only the out-of-sample positions
+    are kept. Positions are already lagged a bar by _finalize, so the first
+    out-of-sample bar trades on the last in-sample close and nothing later.
+    """
+    in_start, in_end, out_end = window
+    closes = context["closes"]
+    in_sample = closes.iloc[in_start:in_end]
+
+    bench_equity, bench_returns, _ = _benchmark_leg(
+        in_sample, context["starting_cash"], context["cost_bps"], context["slippage_bps"]
+    )
+    window_context = {**context, "closes": in_sample,
+                      "benchmark_metrics": compute_metrics(bench_equity, bench_returns, [])}
+    rows = [_score_params(window_context, params) for params in context["combos"]]
+    scored = sorted((r for r in rows if "metrics" in r), key=_rank_key(context["rank_by"]))
+
+    index = closes.index
+    summary = {
+        "in_sample_start": str(index[in_start].date()),
+        "in_sample_end": str(index[in_end - 1].date()),
+        "out_of_sample_start": str(index[in_end].date()),
+        "out_of_sample_end": str(index[out_end - 1].date()),
+    }
+    if not scored:
+        # Nothing could run on this window: stay in cash rather than guess.
+        summary["params"] = None
+        summary["error"] = rows[0]["error"] if rows else "no parameter sets"
+        return summary, None
+
+    best = scored[0]
+    signal = STRATEGY_FUNCS[context["strategy"]](closes.iloc[in_start:out_end], **best["params"])
+    if isinstance(signal, pd.DataFrame):
+        signal = signal.reindex(columns=closes.columns).fillna(0.0)
+    summary["params"] = best["params"]
+    summary["in_sample_score"] = best["metrics"].get(context["rank_by"])
+    return summary, signal.to_numpy(dtype=float)[in_end - in_start:]
+
+
+_walk_forward_context = None
+
+
+def _init_walk_forward_worker(context):
+    global _walk_forward_context
+    _walk_forward_context = context
+
+
+def _walk_forward_worker(window):
+    return _walk_forward_window(_walk_forward_context, window)
+
+
+def run_walk_forward(closes, strategy, combos, in_sample_bars=DEFAULT_IN_SAMPLE_BARS,
+                     out_of_sample_bars=DEFAULT_OUT_OF_SAMPLE_BARS, rank_by="sharpe",
+                     starting_cash=10000.0, cost_bps=DEFAULT_COST_BPS,
+                     slippage_bps=DEFAULT_SLIPPAGE_BPS, ticker=None, workers=None):
+    """
+    Walk-forward optimisation: re-pick parameters on each rolling in-sample
+    window and trade them on the out-of-sample bars that follow.
+
+    A sweep's best row is chosen with hindsight over the whole history; this
+    only ever trades parameters picked on data that came before, which is the
+    honest test of whether the optimisation itself has an edge. The
+    out-of-sample positions are stitched into one series and simulated once,
+    so the switch from one window's parameters to the next is costed like any
+    other position change.
+
+    Windows are independent, so they are fanned out over a process pool like
+    run_sweep's parameter sets, with the prices sent to each worker once.
+    Returns the run_backtest result for the stitched out-of-sample period plus
+    the per-window picks under "windows".
+    """
+    strategy = resolve_strategy(strategy)
+    spec = STRATEGY_SPECS[strategy]
+    if rank_by not in SWEEP_RANK_METRICS:
+        raise ValueError(f"rank_by must be one of {list(SWEEP_RANK_METRICS)}")
+    if spec["multi_asset"] != isinstance(closes, pd.DataFrame):
+        raise ValueError(
+            f"{spec['label']} needs a universe of tickers" if spec["multi_asset"]
+            else f"{spec['label']} runs on a single ticker"
+        )
+    _check_history(closes, spec["multi_asset"])
+    windows = walk_forward_windows(closes.shape[0], in_sample_bars, out_of_sample_bars)
+
+    context = {
+        "closes": closes,
+        "strategy": strategy,
+        "combos": combos,
+        "rank_by": rank_by,
+        "starting_cash": starting_cash,
+        "cost_bps": cost_bps,
+        "slippage_bps": slippage_bps,
+    }
+
+    workers = min(int(workers or os.cpu_count() or 1), len(windows))
+    if workers > 1 and len(windows) * len(combos) >= SWEEP_POOL_MIN_COMBOS:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_walk_forward_worker,
+            initargs=(context,),
+        ) as pool:
+            picks = list(pool.map(_walk_forward_worker, windows))
+    else:
+        picks = [_walk_forward_window(context, window) for window in windows]
+
+    first = windows[0][1]
+    out_of_sample = closes.iloc[first:]
+    positions = np.zeros(out_of_sample.shape, dtype=float)
+    for (_, in_end, out_end), (_, signal) in zip(windows, picks):
+        if signal is not None:
+            positions[in_end - first:out_end - first] = signal
+
+    if spec["multi_asset"]:
+        positions = pd.DataFrame(positions, index=out_of_sample.index,
+                                 columns=out_of_sample.columns)
+        engine = simulate_portfolio
+        universe = list(closes.columns)
+    else:
+        engine = simulate
+        universe = [ticker] if ticker else []
+    equity, returns, trades = engine(out_of_sample, positions, starting_cash,
+                                     cost_bps, slippage_bps)
+    bench_equity, bench_returns, _ = _benchmark_leg(
+        out_of_sample, starting_cash, cost_bps, slippage_bps
+    )
+
+    result = _build_result(
+        strategy, {"in_sample_bars": int(in_sample_bars),
+                   "out_of_sample_bars": int(out_of_sample_bars),
+                   "rank_by": rank_by},
+        out_of_sample.index, equity, returns, trades,
+        bench_equity, bench_returns, starting_cash, cost_bps, slippage_bps, universe,
+    )
+    result["windows"] = [summary for summary, _ in picks]
+    return result
@@ -0,0 +1,372 @@
+"""
+Micro-benchmarks for the backtesting engine.
+
+Times every strategy in STRATEGY_FUNCS, both simulators, compute_metrics and
+_build_result on deterministic synthetic prices, so an engine change can be
+judged by numbers rather than by feel. Needs no network and no database.
+
+    python bench_backtesting.py --out bench.json
+    python bench_backtesting.py --compare bench.json   # exit 1 on regression
+    python bench_backtesting.py --price-cache ./prices # real closes, offline
+
+Each case reports the best wall time over a few repeats, and the peak traced
+memory and number of blocks still allocated after one further, traced call
+(tracemalloc sees numpy's buffers as well as Python objects). Cases larger than
+--max-cells price points (bars x tickers) are listed as skipped rather than
+left to exhaust memory.
+
+With --price-cache, cases run on the last N bars of real closes read from a
+local price cache directory (see price_cache.py; the app fills one when
+PRICE_CACHE_DIR is set) instead of synthetic prices. Cases needing more bars or
+tickers than the cache holds are listed as skipped.
+"""
+
+import argparse
+import functools
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import backtesting
+from price_cache import PriceCache
+
+DEFAULT_BARS = (1_000, 10_000, 100_000)
+DEFAULT_UNIVERSES = (10, 100, 1_000)
+DEFAULT_MAX_CELLS = 10_000_000
+# Early enough that 100k business days still end before pandas' 2262 limit.
+SYNTHETIC_START = "1700-01-01"
+
+
+# --------------------------------------------------------------------------
+# Synthetic markets
+# --------------------------------------------------------------------------
+
+def _index(bars):
+    """Weekdays from SYNTHETIC_START, built directly: bdate_range cannot step
+    more than 292 years in one offset."""
+    days = np.arange(np.datetime64(SYNTHETIC_START, "D"),
+                     np.datetime64(SYNTHETIC_START, "D") + bars * 7 // 5 + 7)
+    weekdays = days[np.is_busday(days)][:bars]
+    return pd.DatetimeIndex(weekdays.astype("datetime64[ns]"))
+
+
+def gbm(bars, tickers=1, mu=0.07, sigma=0.2, seed=0):
+    """
+    Geometric Brownian motion closes: a Series for one ticker, else a DataFrame.
+
+    `mu` and `sigma` are annual. The same seed always gives the same prices.
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / backtesting.TRADING_DAYS
+    shocks = rng.standard_normal((bars, tickers))
+    log_returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks
+    log_returns[0] = 0.0
+    prices = 100.0 * np.exp(np.cumsum(log_returns, axis=0))
+    if tickers == 1:
+        return pd.Series(prices[:, 0], index=_index(bars), name="SYN")
+    columns = [f"SYN{i:04d}" for i in range(tickers)]
+    return pd.DataFrame(prices, index=_index(bars), columns=columns)
+
+
+def regime_switching(bars, tickers=1, seed=0, regimes=((0.15, 0.12), (-0.25, 0.35)),
+                     stay=0.99):
+    """
+    Closes that switch between calm uptrends and volatile selloffs.
+
+    A two-state Markov chain shared by every ticker (a market-wide regime)
+    picks each bar's annual (drift, vol) from `regimes`; the chain stays put
+    with probability `stay`. Trend and mean-reversion rules behave very
+    differently across regimes, which plain GBM never exercises.
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / backtesting.TRADING_DAYS
+    flips = rng.random(bars) > stay
+    state = np.cumsum(flips) % len(regimes)
+    mu = np.array([r[0] for r in regimes])[state][:, None]
+    sigma = np.array([r[1] for r in regimes])[state][:, None]
+    shocks = rng.standard_normal((bars, tickers))
+    log_returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks
+    log_returns[0] = 0.0
+    prices = 100.0 * np.exp(np.cumsum(log_returns, axis=0))
+    if tickers == 1:
+        return pd.Series(prices[:, 0], index=_index(bars), name="SYN")
+    columns = [f"SYN{i:04d}" for i in range(tickers)]
+    return pd.DataFrame(prices, index=_index(bars), columns=columns)
+
+
+def cached_market(cache, bars, tickers=1):
+    """
+    The last `bars` closes of `tickers` cached tickers, or None if the cache
+    cannot supply that many. A Series for one ticker, else a DataFrame of the
+    dates every chosen ticker shares.
+    """
+    series = {}
+    for name in cache.tickers():
+        entry = cache.get(name)
+        if entry is not None and len(entry[0]) >= bars:
+            series[name] = entry[0]
+        if len(series) == tickers:
+            break
+    if len(series) < tickers:
+        return None
+    if tickers == 1:
+        name, closes = next(iter(series.items()))
+        return closes.iloc[-bars:].rename(name)
+    frame = pd.DataFrame(series).dropna()
+    return frame.iloc[-bars:] if len(frame) >= bars else None
+
+
+# --------------------------------------------------------------------------
+# Measurement
+# --------------------------------------------------------------------------
+
+def measure(func, repeat=3, setup=None):
+    """
+    Best-of-`repeat` wall time, then one traced call for memory.
+
+    `setup` runs untimed before every call; the benchmarks use it to empty
+    the indicator cache so each call does the full work.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    blocks_before = len(tracemalloc.take_snapshot().traces)
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    blocks_after = len(tracemalloc.take_snapshot().traces)
+    tracemalloc.stop()
+    del result
+
+    return {
+        "seconds": min(times),
+        "seconds_all": times,
+        "peak_bytes": peak - before,
+        "allocated_blocks": blocks_after - blocks_before,
+    }
+
+
+def _cases(bars_list, universes, max_cells, seed, cache=None):
+    """
+    Yield (name, params, build) for every benchmark case.
+
+    build() makes the case's data and returns (func, setup), or (None, reason)
+    when the price cache cannot supply it; build is None for a case too large
+    to run. Nothing is built for a case that is filtered out, and neighbouring
+    cases share their prices through one-entry caches, so only one market of
+    each kind is held at a time.
+    """
+    clear = backtesting.indicator_cache.clear
+    single = [s for s, spec in backtesting.STRATEGY_SPECS.items() if not spec["multi_asset"]]
+    multi = [s for s, spec in backtesting.STRATEGY_SPECS.items() if spec["multi_asset"]]
+
+    @functools.lru_cache(maxsize=1)
+    def closes_for(bars):
+        if cache is None:
+            return regime_switching(bars, seed=seed), None
+        closes = cached_market(cache, bars)
+        return closes, None if closes is not None else f"no cached ticker has {bars} bars"
+
+    @functools.lru_cache(maxsize=1)
+    def crossover_run(bars):
+        closes, _ = closes_for(bars)
+        return backtesting.simulate(closes, backtesting.strategy_ma_crossover(closes))
+
+    @functools.lru_cache(maxsize=1)
+    def universe_for(bars, tickers):
+        if cache is None:
+            return gbm(bars, tickers=tickers, seed=seed), None
+        universe = cached_market(cache, bars, tickers)
+        return universe, (None if universe is not None
+                          else f"cache lacks {tickers} tickers sharing {bars} bars")
+
+    def with_market(market, make):
+        """A build() that hands `make` the market, or reports why there is none."""
+        def build():
+            data, reason = market()
+            return make(data) if data is not None else (None, reason)
+        return build
+
+    def strategy_case(name):
+        func = backtesting.STRATEGY_FUNCS[name]
+        _, params = backtesting.coerce_params(name, {})
+        return lambda data: ((lambda: func(data, **params)), clear)
+
+    def simulate_case(closes):
+        positions = backtesting.strategy_ma_crossover(closes)
+        return (lambda: backtesting.simulate(closes, positions)), None
+
+    def metrics_case(bars):
+        def make(closes):
+            equity, returns, trades = crossover_run(bars)
+            return (lambda: backtesting.compute_metrics(equity, returns, trades)), None
+        return make
+
+    def build_result_case(bars):
+        def make(closes):
+            equity, returns, trades = crossover_run(bars)
+            bench_equity, bench_returns, _ = backtesting.simulate(
+                closes, backtesting.strategy_buy_and_hold(closes)
+            )
+            return (lambda: backtesting._build_result(
+                "ma_crossover", {}, closes.index, equity, returns, trades, bench_equity,
+                bench_returns, 10000.0, backtesting.DEFAULT_COST_BPS,
+                backtesting.DEFAULT_SLIPPAGE_BPS, [closes.name])), None
+        return make
+
+    def portfolio_case(universe):
+        weights = backtesting.strategy_cross_sectional_momentum(universe)
+        return (lambda: backtesting.simulate_portfolio(universe, weights)), None
+
+    for bars in bars_list:
+        market = functools.partial(closes_for, bars)
+        for name in single:
+            yield (f"strategy:{name}", {"bars": bars}, with_market(market, strategy_case(name)))
+        yield ("simulate", {"bars": bars}, with_market(market, simulate_case))
+        yield ("compute_metrics", {"bars": bars}, with_market(market, metrics_case(bars)))
+        yield ("_build_result", {"bars": bars}, with_market(market, build_result_case(bars)))
+
+        for tickers in universes:
+            params = {"bars": bars, "tickers": tickers}
+            if bars * tickers > max_cells:
+                yield ("universe", params, None)
+                continue
+            market = functools.partial(universe_for, bars, tickers)
+            for name in multi:
+                yield (f"strategy:{name}", params, with_market(market, strategy_case(name)))
+            yield ("simulate_portfolio", params, with_market(market, portfolio_case))
+
+
+def _case_key(name, params):
+    return name + "".join(f"|{k}={v}" for k, v in sorted(params.items()))
+
+
+def run(bars_list=DEFAULT_BARS, universes=DEFAULT_UNIVERSES, max_cells=DEFAULT_MAX_CELLS,
+        repeat=3, seed=0, only=None, log=None, price_cache=None):
+    """
+    Run every case and return the report as a JSON-ready dict.
+
+    `price_cache` is a directory to take real closes from instead of
+    generating synthetic ones.
+    """
+    cache = PriceCache(price_cache) if price_cache else None
+    results, skipped = {}, []
+    for name, params, build in _cases(bars_list, universes, max_cells, seed, cache):
+        key = _case_key(name, params)
+        if build is None:
+            skipped.append({"case": key, "reason": f"more than {max_cells} price points"})
+            continue
+        if only and not any(part in key for part in only):
+            continue
+        func, setup = build()
+        if func is None:
+            skipped.append({"case": key, "reason": setup})
+            continue
+        results[key] = {"case": name, **params, **measure(func, repeat, setup)}
+        if log:
+            log(f"{key:60s} {results[key]['seconds'] * 1000:10.2f} ms")
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "settings": {"bars": list(bars_list), "universes": list(universes),
+                     "max_cells": max_cells, "repeat": repeat, "seed": seed,
+                     "prices": f"price-cache:{price_cache}" if price_cache else "synthetic"},
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(current, baseline, threshold=0.10):
+    """
+    Compare two reports case by case.
+
+    A case regresses when it is more than `threshold` (a fraction) slower than
+    the baseline. Cases present in only one report are listed, not judged.
+    """
+    rows, regressions = [], []
+    old, new = baseline.get("results", {}), current.get("results", {})
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key]["seconds"] / old[key]["seconds"] if old[key]["seconds"] else None
+        row = {
+            "case": key,
+            "baseline_seconds": old[key]["seconds"],
+            "seconds": new[key]["seconds"],
+            "ratio": ratio,
+            "baseline_peak_bytes": old[key]["peak_bytes"],
+            "peak_bytes": new[key]["peak_bytes"],
+        }
+        rows.append(row)
+        if ratio is not None and ratio > 1 + threshold:
+            regressions.append(key)
+    return {
+        "threshold": threshold,
+        "cases": rows,
+        "regressions": regressions,
+        "only_in_baseline": sorted(set(old) - set(new)),
+        "only_in_current": sorted(set(new) - set(old)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bars", type=int, nargs="+", default=list(DEFAULT_BARS))
+    parser.add_argument("--universes", type=int, nargs="+", default=list(DEFAULT_UNIVERSES))
+    parser.add_argument("--max-cells", type=int, default=DEFAULT_MAX_CELLS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run only cases whose key contains one of these")
+    parser.add_argument("--price-cache", metavar="DIR",
+                        help="benchmark on real closes from this price cache directory")
+    parser.add_argument("--out", help="write the report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="compare against a saved report; exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown fraction counted as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run(args.bars, args.universes, args.max_cells, args.repeat, args.seed,
+                 args.only, log=lambda line: print(line, file=sys.stderr),
+                 price_cache=args.price_cache)
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare and report["comparison"]["regressions"]:
+        for key in report["comparison"]["regressions"]:
+            print(f"REGRESSION {key}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,14 @@
 # daily_task.py
-from app import fetchRecommendations
-import requests
+"""
+Cron entry point: runs whichever scheduled jobs are due, then exits.
 
-# Replace with the actual endpoint of your Flask app
-endpoint = "http://127.0.0.1:5000/fetch-recs"
+The same as `flask --app app scheduler --once`, kept so existing crontab
+lines keep working. It used to POST to /fetch-recs with a hardcoded email and
+no bearer token, which the route rejects, so it never warmed anything; the
+jobs now run in-process against the database instead (see JOBS in app.py).
+"""
+from app import app, run_scheduler
 
-data = {
-    "email": "rishabk2004@gmail.com"
-}
-
-try:
-    response = requests.post(endpoint, json=data)
-    print(response.json())  # or log it
-except Exception as e:
-    print(f"Error during cron task: {e}")
-'''
-{
-  "AMZN": {
-    "rating": "Buy",
-    "indicator": 0.68
-  },
-  "NVDA": {
-    "rating": "Hold",
-    "indicator": 0.59
-  },
-  ...
-}
-'''
\ No newline at end of file
+if __name__ == "__main__":
+    with app.app_context():
+        run_scheduler(once=True)
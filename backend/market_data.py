@@ -0,0 +1,451 @@
+"""
+Where market data comes from.
+
+Every price, statement, analyst count and headline the app uses goes through
+a MarketDataProvider, so the source can be swapped without touching a route.
+YFinanceProvider is the live source. ReplayProvider answers from recorded
+fixtures, and from deterministic synthetic data for anything not recorded,
+with configurable latency and injected failures. Any route can then be load
+tested or benchmarked end to end with no network and no calls to Yahoo.
+
+closes() takes many tickers per call, as yf.download does. The per-ticker
+methods have batch forms that make one call per ticker by default, so a
+provider with a real batch endpoint only has to override them.
+
+A fixture is one JSON file per ticker, written by record_fixture() from any
+provider (the app's `record-market-data` command records from yfinance).
+Every field is optional; a missing one is synthesized unless the replay
+provider is strict.
+
+Needs only numpy and pandas; yfinance is imported by YFinanceProvider alone.
+"""
+
+import abc
+import json
+import os
+import random
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timezone
+from threading import Lock
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+RECOMMENDATION_COLUMNS = ["strongBuy", "buy", "hold", "sell", "strongSell"]
+
+# Bars per unit of a yfinance-style period string ("5d", "1mo", "1y").
+_PERIOD_BARS = {"d": 1, "wk": 5, "mo": 21, "y": 252}
+# Synthetic histories start here, whatever range is asked for, so a given
+# ticker's price on a given day never depends on the request.
+_SYNTHETIC_START = "2010-01-04"
+
+
+class RateLimitError(Exception):
+    """The source refused the call for rate limiting; worth retrying later."""
+
+
+class ProviderError(Exception):
+    """The source failed the call for any other reason."""
+
+
+def _period_bars(period):
+    for unit in sorted(_PERIOD_BARS, key=len, reverse=True):
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            return int(period[:-len(unit)]) * _PERIOD_BARS[unit]
+    if period == "max":
+        return None
+    raise ValueError(f"Unsupported period {period!r}")
+
+
+class MarketDataProvider(abc.ABC):
+    """
+    Interface for market data. Subclasses implement the single-ticker methods
+    and closes(); the batch methods are built on them.
+    """
+
+    name = "base"
+    # Whether a caller may fall back to scraping Yahoo directly when this
+    # provider has nothing. Only a live Yahoo source should: anything else,
+    # replay above all, has to stay offline.
+    allows_scrape_fallback = False
+
+    @abc.abstractmethod
+    def closes(self, tickers, start=None, end=None, period=None):
+        """
+        {ticker: Series of daily closes} for several tickers in one call.
+
+        Either a `start` (and optional exclusive `end`) or a yfinance-style
+        `period` such as "5d" or "1y". Closes are split- and
+        dividend-adjusted, indexed by tz-naive dates. Tickers with no data are
+        absent. Raises if the call itself fails.
+        """
+
+    @abc.abstractmethod
+    def info(self, ticker):
+        """Summary fields as a dict: marketCap, trailingPE, debtToEquity, ..."""
+
+    @abc.abstractmethod
+    def financials(self, ticker):
+        """Annual income statement: line items by period-end date."""
+
+    @abc.abstractmethod
+    def dividends(self, ticker):
+        """Dividends paid, as a Series by ex-date; empty if none."""
+
+    @abc.abstractmethod
+    def recommendations(self, ticker):
+        """Analyst counts per period ("0m" first) in RECOMMENDATION_COLUMNS."""
+
+    @abc.abstractmethod
+    def news(self, ticker):
+        """Recent news items, as the source returns them."""
+
+    def infos(self, tickers):
+        """{ticker: info(ticker)}."""
+        return {ticker: self.info(ticker) for ticker in tickers}
+
+    def recommendations_many(self, tickers):
+        """{ticker: recommendations(ticker)}."""
+        return {ticker: self.recommendations(ticker) for ticker in tickers}
+
+    def stats(self):
+        return {"provider": self.name}
+
+
+class YFinanceProvider(MarketDataProvider):
+    """The live source: Yahoo Finance through yfinance."""
+
+    name = "yfinance"
+    allows_scrape_fallback = True
+
+    def __init__(self):
+        import yfinance
+        self._yf = yfinance
+
+    def closes(self, tickers, start=None, end=None, period=None):
+        tickers = list(tickers)
+        span = {"period": period} if period else {"start": start, "end": end}
+        hist = self._yf.download(tickers, progress=False, auto_adjust=True,
+                                 group_by="column", **span)
+        if hist is None or hist.empty:
+            return {}
+        close = hist["Close"]
+        if not hasattr(close, "columns"):
+            # A single ticker may come back with flat columns.
+            close = close.to_frame(name=tickers[0])
+        out = {}
+        for ticker in tickers:
+            if ticker not in close.columns:
+                continue
+            col = close[ticker].astype(float).dropna()
+            if not col.empty:
+                out[ticker] = col
+        return out
+
+    def info(self, ticker):
+        return self._yf.Ticker(ticker).info or {}
+
+    def financials(self, ticker):
+        return self._yf.Ticker(ticker).financials
+
+    def dividends(self, ticker):
+        return self._yf.Ticker(ticker).dividends
+
+    def recommendations(self, ticker):
+        return self._yf.Ticker(ticker).get_recommendations()
+
+    def news(self, ticker):
+        return self._yf.Ticker(ticker).news or []
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Deterministic offline source for tests, load tests and benchmarks.
+
+    Serves each ticker's fixture from `fixtures` when there is one, and
+    synthetic data seeded by (`seed`, ticker) for everything else; with
+    `strict`, a ticker or field that was not recorded is simply missing, as an
+    unknown symbol is upstream. The same seed always gives the same data, and
+    a history's past never changes as `as_of` moves forward.
+
+    Every call waits `latency_ms` on average (uniformly 0.5x to 1.5x), then
+    fails with RateLimitError with probability `rate_limit_rate` or
+    ProviderError with probability `failure_rate`. The draws come from one
+    seeded generator, so a single-threaded run replays exactly.
+
+    Safe to share between threads.
+    """
+
+    name = "replay"
+
+    def __init__(self, fixtures=None, latency_ms=0.0, failure_rate=0.0,
+                 rate_limit_rate=0.0, seed=0, strict=False, as_of=None):
+        self.fixtures = fixtures
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.strict = strict
+        self.as_of = as_of
+        self._rng = random.Random(seed)
+        self._lock = Lock()
+        self._loaded = {}  # ticker -> fixture dict, or None if not recorded
+        self.calls = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    # ---- plumbing ------------------------------------------------------------
+
+    def _call(self, what):
+        """Latency, then any injected failure: once per call, like one request upstream."""
+        with self._lock:
+            self.calls += 1
+            jitter, roll = self._rng.random(), self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+            elif roll < self.rate_limit_rate + self.failure_rate:
+                self.failed += 1
+        if self.latency:
+            time.sleep(self.latency * (0.5 + jitter))
+        if roll < self.rate_limit_rate:
+            raise RateLimitError(f"Too Many Requests. Rate limited on {what} (replay)")
+        if roll < self.rate_limit_rate + self.failure_rate:
+            raise ProviderError(f"Injected failure on {what} (replay)")
+
+    def _fixture(self, ticker):
+        with self._lock:
+            if ticker in self._loaded:
+                return self._loaded[ticker]
+        fixture = None
+        if self.fixtures:
+            try:
+                with open(_fixture_path(self.fixtures, ticker)) as f:
+                    fixture = json.load(f)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._loaded[ticker] = fixture
+        return fixture
+
+    def _recorded(self, ticker, field):
+        """(True, value) if `field` was recorded for `ticker`, else (False, None)."""
+        fixture = self._fixture(ticker)
+        if fixture is not None and field in fixture:
+            return True, fixture[field]
+        return False, None
+
+    def _rng_for(self, ticker, salt):
+        return np.random.default_rng(zlib.crc32(f"{self.seed}:{salt}:{ticker}".encode()))
+
+    def _today(self):
+        return pd.Timestamp(self.as_of or date.today())
+
+    # ---- data ----------------------------------------------------------------
+
+    def _history(self, ticker):
+        found, recorded = self._recorded(ticker, "closes")
+        if found:
+            return pd.Series(recorded["prices"], index=pd.DatetimeIndex(recorded["dates"]),
+                             dtype=float)
+        if self.strict:
+            return None
+        index = pd.bdate_range(_SYNTHETIC_START, self._today())
+        rng = self._rng_for(ticker, "closes")
+        # Scalars first: the shocks come last, so a longer history only
+        # appends to a shorter one.
+        first, drift, vol = rng.uniform(10, 500), rng.uniform(0.0, 0.15), rng.uniform(0.15, 0.45)
+        dt = 1.0 / 252
+        log_returns = (drift - 0.5 * vol ** 2) * dt + vol * np.sqrt(dt) * rng.standard_normal(len(index))
+        log_returns[0] = 0.0
+        prices = first * np.exp(np.cumsum(log_returns))
+        return pd.Series(np.round(prices, 4), index=index)
+
+    def closes(self, tickers, start=None, end=None, period=None):
+        tickers = list(tickers)
+        self._call(f"closes for {len(tickers)} tickers")
+        bars = _period_bars(period) if period else None
+        out = {}
+        for ticker in tickers:
+            series = self._history(ticker)
+            if series is None:
+                continue
+            series = series[series.index <= self._today()]
+            if bars is not None:
+                series = series.iloc[-bars:]
+            elif not period:
+                if start is not None:
+                    series = series[series.index >= pd.Timestamp(str(start))]
+                if end is not None:
+                    series = series[series.index < pd.Timestamp(str(end))]
+            if not series.empty:
+                out[ticker] = series
+        return out
+
+    def info(self, ticker):
+        self._call(f"info for {ticker}")
+        found, recorded = self._recorded(ticker, "info")
+        if found or self.strict:
+            return recorded or {}
+        rng = self._rng_for(ticker, "info")
+        return {
+            "symbol": ticker,
+            "shortName": f"{ticker} (replay)",
+            "marketCap": int(rng.uniform(2e9, 2e12)),
+            "trailingPE": round(float(rng.uniform(8, 60)), 2),
+            "debtToEquity": round(float(rng.uniform(0, 250)), 3),
+            "currentRatio": round(float(rng.uniform(0.5, 3)), 3),
+            "quickRatio": round(float(rng.uniform(0.3, 2.5)), 3),
+            "operatingCashflow": int(rng.uniform(1e8, 1e11)),
+        }
+
+    def financials(self, ticker):
+        self._call(f"financials for {ticker}")
+        found, recorded = self._recorded(ticker, "financials")
+        if found:
+            return pd.DataFrame(recorded["data"], index=recorded["index"],
+                                columns=pd.DatetimeIndex(recorded["columns"]))
+        if self.strict:
+            return pd.DataFrame()
+        rng = self._rng_for(ticker, "financials")
+        year = self._today().year
+        columns = pd.DatetimeIndex([f"{year - i}-12-31" for i in range(1, 5)])
+        revenue = rng.uniform(1e9, 4e11) * np.cumprod(rng.uniform(0.9, 1.2, 4))
+        gross = revenue * rng.uniform(0.3, 0.7)
+        operating = gross * rng.uniform(0.2, 0.6)
+        net = operating * rng.uniform(0.5, 0.85)
+        return pd.DataFrame(
+            np.round([revenue, gross, operating, net]),
+            index=["Total Revenue", "Gross Profit", "Operating Income", "Net Income"],
+            columns=columns,
+        )
+
+    def dividends(self, ticker):
+        self._call(f"dividends for {ticker}")
+        found, recorded = self._recorded(ticker, "dividends")
+        if found:
+            return pd.Series(recorded["amounts"], index=pd.DatetimeIndex(recorded["dates"]),
+                             dtype=float)
+        rng = self._rng_for(ticker, "dividends")
+        if self.strict or rng.random() < 0.4:
+            return pd.Series(dtype=float)
+        dates = pd.date_range(end=self._today(), periods=8, freq="QS")
+        return pd.Series(np.round(rng.uniform(0.1, 1.5) * np.ones(len(dates)), 4), index=dates)
+
+    def recommendations(self, ticker):
+        self._call(f"recommendations for {ticker}")
+        found, recorded = self._recorded(ticker, "recommendations")
+        if found:
+            return pd.DataFrame(recorded)
+        if self.strict:
+            return pd.DataFrame()
+        rng = self._rng_for(ticker, "recommendations")
+        rows = [
+            {"period": f"{-m}m" if m else "0m",
+             **dict(zip(RECOMMENDATION_COLUMNS, (int(x) for x in rng.integers(0, 15, 5))))}
+            for m in range(4)
+        ]
+        return pd.DataFrame(rows)
+
+    _HEADLINES = (
+        "{t} beats earnings expectations as revenue grows",
+        "{t} shares slip after guidance cut",
+        "Analysts upgrade {t} on strong demand",
+        "{t} faces lawsuit over product recall",
+        "{t} announces share buyback program",
+        "{t} misses estimates amid weak sales",
+        "{t} holds steady ahead of the Fed decision",
+    )
+
+    def news(self, ticker):
+        self._call(f"news for {ticker}")
+        found, recorded = self._recorded(ticker, "news")
+        if found or self.strict:
+            return recorded or []
+        rng = self._rng_for(ticker, "news")
+        picks = rng.choice(len(self._HEADLINES), size=5, replace=False)
+        return [{"title": self._HEADLINES[i].format(t=ticker),
+                 "link": f"https://example.com/replay/{quote(ticker, safe='')}/{n}"}
+                for n, i in enumerate(picks)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "provider": self.name,
+                "fixtures": self.fixtures,
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "failed": self.failed,
+            }
+
+
+def _fixture_path(directory, ticker):
+    # Tickers like ^GSPC or BRK/B are not safe file names as they stand.
+    return os.path.join(directory, quote(ticker, safe="") + ".json")
+
+
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _dates(index):
+    return [str(pd.Timestamp(d).date()) for d in index]
+
+
+def record_fixture(source, ticker, directory, start="2015-01-01"):
+    """
+    Write `ticker`'s fixture for ReplayProvider from `source`, and return its path.
+
+    Records closes from `start`, info, financials, dividends, recommendations
+    and news. A field the source fails on is left out, so replay synthesizes
+    it (or, when strict, treats it as missing). The file is replaced
+    atomically.
+    """
+    fixture = {"ticker": ticker, "recorded_at": datetime.now(timezone.utc).isoformat(),
+               "source": source.name}
+    fields = {
+        "closes": lambda: source.closes([ticker], start=start).get(ticker),
+        "info": lambda: source.info(ticker),
+        "financials": lambda: source.financials(ticker),
+        "dividends": lambda: source.dividends(ticker),
+        "recommendations": lambda: source.recommendations(ticker),
+        "news": lambda: source.news(ticker),
+    }
+    for field, fetch in fields.items():
+        try:
+            value = fetch()
+        except Exception as e:
+            print(f"  {ticker}: {field} not recorded ({e})")
+            continue
+        if value is None:
+            continue
+        if field == "closes":
+            value = {"dates": _dates(value.index), "prices": [float(v) for v in value]}
+        elif field == "dividends":
+            value = {"dates": _dates(value.index), "amounts": [float(v) for v in value]}
+        elif field == "financials":
+            value = {"index": [str(i) for i in value.index], "columns": _dates(value.columns),
+                     "data": [[_json_value(v) for v in row] for row in value.to_numpy().tolist()]}
+        elif field == "recommendations":
+            value = [{k: _json_value(v) for k, v in row.items()}
+                     for row in value.to_dict("records")]
+        fixture[field] = value
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(fixture, f, default=_json_value)
+        os.replace(tmp, _fixture_path(directory, ticker))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return _fixture_path(directory, ticker)
@@ -0,0 +1,224 @@
+"""
+Local on-disk cache of price histories, read through memory maps.
+
+Every backtest needs a ticker's closes, and the snapshot store keeps them in
+Postgres: a network round trip and a decode per run. A worker that runs the
+same tickers over and over (sweeps, walk-forward, the agent re-testing a
+policy) can instead keep one file per ticker on local disk and map it, so the
+prices are read at memory speed and only the pages touched are loaded.
+
+Each file is stamped with the market_snapshot id its prices came from and
+when that snapshot was fetched. A run served from the file therefore cites the
+same evidence as one served from the database, and a file is superseded the
+moment a newer snapshot for its ticker is seen.
+
+File layout, little-endian: a 40-byte header (magic, snapshot id as 16 raw
+bytes, fetched_at as int64 nanoseconds since the epoch, bar count), then the
+closes as encode_closes packs them. That is the columnar snapshot encoding,
+defined here and shared with the snapshot store, behind a header, so a file is
+written straight from a snapshot. Prices start at offset 40 and so are 8-byte
+aligned.
+
+Writers to one ticker take turns: a thread lock, plus an flock on a per-ticker
+lock file where the platform has one, so app workers sharing the directory
+cannot roll a file back to an older snapshot between them.
+
+Needs only numpy and pandas, so bench_backtesting.py can read a cache
+directory offline with no database configured.
+"""
+
+import os
+import struct
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers only take turns within one process
+    fcntl = None
+
+_MAGIC = b"SSCLOSE1"
+_HEADER = struct.Struct("<8s16sqq")
+_SUFFIX = ".closes"
+_LOCK_SUFFIX = ".lock"
+_EPOCH_DAY_NS = 86_400 * 1_000_000_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_closes(closes):
+    """
+    Pack a date-indexed Series of closes into bytes: every price as
+    little-endian float64, then every date as little-endian int32 days since
+    1970-01-01. Prices come first so they sit at offset 0 and decode aligned.
+    """
+    prices = np.ascontiguousarray(closes.to_numpy(dtype="<f8"))
+    days = (pd.DatetimeIndex(closes.index).normalize().asi8 // _EPOCH_DAY_NS).astype("<i4")
+    return prices.tobytes() + days.tobytes()
+
+
+def decode_closes(data):
+    """
+    Unpack encode_closes bytes into a float Series indexed by date.
+
+    The prices are a read-only view over `data`, not a copy; only the dates
+    are materialised, as one vectorised multiply rather than string parsing.
+    """
+    n = len(data) // 12
+    prices = np.frombuffer(data, dtype="<f8", count=n)
+    days = np.frombuffer(data, dtype="<i4", count=n, offset=8 * n)
+    index = pd.DatetimeIndex((days.astype(np.int64) * _EPOCH_DAY_NS).view("datetime64[ns]"))
+    return pd.Series(prices, index=index, dtype=float, copy=False)
+
+
+class PriceCache:
+    """
+    One memory-mapped file of closes per ticker under `directory`.
+
+    get() returns a Series whose values are a read-only view of the mapping;
+    treat it as immutable. Files are replaced atomically, so a reader never
+    sees a half-written file, and a Series already handed out keeps the old
+    mapping alive until it is dropped.
+
+    Open mappings are remembered per ticker and reopened only when the file
+    on disk changes. Safe to share between threads.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._open = {}  # ticker -> (inode, mtime_ns, (closes, snapshot_id, fetched_at))
+        self._write_locks = {}  # ticker -> Lock
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, ticker, suffix=_SUFFIX):
+        # Tickers like ^GSPC or BRK/B are not safe file names as they stand.
+        return os.path.join(self.directory, quote(ticker, safe="") + suffix)
+
+    def tickers(self):
+        """Every ticker with a file in the cache, sorted."""
+        return sorted(unquote(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(_SUFFIX))
+
+    def get(self, ticker, cutoff=None):
+        """
+        (closes, snapshot_id, fetched_at) for `ticker`, or None.
+
+        With `cutoff`, a file whose snapshot was fetched before it counts as a
+        miss, which is how callers apply the same TTL the database lookup does.
+        """
+        entry = self._lookup(ticker)
+        with self._lock:
+            if entry is None or (cutoff is not None and entry[2] < cutoff):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry
+
+    def _lookup(self, ticker):
+        path = self._path(ticker)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            entry = None
+        else:
+            with self._lock:
+                cached = self._open.get(ticker)
+            if cached is not None and cached[:2] == (st.st_ino, st.st_mtime_ns):
+                entry = cached[2]
+            else:
+                entry = self._map(path)
+                if entry is not None:
+                    with self._lock:
+                        self._open[ticker] = (st.st_ino, st.st_mtime_ns, entry)
+        return entry
+
+    def _map(self, path):
+        try:
+            mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        except (FileNotFoundError, ValueError):
+            return None  # removed meanwhile, or empty
+        if len(mapped) < _HEADER.size:
+            return None
+        magic, snapshot_id, fetched_ns, bars = _HEADER.unpack(mapped[:_HEADER.size].tobytes())
+        if magic != _MAGIC or len(mapped) != _HEADER.size + 12 * bars:
+            return None
+        closes = decode_closes(mapped[_HEADER.size:])
+        fetched_at = _EPOCH + timedelta(microseconds=fetched_ns // 1000)
+        return closes, str(uuid.UUID(bytes=snapshot_id)), fetched_at
+
+    @contextmanager
+    def _write_lock(self, ticker):
+        with self._lock:
+            lock = self._write_locks.setdefault(ticker, Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            # Lock files are never deleted: a writer holding one that was
+            # unlinked would no longer exclude a writer opening a new one.
+            with open(self._path(ticker, _LOCK_SUFFIX), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                yield  # closing the file releases the flock
+
+    def put(self, ticker, closes, snapshot_id, fetched_at):
+        """
+        Store `closes` for `ticker`, stamped with its snapshot.
+
+        Ignored if the file already holds this snapshot, or one fetched later
+        so a slow writer cannot roll the cache back. The check is made under
+        the ticker's write lock, against the file as it is at that moment.
+        """
+        header = _HEADER.pack(_MAGIC, uuid.UUID(str(snapshot_id)).bytes,
+                              (fetched_at - _EPOCH) // timedelta(microseconds=1) * 1000,
+                              len(closes))
+        body = encode_closes(closes)
+        with self._write_lock(ticker):
+            current = self._lookup(ticker)
+            if current is not None and (current[1] == str(snapshot_id) or current[2] > fetched_at):
+                return
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(header)
+                    f.write(body)
+                os.replace(tmp, self._path(ticker))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def invalidate(self, ticker=None):
+        """Delete the file for `ticker`, or every file."""
+        try:
+            for name in ([ticker] if ticker is not None else self.tickers()):
+                with self._write_lock(name):
+                    try:
+                        os.unlink(self._path(name))
+                    except FileNotFoundError:
+                        pass
+        finally:
+            # Even if a delete failed, nothing this process has mapped may be
+            # served again without checking the file first.
+            with self._lock:
+                if ticker is None:
+                    self._open.clear()
+                else:
+                    self._open.pop(ticker, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
@@ -72,6 +72,7 @@ CREATE TABLE IF NOT EXISTS backtest_run (
 	metrics JSONB, 
 	equity_curve JSONB, 
 	trades JSONB, 
+	results_blob BYTEA, 
 	snapshot_refs JSONB, 
 	notes TEXT, 
 	created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, 
@@ -80,19 +81,78 @@ CREATE TABLE IF NOT EXISTS backtest_run (
 
 CREATE INDEX IF NOT EXISTS ix_backtest_run_actor_email ON backtest_run (actor_email);
 
+CREATE TABLE IF NOT EXISTS backtest_sweep (
+	id UUID NOT NULL, 
+	actor_email VARCHAR(120), 
+	strategy VARCHAR(64) NOT NULL, 
+	grid JSONB, 
+	settings JSONB, 
+	universe JSONB, 
+	start_date VARCHAR(10), 
+	end_date VARCHAR(10), 
+	rank_by VARCHAR(32) NOT NULL, 
+	combos INTEGER NOT NULL, 
+	results JSONB, 
+	failed JSONB, 
+	benchmark JSONB, 
+	snapshot_refs JSONB, 
+	run_ids JSONB, 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, 
+	PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_backtest_sweep_actor_email ON backtest_sweep (actor_email);
+
+CREATE TABLE IF NOT EXISTS job_run (
+	id UUID NOT NULL, 
+	job VARCHAR(64) NOT NULL, 
+	status VARCHAR(16) NOT NULL, 
+	summary JSONB, 
+	error TEXT, 
+	host VARCHAR(255), 
+	started_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, 
+	finished_at TIMESTAMP WITH TIME ZONE, 
+	duration_ms INTEGER, 
+	PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_job_run_job ON job_run (job);
+
+CREATE TABLE IF NOT EXISTS snapshot_content (
+	hash VARCHAR(64) NOT NULL, 
+	payload JSONB, 
+	data BYTEA, 
+	codec VARCHAR(16), 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, 
+	PRIMARY KEY (hash)
+);
+
 CREATE TABLE IF NOT EXISTS market_snapshot (
 	id UUID NOT NULL, 
 	ticker VARCHAR(32), 
 	kind VARCHAR(32) NOT NULL, 
-	payload JSONB NOT NULL, 
+	payload JSONB, 
+	data BYTEA, 
+	content_hash VARCHAR(64), 
 	fetched_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, 
-	PRIMARY KEY (id)
+	PRIMARY KEY (id), 
+	FOREIGN KEY(content_hash) REFERENCES snapshot_content (hash)
 );
 
+CREATE INDEX IF NOT EXISTS ix_market_snapshot_content_hash ON market_snapshot (content_hash);
 CREATE INDEX IF NOT EXISTS ix_market_snapshot_fetched_at ON market_snapshot (fetched_at);
 CREATE INDEX IF NOT EXISTS ix_market_snapshot_kind ON market_snapshot (kind);
 CREATE INDEX IF NOT EXISTS ix_market_snapshot_ticker ON market_snapshot (ticker);
 
+CREATE TABLE IF NOT EXISTS market_snapshot_latest (
+	kind VARCHAR(32) NOT NULL, 
+	ticker VARCHAR(32) NOT NULL, 
+	snapshot_id UUID NOT NULL, 
+	fetched_at TIMESTAMP WITH TIME ZONE NOT NULL, 
+	PRIMARY KEY (kind, ticker), 
+	FOREIGN KEY(snapshot_id) REFERENCES market_snapshot (id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS user_data (
 	id SERIAL NOT NULL, 
 	email VARCHAR(120) NOT NULL, 
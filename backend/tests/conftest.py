@@ -0,0 +1,6 @@
+# The backend modules import each other by bare name (`import backtesting`),
+# as they do when run from backend/, so put that directory on the path.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,402 @@
+"""
+Parity between the array engine in backtesting.py and the bar-by-bar loops it
+replaced.
+
+The loops are kept here, verbatim apart from their names, as the reference
+the vectorised code must keep reproducing: same equity curve to rounding and
+the same trade ledger, on random positions and weights (NaN included) as well
+as on what every strategy asks for; the same positions from the hysteresis
+kernel on random enter/exit/valid masks; and the same momentum book, ties
+and infinite returns included, as the per-date ranking loop.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtesting
+from backtesting import DEFAULT_COST_BPS, DEFAULT_SLIPPAGE_BPS
+
+
+# --------------------------------------------------------------------------
+# Reference loops
+# --------------------------------------------------------------------------
+
+def reference_simulate(closes, positions, starting_cash=10000.0,
+                       cost_bps=DEFAULT_COST_BPS, slippage_bps=DEFAULT_SLIPPAGE_BPS):
+    """The per-bar simulator that simulate() replaced."""
+    closes = closes.astype(float)
+    daily_returns = closes.pct_change().fillna(0.0)
+
+    equity = [float(starting_cash)]
+    trades = []
+    open_trade = None
+    prev_position = 0.0
+    cost_rate = (cost_bps + slippage_bps) / 10000.0
+
+    for i in range(1, len(closes)):
+        position = float(positions.iloc[i])
+
+        gross = equity[-1] * (1 + position * daily_returns.iloc[i])
+
+        turnover = abs(position - prev_position)
+        cost = gross * turnover * cost_rate
+        equity.append(gross - cost)
+
+        price = float(closes.iloc[i])
+        date = str(closes.index[i].date())
+
+        if prev_position == 0 and position != 0:
+            open_trade = {"entry_date": date, "entry_price": price}
+        elif prev_position != 0 and position == 0 and open_trade:
+            pnl_pct = (price / open_trade["entry_price"] - 1) * 100
+            trades.append({**open_trade, "exit_date": date, "exit_price": price,
+                           "pnl_pct": pnl_pct})
+            open_trade = None
+
+        prev_position = position
+
+    if open_trade:
+        last_price = float(closes.iloc[-1])
+        trades.append({**open_trade, "exit_date": str(closes.index[-1].date()),
+                       "exit_price": last_price,
+                       "pnl_pct": (last_price / open_trade["entry_price"] - 1) * 100,
+                       "open_at_end": True})
+
+    equity_arr = np.asarray(equity, dtype=float)
+    strategy_returns = pd.Series(equity_arr).pct_change().fillna(0.0)
+    return equity_arr, strategy_returns, trades
+
+
+def reference_simulate_portfolio(closes_df, weights_df, starting_cash=10000.0,
+                                 cost_bps=DEFAULT_COST_BPS, slippage_bps=DEFAULT_SLIPPAGE_BPS):
+    """The per-bar portfolio simulator that simulate_portfolio() replaced."""
+    closes_df = closes_df.astype(float)
+    returns = closes_df.pct_change().fillna(0.0)
+    cost_rate = (cost_bps + slippage_bps) / 10000.0
+
+    equity = [float(starting_cash)]
+    prev_w = pd.Series(0.0, index=closes_df.columns)
+    open_trades = {}
+    trades = []
+
+    for i in range(1, len(closes_df)):
+        w = weights_df.iloc[i]
+
+        portfolio_return = float((w * returns.iloc[i]).sum())
+        gross = equity[-1] * (1 + portfolio_return)
+
+        turnover = float((w - prev_w).abs().sum())
+        equity.append(gross - gross * turnover * cost_rate)
+
+        date = str(closes_df.index[i].date())
+
+        for ticker in closes_df.columns:
+            before, after = float(prev_w.get(ticker, 0.0)), float(w.get(ticker, 0.0))
+            if before == 0 and after == 0:
+                continue
+            price = float(closes_df[ticker].iloc[i])
+            if before == 0 and after != 0:
+                open_trades[ticker] = {
+                    "ticker": ticker, "entry_date": date, "entry_price": price,
+                    "side": "long" if after > 0 else "short",
+                }
+            elif before != 0 and after == 0 and ticker in open_trades:
+                trade = open_trades.pop(ticker)
+                raw = (price / trade["entry_price"] - 1) * 100
+                trades.append({**trade, "exit_date": date, "exit_price": price,
+                               "pnl_pct": raw if trade["side"] == "long" else -raw})
+
+        prev_w = w
+
+    last_date = str(closes_df.index[-1].date())
+    for ticker, trade in open_trades.items():
+        price = float(closes_df[ticker].iloc[-1])
+        raw = (price / trade["entry_price"] - 1) * 100
+        trades.append({**trade, "exit_date": last_date, "exit_price": price,
+                       "pnl_pct": raw if trade["side"] == "long" else -raw,
+                       "open_at_end": True})
+
+    equity_arr = np.asarray(equity, dtype=float)
+    strategy_returns = pd.Series(equity_arr).pct_change().fillna(0.0)
+    return equity_arr, strategy_returns, trades
+
+
+def reference_stateful_band(closes, enter_mask, exit_mask, valid_mask):
+    """The per-bar hysteresis walk that _stateful_band() replaced."""
+    pos = np.zeros(len(closes), dtype=float)
+    holding = False
+    for i in range(len(closes)):
+        if not valid_mask.iloc[i]:
+            holding = False
+            pos[i] = 0.0
+            continue
+        if holding:
+            if exit_mask.iloc[i]:
+                holding = False
+        elif enter_mask.iloc[i]:
+            holding = True
+        pos[i] = 1.0 if holding else 0.0
+    return pd.Series(pos, index=closes.index)
+
+
+def reference_cross_sectional_momentum(closes_df, lookback, skip, top_quantile,
+                                       long_short, rebalance_days):
+    """The per-date ranking loop that strategy_cross_sectional_momentum() replaced."""
+    momentum = closes_df.shift(skip) / closes_df.shift(lookback) - 1.0
+
+    weights = pd.DataFrame(0.0, index=closes_df.index, columns=closes_df.columns)
+    n_pick = max(1, int(round(closes_df.shape[1] * top_quantile)))
+    current = None
+
+    for i in range(len(closes_df)):
+        if i % rebalance_days != 0:
+            if current is not None:
+                weights.iloc[i] = current
+            continue
+
+        ranked = momentum.iloc[i].dropna().sort_values(ascending=False)
+        if len(ranked) < 2:
+            if current is not None:
+                weights.iloc[i] = current
+            continue
+
+        k = min(n_pick, len(ranked) // 2 if long_short else len(ranked))
+        k = max(1, k)
+        row = pd.Series(0.0, index=closes_df.columns)
+
+        if long_short and len(ranked) >= 2 * k:
+            row[ranked.index[:k]] = 0.5 / k
+            row[ranked.index[-k:]] = -0.5 / k
+        else:
+            row[ranked.index[:k]] = 1.0 / k
+
+        weights.iloc[i] = row
+        current = row
+
+    return weights.shift(1).fillna(0.0)
+
+
+def reference_round_trips(held):
+    """(asset, entry_bar, exit_bar, open_at_end) tuples, found by walking each column."""
+    held = np.asarray(held, dtype=bool)
+    bars, assets = held.shape
+    out = []
+    for asset in range(assets):
+        entry = None
+        for i in range(1, bars):
+            if entry is None and held[i, asset]:
+                entry = i
+            elif entry is not None and not held[i, asset]:
+                out.append((asset, entry, i, False))
+                entry = None
+        if entry is not None:
+            out.append((asset, entry, bars - 1, True))
+    return out
+
+
+# --------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------
+
+def _prices(seed, bars=1200):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2015-01-02", periods=bars)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, bars))), index=index)
+
+
+def _universe(seed, bars=600, tickers=12):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2015-01-02", periods=bars)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (bars, tickers)), axis=0))
+    return pd.DataFrame(prices, index=index, columns=[f"T{i:02d}" for i in range(tickers)])
+
+
+def _ragged_universe(seed, bars=400, tickers=15):
+    """Staggered listings, coarse prices (so trailing returns tie) and zeros
+    (so some trailing returns are infinite)."""
+    rng = np.random.default_rng(seed)
+    closes_df = _universe(seed, bars, tickers).round(-1)
+    values = closes_df.to_numpy(copy=True)
+    for col in range(tickers):
+        values[:int(rng.integers(0, bars // 2)), col] = np.nan
+    values[rng.random(values.shape) < 0.01] = 0.0
+    return pd.DataFrame(values, index=closes_df.index, columns=closes_df.columns)
+
+
+def _random_weights(seed, closes_df):
+    """Runs of flat, long, short and missing (NaN) weights per name."""
+    rng = np.random.default_rng(seed)
+    levels = np.array([0.0, 0.0, 0.0, 0.1, 0.25, -0.1, -0.2, np.nan])
+    values = np.empty(closes_df.shape)
+    for col in range(values.shape[1]):
+        i = 0
+        while i < len(values):
+            run = int(rng.integers(1, 20))
+            values[i:i + run, col] = rng.choice(levels)
+            i += run
+    return pd.DataFrame(values, index=closes_df.index, columns=closes_df.columns)
+
+
+def _random_positions(seed, index):
+    """Runs of flat, long, short and fractional sizes, as strategies produce."""
+    rng = np.random.default_rng(seed)
+    levels = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 0.6, 1.4, -1.0])
+    values = np.empty(len(index))
+    i = 0
+    while i < len(index):
+        run = int(rng.integers(1, 15))
+        values[i:i + run] = rng.choice(levels)
+        i += run
+    return pd.Series(values, index=index)
+
+
+def _same(a, b):
+    """Equality that treats NaN as equal to NaN."""
+    if isinstance(a, float) and isinstance(b, float):
+        return (math.isnan(a) and math.isnan(b)) or a == b
+    return a == b
+
+
+def _assert_same_trades(got, expected):
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        assert g.keys() == e.keys()
+        for key in e:
+            assert _same(g[key], e[key]), (key, g, e)
+
+
+def _assert_portfolio_parity(closes_df, weights_df):
+    equity, returns, trades = backtesting.simulate_portfolio(closes_df, weights_df)
+    ref_equity, ref_returns, ref_trades = reference_simulate_portfolio(closes_df, weights_df)
+    np.testing.assert_allclose(equity, ref_equity, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(returns.to_numpy(), ref_returns.to_numpy(), rtol=1e-9, atol=1e-15)
+    _assert_same_trades(trades, ref_trades)
+
+
+def _assert_parity(closes, positions):
+    equity, returns, trades = backtesting.simulate(closes, positions)
+    ref_equity, ref_returns, ref_trades = reference_simulate(closes, positions)
+    np.testing.assert_allclose(equity, ref_equity, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(returns.to_numpy(), ref_returns.to_numpy(), rtol=1e-9, atol=1e-15)
+    _assert_same_trades(trades, ref_trades)
+
+
+# --------------------------------------------------------------------------
+# Tests
+# --------------------------------------------------------------------------
+
+@pytest.mark.parametrize("seed", range(20))
+def test_simulate_matches_loop_on_random_positions(seed):
+    closes = _prices(seed)
+    _assert_parity(closes, _random_positions(seed + 1000, closes.index))
+
+
+def test_simulate_matches_loop_when_bar_zero_is_invested():
+    closes = _prices(7, bars=50)
+    _assert_parity(closes, pd.Series(1.0, index=closes.index))
+
+
+@pytest.mark.parametrize("strategy", [
+    name for name, spec in backtesting.STRATEGY_SPECS.items() if not spec["multi_asset"]
+])
+@pytest.mark.parametrize("seed", range(3))
+def test_simulate_matches_loop_for_every_strategy(strategy, seed):
+    closes = _prices(seed)
+    _, params = backtesting.coerce_params(strategy, None)
+    positions = backtesting.STRATEGY_FUNCS[strategy](closes, **params)
+    _assert_parity(closes, positions)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_simulate_portfolio_matches_loop_on_random_weights(seed):
+    closes_df = _universe(seed)
+    _assert_portfolio_parity(closes_df, _random_weights(seed + 1000, closes_df))
+
+
+def test_simulate_portfolio_matches_loop_with_missing_columns():
+    closes_df = _universe(3)
+    weights = _random_weights(4, closes_df).fillna(0.0).drop(columns=["T03", "T07"])
+    _assert_portfolio_parity(closes_df, weights)
+
+
+@pytest.mark.parametrize("strategy", [
+    name for name, spec in backtesting.STRATEGY_SPECS.items() if spec["multi_asset"]
+])
+@pytest.mark.parametrize("long_short", [False, True])
+def test_simulate_portfolio_matches_loop_for_every_strategy(strategy, long_short):
+    closes_df = _universe(5, bars=900, tickers=20)
+    _, params = backtesting.coerce_params(strategy, {"long_short": long_short})
+    weights = backtesting.STRATEGY_FUNCS[strategy](closes_df, **params)
+    _assert_portfolio_parity(closes_df, weights)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_round_trips_match_loop(seed):
+    rng = np.random.default_rng(seed)
+    held = rng.random((300, 6)) < rng.uniform(0.2, 0.8, 6)
+    held[:, 0] = True            # open from the first tradable bar to the end
+    held[:, 1] = False           # never traded
+    asset, entry, exit_, open_at_end = backtesting._round_trips(held)
+    got = [(int(a), int(e), int(x), bool(o))
+           for a, e, x, o in zip(asset, entry, exit_, open_at_end)]
+    assert got == reference_round_trips(held)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_stateful_band_matches_loop_on_random_masks(seed):
+    rng = np.random.default_rng(seed)
+    bars = int(rng.integers(1, 400))
+    index = pd.bdate_range("2020-01-01", periods=bars)
+    closes = pd.Series(np.ones(bars), index=index)
+    # Densities vary per case so some have sparse events, some have entry and
+    # exit firing together on most bars, and some have long invalid stretches.
+    enter, exit_, valid = (
+        pd.Series(rng.random(bars) < rng.uniform(0, 1), index=index) for _ in range(3)
+    )
+    got = backtesting._stateful_band(closes, enter, exit_, valid)
+    expected = reference_stateful_band(closes, enter, exit_, valid)
+    np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy())
+    assert got.index.equals(expected.index)
+
+
+def test_stateful_band_overlapping_masks_flip_state():
+    index = pd.bdate_range("2020-01-01", periods=6)
+    closes = pd.Series(np.ones(6), index=index)
+    both = pd.Series(True, index=index)
+    valid = pd.Series([True, True, True, False, True, True], index=index)
+    got = backtesting._stateful_band(closes, both, both, valid)
+    np.testing.assert_array_equal(got.to_numpy(), [1, 0, 1, 0, 1, 0])
+    np.testing.assert_array_equal(
+        got.to_numpy(), reference_stateful_band(closes, both, both, valid).to_numpy()
+    )
+
+
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("long_short", [False, True])
+def test_cross_sectional_momentum_matches_loop(seed, long_short):
+    closes_df = _ragged_universe(seed)
+    rng = np.random.default_rng(seed)
+    params = {
+        "lookback": int(rng.integers(20, 80)),
+        "skip": int(rng.integers(0, 15)),
+        "top_quantile": float(rng.choice([0.05, 0.2, 0.35, 0.5])),
+        "long_short": long_short,
+        "rebalance_days": int(rng.integers(1, 25)),
+    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = reference_cross_sectional_momentum(closes_df, **params)
+        got = backtesting.strategy_cross_sectional_momentum(closes_df, **params)
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+def test_cross_sectional_momentum_matches_loop_on_short_history():
+    closes_df = _universe(7, bars=30, tickers=6)
+    params = {"lookback": 40, "skip": 5, "top_quantile": 0.2,
+              "long_short": True, "rebalance_days": 1}
+    expected = reference_cross_sectional_momentum(closes_df, **params)
+    got = backtesting.strategy_cross_sectional_momentum(closes_df, **params)
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+    assert not got.to_numpy().any()
@@ -0,0 +1,104 @@
+"""
+A sweep, or a walk-forward window's in-sample pick, must report exactly what a
+single backtest of the same parameters reports, whatever the indicator cache
+already holds.
+
+Prices are rounded to the cent, as real closes are: closes then often sit
+exactly on a moving average or a band, and any difference between how a sweep
+and a single run compute an indicator shows up as a flipped signal.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtesting
+
+
+def _cent_prices(seed=0, bars=2800):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2012-01-02", periods=bars)
+    return pd.Series(np.round(50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, bars))), 2),
+                     index=index)
+
+
+GRIDS = {
+    "bollinger_reversion": {"period": [3, 4, 5, 10, 20], "k": [0.5, 1.0, 1.5, 2.0]},
+    "ma_crossover": {"fast": [2, 3, 5, 10], "slow": [4, 6, 20, 50]},
+}
+
+
+@pytest.fixture(autouse=True)
+def _cold_cache():
+    backtesting.indicator_cache.clear()
+    yield
+    backtesting.indicator_cache.clear()
+
+
+def _single_runs(closes, strategy, combos):
+    runs = {}
+    for p in combos:
+        try:
+            runs[tuple(sorted(p.items()))] = backtesting.run_backtest(closes, strategy, p)["metrics"]
+        except ValueError:
+            pass  # e.g. a fast window that is not shorter than the slow one
+    return runs
+
+
+@pytest.mark.parametrize("strategy", sorted(GRIDS))
+def test_sweep_rows_equal_single_runs(strategy):
+    closes = _cent_prices()
+    strategy, combos = backtesting.expand_grid(strategy, GRIDS[strategy])
+
+    cold = _single_runs(closes, strategy, combos)
+    backtesting.indicator_cache.clear()
+    sweep = backtesting.run_sweep(closes, strategy, combos, workers=1)
+    # Single runs served from whatever the sweep left in the cache.
+    warm = _single_runs(closes, strategy, combos)
+
+    assert sweep["results"]
+    for row in sweep["results"]:
+        key = tuple(sorted(row["params"].items()))
+        assert row["metrics"] == cold[key], row["params"]
+        assert warm[key] == cold[key], row["params"]
+
+
+def test_pooled_sweep_rows_equal_single_runs():
+    closes = _cent_prices(bars=1400)
+    strategy, combos = backtesting.expand_grid(
+        "bollinger_reversion",
+        {"period": list(range(3, 67)), "k": [0.5, 1.0, 1.5, 2.0]},
+    )
+    assert len(combos) >= backtesting.SWEEP_POOL_MIN_COMBOS
+    sweep = backtesting.run_sweep(closes, strategy, combos, workers=2)
+    backtesting.indicator_cache.clear()
+    for row in sweep["results"]:
+        single = backtesting.run_backtest(closes, strategy, row["params"])["metrics"]
+        assert row["metrics"] == single, row["params"]
+
+
+def test_walk_forward_in_sample_scores_equal_single_runs():
+    closes = _cent_prices(bars=1400)
+    strategy, combos = backtesting.expand_grid("bollinger_reversion",
+                                               {"period": [3, 4, 5], "k": [0.5, 1.0]})
+    result = backtesting.run_walk_forward(closes, strategy, combos, in_sample_bars=300,
+                                          out_of_sample_bars=100, workers=1)
+    windows = backtesting.walk_forward_windows(len(closes), 300, 100)
+    for (in_start, in_end, _), pick in zip(windows, result["windows"]):
+        backtesting.indicator_cache.clear()
+        single = backtesting.run_backtest(closes.iloc[in_start:in_end], strategy, pick["params"])
+        assert pick["in_sample_score"] == single["metrics"]["sharpe"], pick
+
+
+def test_matrix_rows_match_rolling_means():
+    closes = _cent_prices(seed=3, bars=600)
+    closes.iloc[100:105] = np.nan
+    closes.iloc[300:340] = closes.iloc[300]
+    windows = list(range(2, 120))
+    means = backtesting.rolling_window_matrix(closes, windows)
+    for i, w in enumerate(windows):
+        expected = closes.rolling(w).mean().to_numpy()
+        np.testing.assert_allclose(means[i], expected, rtol=1e-11)
+        # Flat windows are exact, as rolling() gives them.
+        flat = slice(300 + w - 1, 340)
+        np.testing.assert_array_equal(means[i][flat], closes.to_numpy()[flat])
@@ -0,0 +1,162 @@
+"""
+ReplayProvider has to be a stand-in a benchmark can trust: the same seed gives
+the same data and the same injected failures, a history's past does not move
+as `as_of` does, and a strict replay serves only what was recorded.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from market_data import (
+    MarketDataProvider,
+    ProviderError,
+    RateLimitError,
+    ReplayProvider,
+    YFinanceProvider,
+    record_fixture,
+)
+
+
+def _snapshot(provider, ticker):
+    return {
+        "closes": provider.closes([ticker], start="2015-01-01")[ticker],
+        "info": provider.info(ticker),
+        "financials": provider.financials(ticker),
+        "dividends": provider.dividends(ticker),
+        "recommendations": provider.recommendations(ticker),
+        "news": provider.news(ticker),
+    }
+
+
+def _assert_same(a, b):
+    pd.testing.assert_series_equal(a["closes"], b["closes"])
+    pd.testing.assert_frame_equal(a["financials"], b["financials"])
+    pd.testing.assert_series_equal(a["dividends"], b["dividends"])
+    pd.testing.assert_frame_equal(a["recommendations"], b["recommendations"])
+    assert a["info"] == b["info"]
+    assert a["news"] == b["news"]
+
+
+@pytest.mark.parametrize("ticker", ["AAPL", "BRK/B", "^GSPC"])
+def test_same_seed_same_data(ticker):
+    first = _snapshot(ReplayProvider(seed=7, as_of="2024-06-28"), ticker)
+    again = _snapshot(ReplayProvider(seed=7, as_of="2024-06-28"), ticker)
+    _assert_same(first, again)
+
+
+def test_seed_and_ticker_both_change_the_data():
+    base = ReplayProvider(seed=7, as_of="2024-06-28").closes(["AAPL", "MSFT"], period="1y")
+    other = ReplayProvider(seed=8, as_of="2024-06-28").closes(["AAPL"], period="1y")
+    assert not base["AAPL"].equals(base["MSFT"])
+    assert not base["AAPL"].equals(other["AAPL"])
+
+
+def test_past_is_stable_as_of_advances():
+    early = ReplayProvider(seed=3, as_of="2019-03-15")
+    late = ReplayProvider(seed=3, as_of="2024-11-29")
+    before = early.closes(["AAPL"], start="2010-01-01")["AAPL"]
+    after = late.closes(["AAPL"], start="2010-01-01")["AAPL"]
+    assert before.index[-1] <= pd.Timestamp("2019-03-15")
+    assert after.index[-1] > before.index[-1]
+    pd.testing.assert_series_equal(after[after.index <= before.index[-1]], before,
+                                   check_freq=False)
+
+    # A period counts back from as_of over the same prices.
+    year = early.closes(["AAPL"], period="1y")["AAPL"]
+    assert len(year) == 252
+    pd.testing.assert_series_equal(year, before.iloc[-252:], check_freq=False)
+
+
+def test_start_and_end_clip_without_changing_prices():
+    provider = ReplayProvider(seed=3, as_of="2024-11-29")
+    full = provider.closes(["AAPL"], start="2010-01-01")["AAPL"]
+    window = provider.closes(["AAPL"], start="2020-01-01", end="2020-07-01")["AAPL"]
+    assert window.index[0] >= pd.Timestamp("2020-01-01")
+    assert window.index[-1] < pd.Timestamp("2020-07-01")
+    pd.testing.assert_series_equal(window, full[window.index], check_freq=False)
+
+
+def test_recorded_fixture_replays_strictly(tmp_path):
+    source = ReplayProvider(seed=11, as_of="2024-06-28")
+    path = record_fixture(source, "BRK/B", str(tmp_path), start="2020-01-01")
+    assert path.startswith(str(tmp_path))
+
+    replay = ReplayProvider(fixtures=str(tmp_path), strict=True, as_of="2024-06-28")
+    recorded = _snapshot(replay, "BRK/B")
+    expected = _snapshot(source, "BRK/B")
+    pd.testing.assert_series_equal(
+        recorded["closes"], expected["closes"][expected["closes"].index >= "2020-01-01"],
+        check_freq=False)
+    pd.testing.assert_frame_equal(recorded["financials"], expected["financials"],
+                                  check_freq=False)
+    assert recorded["info"] == expected["info"]
+    assert recorded["news"] == expected["news"]
+
+    # An unrecorded ticker is missing, as an unknown symbol is upstream.
+    assert replay.closes(["BRK/B", "NOPE"], period="5d").keys() == {"BRK/B"}
+    assert replay.info("NOPE") == {}
+    assert replay.news("NOPE") == []
+    assert replay.financials("NOPE").empty
+    assert replay.dividends("NOPE").empty
+    assert replay.recommendations("NOPE").empty
+
+
+def test_unrecorded_field_is_missing_only_when_strict(tmp_path):
+    (tmp_path / "AAPL.json").write_text(json.dumps({
+        "ticker": "AAPL",
+        "closes": {"dates": ["2024-06-26", "2024-06-27"], "prices": [210.5, 213.25]},
+    }))
+    strict = ReplayProvider(fixtures=str(tmp_path), strict=True, as_of="2024-06-28")
+    loose = ReplayProvider(fixtures=str(tmp_path), as_of="2024-06-28")
+
+    for provider in (strict, loose):
+        assert provider.closes(["AAPL"], period="5d")["AAPL"].tolist() == [210.5, 213.25]
+    assert strict.news("AAPL") == []
+    assert strict.info("AAPL") == {}
+    assert len(loose.news("AAPL")) == 5
+    assert loose.info("AAPL")["symbol"] == "AAPL"
+
+
+def test_every_call_fails_at_full_rates():
+    with pytest.raises(RateLimitError):
+        ReplayProvider(rate_limit_rate=1.0).info("AAPL")
+    with pytest.raises(ProviderError):
+        ReplayProvider(failure_rate=1.0).closes(["AAPL"], period="5d")
+
+
+def _outcomes(provider, calls):
+    out = []
+    for _ in range(calls):
+        try:
+            provider.recommendations("AAPL")
+            out.append("ok")
+        except RateLimitError:
+            out.append("rate_limited")
+        except ProviderError:
+            out.append("failed")
+    return out
+
+
+def test_injected_failures_are_seeded_and_near_their_rates():
+    calls = 4000
+    first = _outcomes(ReplayProvider(seed=5, rate_limit_rate=0.1, failure_rate=0.2), calls)
+    again = _outcomes(ReplayProvider(seed=5, rate_limit_rate=0.1, failure_rate=0.2), calls)
+    assert first == again
+    assert first.count("rate_limited") / calls == pytest.approx(0.1, abs=0.02)
+    assert first.count("failed") / calls == pytest.approx(0.2, abs=0.02)
+
+    provider = ReplayProvider(seed=5, rate_limit_rate=0.1, failure_rate=0.2)
+    _outcomes(provider, calls)
+    stats = provider.stats()
+    assert stats["calls"] == calls
+    assert stats["rate_limited"] == first.count("rate_limited")
+    assert stats["failed"] == first.count("failed")
+
+
+def test_provider_interface():
+    with pytest.raises(TypeError):
+        MarketDataProvider()
+    assert YFinanceProvider.allows_scrape_fallback
+    assert not ReplayProvider.allows_scrape_fallback
@@ -1,4 +1,4 @@
-import { useState, useContext } from "react";
+import { useState, useContext, useEffect, useRef } from "react";
 import api from "../api/client";
 import { StockContext } from "../components/StockContext";
 import StockDetail from "../components/stock/StockDetail";
@@ -11,6 +11,9 @@ import "./pages.css";
 
 const RATING_BADGE = { buy: "badge-up", hold: "badge-neutral", sell: "badge-down" };
 
+// The backend scores the universe in the background; poll while it runs.
+const SCAN_POLL_MS = 3000;
+
 // The backend returns proportions; a very strong consensus is worth calling out.
 const displayRating = (rating, indicator) => {
   if (rating === "buy" && indicator > 0.85) return "strong buy";
@@ -25,16 +28,37 @@ export default function ResearchPage() {
   const [cached, setCached] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [scan, setScan] = useState(null);
 
   const [query, setQuery] = useState("");
   const [openTicker, setOpenTicker] = useState(null);
   const [pinMsg, setPinMsg] = useState(null);
 
+  // The pending poll, cleared on unmount so a scan that is still running does
+  // not keep polling (and setting state) after the page is closed.
+  const pollTimer = useRef(null);
+  const unmounted = useRef(false);
+  useEffect(() => {
+    unmounted.current = false;
+    return () => {
+      unmounted.current = true;
+      clearTimeout(pollTimer.current);
+    };
+  }, []);
+
   const loadRecs = async () => {
+    clearTimeout(pollTimer.current);
     setLoading(true);
     setError(null);
+    let polling = false;
     try {
       const res = await api.post("/fetch-recs", {});
+      setScan(res.data.scan || null);
+      if (res.status === 202) {
+        polling = true;
+        if (!unmounted.current) pollTimer.current = setTimeout(loadRecs, SCAN_POLL_MS);
+        return;
+      }
       setRecs(res.data.recommendations || []);
       setSnapshot(res.data.snapshot_ref || null);
       setCached(Boolean(res.data.cached));
@@ -48,7 +72,7 @@ export default function ResearchPage() {
           : "Could not load recommendations."
       );
     } finally {
-      setLoading(false);
+      if (!polling) setLoading(false);
     }
   };
 
@@ -156,6 +180,9 @@ export default function ResearchPage() {
         </div>
 
         {loading && <div className="loading-bar" />}
+        {loading && scan?.status === "running" && (
+          <p className="card-sub">Scored {scan.done} of {scan.total} tickers…</p>
+        )}
 
         <div className="card-body">
           {error && <div className="alert alert-error">{error}</div>}